@@ -23,6 +23,9 @@ from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
 from .utils import checks, rate_limits, utils
+from .utils.metrics import get_metrics
+from .utils.redis_config import redis_round_trips
+from .utils.watchdog import get_watchdog
 
 log = logging.getLogger()
 
@@ -364,6 +367,48 @@ class Admin(commands.Cog):
 
         await ctx.message.channel.send(embed=embed)
 
+    @checks.sudo()
+    @commands.command(aliases=["startup_report"])
+    async def startup(self, ctx: Context, limit: int = 10) -> None:
+        """Show how long each extension took to load and how long the bot took to become ready."""
+        profiler = getattr(self.bot, "startup", None)
+        if profiler is None:
+            await ctx.send("No startup profile recorded for this instance.")
+            return
+        await ctx.send("```\n{}```".format(profiler.format_report(limit)[:1900]))
+
+    @checks.sudo()
+    @commands.command(hidden=True, aliases=["latency_stats"])
+    async def perf(self, ctx: Context, n: int = 8) -> None:
+        """Show the commands and listeners that have spent the most time on the event loop."""
+        metrics = get_metrics(self.bot)
+
+        def table(entries) -> str:
+            lines = ["{:<28} {:>6} {:>7} {:>7} {:>5} {:>6}".format("name", "calls", "mean", "p99", "errs", "redis")]
+            for name, hist in entries:
+                lines.append("{:<28} {:>6} {:>6.0f}ms {:>6.0f}ms {:>5} {:>6}".format(
+                    name[:28], hist.count, hist.mean * 1000, hist.quantile(0.99) * 1000, hist.errors,
+                    hist.redis_calls))
+            return "```\n{}```".format("\n".join(lines))[:1024]
+
+        lag = metrics.loop_lag
+        embed = discord.Embed(title="Event loop time", color=discord.Color.blurple())
+        embed.add_field(name="Commands", value=table(metrics.top(metrics.commands, n)), inline=False)
+        embed.add_field(name="Listeners", value=table(metrics.top(metrics.listeners, n)), inline=False)
+        embed.add_field(name="Loop lag", value="mean {:.1f}ms, p99 <{:.0f}ms, max {:.0f}ms".format(
+            lag.mean * 1000, lag.quantile(0.99) * 1000, lag.max * 1000))
+        embed.add_field(name="Redis round trips", value=str(redis_round_trips()))
+        await ctx.send(embed=embed)
+
+    @checks.sudo()
+    @commands.command(hidden=True)
+    async def stalls(self, ctx: Context, n: int = 8, reset: bool = False) -> None:
+        """Show where the event loop has been blocked the longest. Pass reset=True to clear the totals afterwards."""
+        watchdog = get_watchdog(self.bot)
+        await ctx.send("```\n{}```".format(watchdog.format_report(n)[:1900]))
+        if reset:
+            watchdog.reset()
+
     @checks.sudo()
     @commands.command()
     async def set_game(self, ctx: Context, *, game: str = None) -> None:
@@ -1,4 +1,5 @@
 from discord.ext import commands
+from .utils.triggers import Trigger, get_trigger_engine
 import logging
 
 log = logging.getLogger()
@@ -6,6 +7,8 @@ log = logging.getLogger()
 
 class AprilFools2018(commands.Cog):
 
+    guild_id = 234567  # Borked on purpose since it seems to activate on its own
+
     def __init__(self, bot):
         self.bot = bot
         self.substitutions = {}
@@ -20,23 +23,24 @@ class AprilFools2018(commands.Cog):
                 except ValueError:
                     log.exception("Couldn't split in AprilFools2018 for line {}.".format(sub))
 
-    def find_matching_substitution(self, message: str):
-        for pkmn_name in self.substitutions:
-            if pkmn_name in message.lower():
-                return self.substitutions[pkmn_name]
-        else:
-            return None
+        # Every name goes into the shared trigger engine, so messages are scanned once rather than once per name
+        self.triggers = get_trigger_engine(bot)
+        self.triggers.register(type(self).__name__, self.on_pokemon_name, [
+            Trigger(pkmn_name, guilds=[self.guild_id], exclude_channels=self.channel_blacklist, ignore_case=True)
+            for pkmn_name in self.substitutions
+        ])
+
+    def cog_unload(self):
+        self.triggers.unregister(type(self).__name__)
 
     @property
     def guild(self):
-        return self.bot.get_guild(234567)  # Borked on purpose since it seems to activate on its own
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.guild == self.guild and message.channel.id not in self.channel_blacklist:
-            digimon_name = self.find_matching_substitution(message.content)
-            if digimon_name is not None:
-                await message.channel.send("Did you mean {}? {}".format(digimon_name, message.author.mention))
+        return self.bot.get_guild(self.guild_id)
+
+    async def on_pokemon_name(self, message, pkmn_names):
+        """Called by the trigger engine with the names in the message, first one first."""
+        digimon_name = self.substitutions[pkmn_names[0]]
+        await message.channel.send("Did you mean {}? {}".format(digimon_name, message.author.mention))
 
 
 # def setup(bot):
@@ -3,7 +3,6 @@ Cog to play some audio at random intervals.
 Functions similar to micspam, except is interruptable.
 """
 import logging
-import os
 import time
 import traceback
 from typing import Optional
@@ -16,12 +15,11 @@ import discord
 
 
 # TODO: In rewrite, make a superclass cog that handles audio playing to avoid this copy-pasting
-# It should ideally have:
-#   - Tracking for connection and disconnection events so we don't end up stuck in a channel without knowing
-#   - A global list of audio clients so we can quickly (and easily) spin up audio clients and reuse existing ones
+# Voice connections are shared between the audio cogs through the voice session manager.
 from cogs.utils import checks
 from cogs.utils.utils import check_urls
-from cogs.utils.audio.audio_utils import Downloader
+from cogs.utils.audio.audio_cache import AudioCache, get_audio_cache
+from cogs.utils.audio.voice_sessions import VoicePriority, get_voice_manager
 
 log = logging.getLogger()
 
@@ -38,11 +36,12 @@ class BooWompGuildManager:
     """
 
     def __init__(self, bot, audio_url: str, voice_client: discord.VoiceClient, text_channel: discord.TextChannel,
-                 downloader: Downloader, *, max_length_seconds: int = 3600, min_delay: int = 10):
+                 audio_cache: AudioCache, *, max_length_seconds: int = 3600, min_delay: int = 10):
         self.bot = bot
-        self.downloader = downloader
+        self.audio_cache = audio_cache
         self.audio_url = audio_url
         self.audio_path = ""
+        self._cached_audio = None
         self.voice_client = voice_client
         self.text_channel = text_channel
         self.max_length_seconds = max_length_seconds
@@ -59,16 +58,23 @@ class BooWompGuildManager:
         self.bot.loop.create_task(self.text_channel.send(message))
 
     async def _download(self) -> str:
-        stats = await self.downloader.download_stats_threaded(self.audio_url, self.bot.loop)
-        self.audio_path = stats["expected_filename"]
-        if stats.get("duration") > MAX_AUDIO_CLIP_DURATION:
+        # Check the length first, so a clip that's too long never gets downloaded into the cache. The info is handed
+        # on to the cache, so it's only extracted the once.
+        info = None
+        cached_audio = self.audio_cache.get(self.audio_url)
+        if cached_audio is not None:
+            duration = cached_audio.duration
+        else:
+            info = await self.audio_cache.downloader.download_stats_threaded(self.audio_url, self.bot.loop)
+            duration = info.get("duration")
+        if (duration or 0) > MAX_AUDIO_CLIP_DURATION:
             raise RuntimeError(
                 "Audio clip is too long, should be less than {} seconds.".format(MAX_AUDIO_CLIP_DURATION)
             )
 
-        fut = self.bot.loop.create_task(self.downloader.download_audio_coro(self.audio_url))
-
-        return fut
+        self._cached_audio = await self.audio_cache.acquire(self.audio_url, info=info)
+        self.audio_path = self._cached_audio.path
+        return self.audio_path
         # audio_source = discord.PCMVolumeTransformer(audio_source, volume)
 
     async def play(self):
@@ -99,6 +105,9 @@ class BooWompGuildManager:
 
     def _after(self, err):
 
+        if self._shut_down:
+            return
+
         if err:
             traceback.print_exception(type(err), err, err.__traceback__)
             self._send_message("Error occurred during playback: {}".format(err))
@@ -157,19 +166,19 @@ class BooWompGuildManager:
         self._shut_down = True
 
         try:
-            # make sure we aren't actively reading from the file
-            if self.voice_client.is_playing():
+            # make sure we aren't actively reading from the file, unless the connection has been taken over and
+            # it's someone else's audio playing on it now
+            voice_sessions = get_voice_manager(self.bot)
+            if voice_sessions.owner_of(self.voice_client.guild) == "boowomp" and self.voice_client.is_playing():
                 self.voice_client.stop()
 
-            try:
-                await self.voice_client.disconnect(force=False)
-            except discord.ClientException:
-                await self.voice_client.disconnect(force=True)
+            # Leave the connection for the next cog that wants it; it'll disconnect itself if nothing does
+            voice_sessions.release(self.voice_client.guild, "boowomp")
         finally:
-            try:
-                os.remove(self.audio_path)
-            except FileNotFoundError:
-                pass
+            # The cache will clean the file up once nothing else is using it
+            if self._cached_audio is not None:
+                self.audio_cache.release(self._cached_audio)
+                self._cached_audio = None
 
 
 class BooWomp(commands.Cog):
@@ -177,7 +186,8 @@ class BooWomp(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.config = bot.config
-        self.downloader = Downloader()
+        self.audio_cache = get_audio_cache(bot)
+        self.voice_sessions = get_voice_manager(bot)
 
         # holds references to the "playlists" for each channel
         # each playlist will only be one song looped with a random delay in the after()
@@ -203,20 +213,21 @@ class BooWomp(commands.Cog):
             return
         await self.close(ctx.guild)
 
-    async def join(self, voice_channel: discord.VoiceChannel, force=False) -> Optional[discord.VoiceProtocol]:
-        """Bind to a voice channel. Will bind by default to the channel.
-        TODO In the rewrite, this should absolutely be a base method for the new audio utilities
+    async def join(self, voice_channel: discord.VoiceChannel) -> Optional[discord.VoiceProtocol]:
+        """Bind to a voice channel, reusing the guild's connection if there is one.
+        Returns None if a higher priority cog is using it.
         """
+        guild = voice_channel.guild
 
-        current_connection = voice_channel.guild.voice_client
-        if force and current_connection and current_connection.guild.id in self._active_guild_managers:
-            await current_connection.disconnect()
-        elif current_connection and current_connection.guild.id not in self._active_guild_managers:
-            return None
+        def on_preempt():
+            manager = self._active_guild_managers.get(guild.id)
+            if manager is not None:
+                # Stop it from playing again right away; the rest of the cleanup can happen later
+                manager._shut_down = True
+                self.bot.loop.create_task(self.close(guild))
 
-        voice_client = await voice_channel.connect()
-
-        return voice_client
+        return await self.voice_sessions.acquire(voice_channel, "boowomp", VoicePriority.BOOWOMP,
+                                                 on_preempt=on_preempt)
 
     def _loop_after(self, voice_client: VoiceClient, err, song_path, song_downloaded=False):
         pass
@@ -226,9 +237,9 @@ class BooWomp(commands.Cog):
         Close an audio connection in a guild.
         If we're moved or disconnected, make sure we clean up after ourselves.
         """
-        manager = self._active_guild_managers[guild.id]
-        await manager.destroy()
-        del self._active_guild_managers[guild.id]  # I still hate this syntax
+        manager = self._active_guild_managers.pop(guild.id, None)
+        if manager is not None:
+            await manager.destroy()
 
     async def _activate_clip(self, ctx: commands.Context, url: str, length_seconds: int):
 
@@ -251,13 +262,17 @@ class BooWomp(commands.Cog):
                     await ctx.send("Connecting failed: {}".format(e))
                     return
 
+                if voice_client is None:
+                    await ctx.send("Already connected to voice in the same guild for another cog.")
+                    return
+
                 connected_successfully = True
 
                 await ctx.send(
                     "Bound to voice channel `{0.name}`, use `!bw stop` to stop.".format(ctx.author.voice.channel)
                 )
                 # linter will complain, but we're almost exclusively going to be getting the right type here
-                new_manager = BooWompGuildManager(self.bot, url, voice_client, ctx.message.channel, self.downloader,
+                new_manager = BooWompGuildManager(self.bot, url, voice_client, ctx.message.channel, self.audio_cache,
                                                   max_length_seconds=length_seconds)
                 self._active_guild_managers[ctx.guild.id] = new_manager
 
@@ -274,7 +289,7 @@ class BooWomp(commands.Cog):
 
         finally:
             if not connected_successfully and voice_client:
-                await voice_client.disconnect(force=False)
+                self.voice_sessions.release(voice_client.guild, "boowomp")
 
     async def _kill_all(self):
         for manager in self._active_guild_managers.values():
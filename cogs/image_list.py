@@ -8,8 +8,20 @@ img:
         album_name:ids:
             set of album IDs
     cache:
-
-
+        album_name:imgs:
+            set of every image URL in the list's albums
+        album_name:albums:album_id:urls:
+            set of image URLs in one album
+        album_name:albums:album_id:etag:
+            ETag imgur sent with the album's last listing, so unchanged albums can be skipped
+    album_name:blacklist:
+        set of image URLs that are never posted for the list
+
+Each list is held in memory as an ImagePool with its blacklist already subtracted, so picking an image is a
+single O(1) operation. Adds and blacklists update the pool and redis incrementally.
+
+Albums are kept in sync with imgur by AlbumSync, which fetches them concurrently off the event loop and only writes
+the URLs that were added or removed since the last sync.
 """
 
 import asyncio
@@ -18,9 +30,12 @@ import json
 import random
 import re
 import sys
+import threading
 import time
 import webbrowser
 
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 import discord
@@ -28,9 +43,9 @@ import discord
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 from imgurpython import ImgurClient
-from imgurpython.client import ImgurClientError
+from imgurpython.client import API_URL, ImgurClientError
 from redis import ResponseError
-from typing import Union, List, Optional, Dict, Set
+from typing import Union, List, Optional, Dict, Set, Iterable, Iterator, NamedTuple
 
 from .utils import checks, rate_limits, redis_config
 from .utils.utils import check_urls
@@ -39,6 +54,10 @@ log = logging.getLogger()
 
 config = redis_config.RedisConfig()
 
+ALBUM_SYNC_WORKERS = 4  # Max albums fetched from imgur at once
+ALBUM_FETCH_TIMEOUT = 15
+ALBUM_SYNC_INTERVAL = 3600  # Cheap now that unchanged albums are skipped, so it can run more often than it used to
+
 
 class ImgurAuth(commands.Cog):
     FORCE_AUTH = True
@@ -95,14 +114,192 @@ class ImgurAuth(commands.Cog):
             return try_auth
 
 
+class LazyImgurClient:
+    """
+    Authenticate with imgur the first time the client is used, instead of when this module is imported.
+    The lock keeps concurrent album fetches from authenticating more than once.
+    """
+
+    def __init__(self) -> None:
+        self._client = None  # type: Optional[ImgurClient]
+        self._lock = threading.Lock()
+
+    def __get__(self, instance, owner) -> ImgurClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = ImgurAuth().imgur_client
+        return self._client
+
+
+class ImagePool:
+    """
+    A set of image URLs that also supports O(1) uniform random picks.
+
+    URLs are kept in an array with a URL -> position index. Removal swaps the last URL into the removed slot, so the
+    array never has holes and `choice` never needs to retry.
+    """
+    __slots__ = ("_urls", "_positions")
+
+    def __init__(self, urls: Iterable[str] = ()) -> None:
+        self._urls = []  # type: List[str]
+        self._positions = {}  # type: Dict[str, int]
+        for url in urls:
+            self.add(url)
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._urls)
+
+    def add(self, url: str) -> bool:
+        """Add a URL. Returns False if it was already present."""
+        if url in self._positions:
+            return False
+        self._positions[url] = len(self._urls)
+        self._urls.append(url)
+        return True
+
+    def discard(self, url: str) -> bool:
+        """Remove a URL if present. Returns False if it wasn't."""
+        pos = self._positions.pop(url, None)
+        if pos is None:
+            return False
+        last = self._urls.pop()
+        if pos < len(self._urls):
+            self._urls[pos] = last
+            self._positions[last] = pos
+        return True
+
+    def choice(self) -> Optional[str]:
+        """Pick a URL uniformly at random, or None if the pool is empty."""
+        if not self._urls:
+            return None
+        return self._urls[random.randrange(len(self._urls))]
+
+
+AlbumFetch = NamedTuple("AlbumFetch", [("album_id", str), ("urls", Optional[List[str]]), ("etag", Optional[str])])
+
+
+class AlbumSync:
+    """
+    Keeps the cached image lists in sync with their imgur albums.
+
+    Albums are fetched in a thread pool with bounded parallelism, sending the ETag from the last fetch so imgur can
+    answer 304 for albums that haven't changed. Changed albums are diffed against their cached URL sets and only the
+    differences are written, in a single pipeline per image list.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_workers: int = ALBUM_SYNC_WORKERS) -> None:
+        self.loop = loop
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="album_sync")
+        self._session = requests.Session()
+
+        self.stats = {"fetched": 0, "unchanged": 0, "failed": 0, "added": 0, "removed": 0}
+
+    @property
+    def imgur_client(self) -> ImgurClient:
+        return ImageList.imgur_client
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+    def _request_album(self, album_id: str, etag: Optional[str]) -> requests.Response:
+        headers = self.imgur_client.prepare_headers()
+        if etag:
+            headers["If-None-Match"] = etag
+        return self._session.get("{}3/album/{}/images".format(API_URL, album_id),
+                                 headers=headers, timeout=ALBUM_FETCH_TIMEOUT)
+
+    def _fetch_album(self, album_id: str, etag: Optional[str]) -> AlbumFetch:
+        """Fetch an album's image URLs. Runs in the thread pool. `urls` is None if the album hasn't changed."""
+        response = self._request_album(album_id, etag)
+        if response.status_code == 403 and self.imgur_client.auth is not None:
+            # Access token expired, same as imgurpython does in make_request
+            self.imgur_client.auth.refresh()
+            response = self._request_album(album_id, etag)
+
+        if response.status_code == 304:
+            return AlbumFetch(album_id, None, etag)
+
+        response.raise_for_status()
+        urls = [image["link"] for image in response.json()["data"]]
+        return AlbumFetch(album_id, urls, response.headers.get("ETag"))
+
+    async def sync(self, image_list: 'ImageList') -> None:
+        """Bring an image list's cache and in-memory pool up to date with its albums."""
+        name = image_list.name
+        album_ids = list(image_list.album_list)
+        if not album_ids:
+            return
+
+        pipe = config.pipeline(transaction=False)
+        for album_id in album_ids:
+            pipe.smembers("img:cache:{}:albums:{}:urls".format(name, album_id))
+            pipe.get("img:cache:{}:albums:{}:etag".format(name, album_id))
+        results = pipe.execute()
+        cached_urls = dict(zip(album_ids, results[::2]))
+        etags = dict(zip(album_ids, results[1::2]))
+
+        fetches = await asyncio.gather(
+            *(self.loop.run_in_executor(self._executor, self._fetch_album, album_id, etags[album_id])
+              for album_id in album_ids),
+            return_exceptions=True
+        )
+
+        pipe = config.pipeline(transaction=False)
+        changed = False
+        for album_id, fetch in zip(album_ids, fetches):
+            if isinstance(fetch, Exception):
+                self.stats["failed"] += 1
+                log.warning("Encountered exception when fetching album {}\n {}: {}".format(
+                    album_id, type(fetch).__name__, fetch))
+                continue  # Keep whatever we had cached for it
+            elif fetch.urls is None:
+                self.stats["unchanged"] += 1
+                continue
+
+            self.stats["fetched"] += 1
+            key = "img:cache:{}:albums:{}:urls".format(name, album_id)
+            new_urls = set(fetch.urls)
+            added = new_urls - cached_urls[album_id]
+            removed = cached_urls[album_id] - new_urls
+            if added:
+                pipe.sadd(key, *added)
+            if removed:
+                pipe.srem(key, *removed)
+            if fetch.etag:
+                pipe.set("img:cache:{}:albums:{}:etag".format(name, album_id), fetch.etag)
+
+            self.stats["added"] += len(added)
+            self.stats["removed"] += len(removed)
+            cached_urls[album_id] = new_urls
+            changed = changed or bool(added or removed)
+
+        if changed:
+            pipe.sunionstore("img:cache:{}:imgs".format(name),
+                             ["img:cache:{}:albums:{}:urls".format(name, album_id) for album_id in album_ids])
+        pipe.execute()
+
+        if changed:
+            image_list.update_images(set().union(*cached_urls.values()))
+            log.info("Synced image list {}.".format(name))
+
+
 class ImageList:
-    _auth = ImgurAuth()
-    imgur_client = _auth.attempt_imgur_auth()
+    imgur_client = LazyImgurClient()
     bot = None
+    album_sync = None  # type: Optional[AlbumSync]
 
     def __init__(
             self, name: str, album_ids: List[str],
-            image_list: Optional[List[str]] = None, added_msg: Optional[str] = None
+            image_list: Optional[List[str]] = None, added_msg: Optional[str] = None,
+            blacklist: Optional[Set[str]] = None
     ) -> None:
         """
         Handles image lists, for meme commands such as fug and nonya. Allows for images to be added to albums and then
@@ -110,19 +307,29 @@ class ImageList:
 
         :param name: Name of the command the list belongs to
         :param album_ids: A list of imgur album IDs.
+        :param blacklist: Image URLs that should never be picked.
         """
         self.album_list = album_ids
         self.name = name
-        self.images = []  # List of URLs from the related imgur albums.
 
-        self.images = self.load_from_imgur(*album_ids) if not image_list else image_list
+        self._blacklisted_images = set(blacklist) if blacklist else set()
+        self._pool = ImagePool()  # URLs from the related imgur albums, minus the blacklist.
 
-        self._blacklisted_images = set()
+        self.set_images(self.load_from_imgur(*album_ids) if image_list is None else image_list)
 
         self.msg_on_add = added_msg
 
     def __len__(self) -> int:
-        return len(self.images)
+        return len(self._pool)
+
+    @property
+    def images(self) -> List[str]:
+        """All pickable image URLs, i.e. with the blacklist removed."""
+        return list(self._pool)
+
+    @property
+    def blacklist(self) -> Set[str]:
+        return self._blacklisted_images
 
     @property
     def image_count(self) -> int:
@@ -149,16 +356,27 @@ class ImageList:
 
         return image_urls
 
-    # Best guess at `blacklist` type. Param never used.
-    def get_image(self, blacklist: Optional[List[str]] = None):
+    def set_images(self, image_urls: Iterable[str]) -> None:
+        """Replace the in-memory image list, dropping anything blacklisted."""
+        self._pool = ImagePool(url for url in image_urls if url not in self._blacklisted_images)
+
+    def update_images(self, image_urls: Set[str]) -> None:
+        """Apply only the differences between the current images and image_urls to the pool."""
+        for url in [url for url in self._pool if url not in image_urls]:
+            self._pool.discard(url)
+        for url in image_urls:
+            if url not in self._blacklisted_images:
+                self._pool.add(url)
+
+    def get_image(self) -> Optional[str]:
+        """Get a random image that isn't blacklisted, or None if there are none left."""
+        return self._pool.choice()
+
+    def blacklist_image(self, url: str) -> None:
         # Allow for blacklisting to occur since deleting is a pita
-        if blacklist is not None:
-            while True:
-                img = random.choice(self.images)
-                if img not in blacklist:
-                    return img
-        else:
-            return random.choice(self.images)
+        self._blacklisted_images.add(url)
+        self._pool.discard(url)
+        config.sadd("img:{}:blacklist".format(self.name), url)
 
     async def add_to_list(
             self,
@@ -176,16 +394,32 @@ class ImageList:
             img = self.imgur_client.upload_from_url(url, anon=False)
             target = target_album_id if target_album_id else self.album_list[-1]
             self.imgur_client.album_add_images(target, img["id"])  # Pull from the last album to add to it
-            self.images.append(img["link"])
+            if img["link"] not in self._blacklisted_images:
+                self._pool.add(img["link"])
+
+            # Only the new image needs writing, there's no need to pull the whole list back down from imgur
+            pipe = config.pipeline(transaction=False)
+            pipe.sadd("img:cache:{}:albums:{}:urls".format(self.name, target), img["link"])
+            pipe.sadd("img:cache:{}:imgs".format(self.name), img["link"])
+            pipe.execute()
+
             added_msg = "{} added successfully".format(self.name) if self.msg_on_add is None else self.msg_on_add
             log.info("New {} added by {}.".format(self.name, ctx.message.author.name))
             await ctx.send(added_msg)
 
-            self.save_to_cache()
-
     async def remove_album(self, album_id: str) -> 'ImageList':
         """Remove an album and all its images from the image list."""
-        config.srem("img:albums:{}:ids".format(self.name), album_id)  # Expected to raise an error
+        remaining = [a for a in self.album_list if a != album_id]
+        pipe = config.pipeline(transaction=False)
+        pipe.srem("img:albums:{}:ids".format(self.name), album_id)  # Expected to raise an error
+        pipe.delete("img:cache:{}:albums:{}:urls".format(self.name, album_id),
+                    "img:cache:{}:albums:{}:etag".format(self.name, album_id))
+        if remaining:
+            pipe.sunionstore("img:cache:{}:imgs".format(self.name),
+                             ["img:cache:{}:albums:{}:urls".format(self.name, a) for a in remaining])
+        else:
+            pipe.delete("img:cache:{}:imgs".format(self.name))
+        pipe.execute()
         return ImageList.from_cache(self.name)
 
     def to_dict(self) -> Dict[str, Union[str, Dict[str, Union[List[str], int]]]]:
@@ -207,30 +441,33 @@ class ImageList:
 
         # Since we're going to be fetching all images from imgur anyway, we might as well update the instance here too
         # so that we catch any new images that might have been added in the meantime.
-        self.images = images
+        self.set_images(images)
 
         return output
 
     async def to_cache(self) -> None:
-        images = []
         config.set("img:cache:{}:name".format(self.name), value=self.name)
-        for album_id in self.album_list:
-            album_image_urls = self.load_from_imgur(album_id)  # safe function
-            if album_image_urls:
-                images.extend(album_image_urls)
-                config.sadd("img:cache:{}:albums:{}:urls".format(self.name, album_id), *album_image_urls)
-        try:
-            config.sadd("img:cache:{}:imgs".format(self.name), *images)
-        except ResponseError:
-            log.exception("Could not add images for album {}: is it empty?".format(self.name))
-
-        self.images = images  # Since we're pulling them all from imgur again anyway
+        await self.album_sync.sync(self)
 
     @classmethod
     def from_cache(cls, image_list_name: str) -> 'ImageList':
-        album_ids = list(config.smembers("img:albums:{}:ids".format(image_list_name)))
-        image_list = list(config.smembers("img:cache:{}:imgs".format(image_list_name)))
-        return cls(image_list_name, album_ids, image_list=image_list)
+        return cls.from_cache_many([image_list_name])[0]
+
+    @classmethod
+    def from_cache_many(cls, image_list_names: List[str]) -> List['ImageList']:
+        """Load several image lists and their blacklists from the cache in one round trip."""
+        pipe = config.pipeline(transaction=False)
+        for name in image_list_names:
+            pipe.smembers("img:albums:{}:ids".format(name))
+            pipe.smembers("img:cache:{}:imgs".format(name))
+            pipe.smembers("img:{}:blacklist".format(name))
+        results = pipe.execute()
+
+        image_lists = []
+        for i, name in enumerate(image_list_names):
+            album_ids, image_list, blacklist = results[3 * i:3 * i + 3]
+            image_lists.append(cls(name, list(album_ids), image_list=list(image_list), blacklist=blacklist))
+        return image_lists
 
 
 class ImageListCommands(commands.Cog):
@@ -238,7 +475,9 @@ class ImageListCommands(commands.Cog):
 
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
+        self.album_sync = AlbumSync(bot.loop)
         ImageList.bot = bot
+        ImageList.album_sync = self.album_sync
         self.list_objs = []
         self._cache_updating = False
 
@@ -246,30 +485,34 @@ class ImageListCommands(commands.Cog):
 
         self.config = self.bot.config
         # self.raw_album_dict = config.scan(match="img:albums")[1]  # This one's updated with manual commands.
-        for set_name in config.scan_iter(match="img:albums:*"):  # scan over all of the image lists
-            command_name = set_name.split(":")[-2]
-
-            # Try to load from the cache.
-            if config.exists("img:cache:{}:imgs".format(command_name)):
-                new_image_list = ImageList.from_cache(command_name)
-
-            else:
-                # If it doesn't exist in the cache yet, load it from imgur, then cache it.
-                new_image_list = ImageList(command_name, list(config.smembers(set_name)))
+        command_names = [set_name.split(":")[-2] for set_name in config.scan_iter(match="img:albums:*")]
+
+        pipe = config.pipeline(transaction=False)
+        for command_name in command_names:
+            pipe.exists("img:cache:{}:imgs".format(command_name))
+        cached = pipe.execute()
+
+        # Try to load from the cache.
+        self.list_objs.extend(ImageList.from_cache_many([name for name, hit in zip(command_names, cached) if hit]))
+
+        for command_name, hit in zip(command_names, cached):
+            if not hit:
+                # If it doesn't exist in the cache yet, start it empty. The sync below fills it from imgur, off the
+                # event loop, rather than holding up startup.
+                album_ids = list(config.smembers("img:albums:{}:ids".format(command_name)))
+                blacklist = config.smembers("img:{}:blacklist".format(command_name))
+                self.list_objs.append(ImageList(command_name, album_ids, image_list=[], blacklist=blacklist))
                 log.info("Album {} was not in cache, adding.".format(command_name))
-                # new_image_list.save_to_cache()  # They all get cached later anyway
 
             # If a command is already defined as a function in the class, we'll ignore it here
             if not hasattr(self, command_name):
                 self.create_new_command(command_name)
 
-            self.list_objs.append(new_image_list)
-
         log.info("Image lists initialized.")
         self.bot.loop.create_task(self.update_cache())
 
-    def get_blacklist(self, cmd_name) -> Set[str]:
-        return self.config.smembers("img:{}:blacklist".format(cmd_name))
+    def cog_unload(self) -> None:
+        self.album_sync.close()
 
     async def new_command_func(self, cog, ctx):
         await self.process_command(ctx)
@@ -338,6 +581,13 @@ class ImageListCommands(commands.Cog):
 
         return embed
 
+    async def _send_image(self, ctx: Context, obj: ImageList) -> None:
+        image_link = obj.get_image()
+        if image_link is None:
+            await ctx.send("No images available for {}.".format(obj.name))
+        else:
+            await ctx.send(embed=self._get_source_embed(image_link))
+
     async def process_command(self, ctx: Context) -> None:
         """
         Automatically handle a basic image list. Take context as a kwarg so we can use it as a Command
@@ -351,8 +601,7 @@ class ImageListCommands(commands.Cog):
                 await ctx.send("https://i.imgur.com/AYoDloF.jpg")  # LUL
             else:
                 obj = discord.utils.get(self.list_objs, name=ctx.command.name)
-                blacklist = self.get_blacklist(ctx.command.name)
-                await ctx.send(embed=self._get_source_embed(obj.get_image(blacklist)))
+                await self._send_image(ctx, obj)
 
     async def add(
             self, name: str, ctx: Context, url: str,
@@ -388,18 +637,17 @@ class ImageListCommands(commands.Cog):
 
     async def update_cache(self) -> None:
         """
-        Update all cache files.
-        Must be called as a task, otherwise it blocks the event loop.
+        Sync every image list with imgur.
+        Albums are fetched concurrently, with parallelism bounded by AlbumSync's thread pool.
         """
         # Could use a lock here but the feedback is probably more valuable
         if not self._cache_updating:
             self._cache_updating = True
-            for image_list in self.list_objs:
-                log.debug("Updating cache entry for {}.".format(image_list.name))
-                await image_list.to_cache()  # Write to the cache
-                await asyncio.sleep(3)  # wait for 2s to write the next one to cache so we don't clog the event loop
-            log.info("Image list cache updated.")
-            self._cache_updating = False
+            try:
+                await asyncio.gather(*(image_list.to_cache() for image_list in self.list_objs))
+            finally:
+                self._cache_updating = False
+            log.info("Image list cache updated. {}".format(self.album_sync.stats))
         else:
             log.warning("Cache updating, please wait.")
 
@@ -421,14 +669,18 @@ class ImageListCommands(commands.Cog):
             command_exists = False
         config.sadd("img:albums:{}:ids".format(list_name), list_id)
         if not command_exists:
-            self.list_objs.append(ImageList(list_name, [list_id]))
+            obj = ImageList(list_name, [list_id], image_list=[])
+            self.list_objs.append(obj)
             self.create_new_command(list_name)
+            obj.save_to_cache()
         else:
             obj = discord.utils.get(self.list_objs, name=list_name)
             if obj is None:
-                obj = ImageList(list_name, [list_id])
-            else:
-                obj.images.append(list_id)
+                obj = ImageList(list_name, [list_id], image_list=[],
+                                blacklist=config.smembers("img:{}:blacklist".format(list_name)))
+                self.list_objs.append(obj)
+            elif list_id not in obj.album_list:
+                obj.album_list.append(list_id)
             obj.save_to_cache()
 
         await ctx.send("Image list added to datafile successfully.")
@@ -539,7 +791,7 @@ class ImageListCommands(commands.Cog):
                                " region")
             else:
                 obj = discord.utils.get(self.list_objs, name="nonya")
-                await ctx.send(embed=self._get_source_embed(obj.get_image(self.get_blacklist("nonya"))))
+                await self._send_image(ctx, obj)
 
     @commands.command(aliases=["shep"])
     async def loreal(self, ctx: Context) -> None:
@@ -629,12 +881,16 @@ class ImageListCommands(commands.Cog):
     @checks.sudo()
     @commands.command()
     async def blacklist_img(self, ctx: Context, command_name: str, image_url: str):
-        self.config.sadd("img:{}:blacklist".format(command_name), image_url)
+        obj = discord.utils.get(self.list_objs, name=command_name)
+        if obj is not None:
+            obj.blacklist_image(image_url)
+        else:
+            self.config.sadd("img:{}:blacklist".format(command_name), image_url)
         await ctx.send("Image has been blacklisted for command {}".format(command_name))
 
     @commands.Cog.listener()
     async def on_timer_update(self, secs: int) -> None:
-        if secs % 21600 == 0 and secs != 0:  # 6 hrs of uptime
+        if secs % ALBUM_SYNC_INTERVAL == 0 and secs != 0:
             self.bot.loop.create_task(self.update_cache())
 
 
@@ -3,7 +3,6 @@ import asyncio
 import datetime
 import logging
 import time
-from io import BytesIO
 
 from typing import Union, List
 
@@ -14,8 +13,8 @@ from discord import (
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
-from cogs.utils.utils import download_image
 from .utils import checks
+from .utils.attachments import get_attachment_preserver
 
 
 T_GuildChannel = Union[GroupChannel, TextChannel, VoiceChannel]
@@ -108,38 +107,20 @@ class Logs(commands.Cog):
             if message.content:
                 embed.add_field(name="Content", value=message.content)
 
-            # Attempt to download an image from the message if it exists
-
-            reupload = None
-            files = []
+            async def deliver(files):
+                try:
+                    dest = self.bot.get_channel(198526174735892480)
+                    await dest.send(embed=embed, files=files or None)
+                except discord.HTTPException:
+                    pass
 
+            # Re-upload any attachments from the background, rather than downloading them here
             if message.attachments:
                 embed.add_field(name="File attached above", value=message.attachments[0].url)
-                for attachment in message.attachments:
-                    temp_image = BytesIO()
-                    if attachment.size > 5000000:
-                        # caching is important and all, but this will just cause more harm than good
-                        pass
-                    else:
-                        try:
-                            await download_image(message.attachments[0].url, temp_image)
-                            reupload = discord.File(temp_image, filename="reupload.{}".format(attachment.filename))
-                            files.append(reupload)
-
-                        except Exception:
-                            log.exception("Encountered exception when downloading attachment.")
-
-            try:
-                dest = self.bot.get_channel(198526174735892480)
-                if len(files) == 0:
-                    await dest.send(embed=embed)
-                elif len(files) == 1:
-                    await dest.send(embed=embed, file=files[0])
-                else:
-                    await dest.send(embed=embed, files=reupload)
-            except discord.HTTPException:
-                pass
+                if get_attachment_preserver(self.bot).preserve(message.attachments[:10], deliver):
+                    return
 
+            await deliver([])
             return
 
         elif message.guild == self.guild:  # Pokemon server only
@@ -1,6 +1,5 @@
 """image manipulations"""
 
-import imageio
 import math
 import os.path
 
@@ -12,20 +11,25 @@ from typing import Union, Tuple, List
 from uuid import uuid4
 
 import aiohttp
-import cv2
 import discord
 import numpy as np
 import PIL
 import PIL.Image
-from wand.image import Image
 import concurrent.futures
 
 from discord import Member, Asset
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
-from .utils import rate_limits, checks, rgb_transform, gif_overlay, utils
-from .utils.magik import CustomImage
+from .utils import rate_limits, checks, rgb_transform, utils
+from .utils.startup import lazy_import
+
+# These take a while to import and are only needed once a manip actually runs, so defer them until then
+cv2 = lazy_import("cv2")
+imageio = lazy_import("imageio")
+wand_image = lazy_import("wand.image")
+gif_overlay = lazy_import("cogs.utils.gif_overlay")
+magik = lazy_import("cogs.utils.magik")
 
 
 class Manips(commands.Cog):
@@ -77,9 +81,9 @@ class Manips(commands.Cog):
                        ctx=None, as_ndarray: bool = False) -> Union[np.ndarray, BytesIO]:
 
         if isinstance(base_img_path, str):
-            base_img = Image(filename=base_img_path)
+            base_img = wand_image.Image(filename=base_img_path)
         else:
-            base_img = Image(blob=base_img_path.read())
+            base_img = wand_image.Image(blob=base_img_path.read())
             base_img_path.seek(0)
         base_img = Manips.magic_rescale(base_img)
 
@@ -123,9 +127,9 @@ class Manips(commands.Cog):
     def add_radial_blur(base_img_path) -> Union[np.ndarray, BytesIO]:
 
         if isinstance(base_img_path, str):
-            base_img = CustomImage(filename=base_img_path)
+            base_img = magik.CustomImage(filename=base_img_path)
         else:
-            base_img = CustomImage(blob=base_img_path.read())
+            base_img = magik.CustomImage(blob=base_img_path.read())
             base_img_path.seek(0)
         # base_img = Manips.magic_rescale(base_img)
 
@@ -164,9 +168,9 @@ class Manips(commands.Cog):
         """
 
         if isinstance(base_img_path, str):
-            base_img = Image(filename=base_img_path)
+            base_img = wand_image.Image(filename=base_img_path)
         else:
-            base_img = Image(blob=base_img_path.read())
+            base_img = wand_image.Image(blob=base_img_path.read())
             base_img_path.seek(0)
         base_img = Manips.magic_rescale(base_img)
 
@@ -204,9 +208,9 @@ class Manips(commands.Cog):
                     color_intensity: float = 0, blur_intensity: float = 0) -> Union[np.ndarray, BytesIO]:
 
         if isinstance(base_img_path, str):
-            base_img = Image(filename=base_img_path)
+            base_img = wand_image.Image(filename=base_img_path)
         else:
-            base_img = Image(blob=base_img_path.read())
+            base_img = wand_image.Image(blob=base_img_path.read())
             base_img_path.seek(0)
         base_img = Manips.magic_rescale(base_img)
 
@@ -519,7 +523,7 @@ class Manips(commands.Cog):
         return cv2_img
 
     @staticmethod
-    def magic_rescale(magic_image: Image) -> Image:
+    def magic_rescale(magic_image: 'wand_image.Image') -> 'wand_image.Image':
         w, h = magic_image.size[:2]
         min_scale = 400
 
@@ -1442,7 +1446,7 @@ class Manips(commands.Cog):
 
         async with ctx.typing():
             base_bytes = await self.download_image_to_bytes(image_url)
-            with CustomImage(file=base_bytes) as img:
+            with magik.CustomImage(file=base_bytes) as img:
                 rotation = int(self._parameter_cache.get("rad_blur_degrees", 10))
                 img.radial_blur(rotation)
                 f = BytesIO()
@@ -1467,7 +1471,7 @@ class Manips(commands.Cog):
 
         async with ctx.typing():
             base_bytes = await self.download_image_to_bytes(image_url)
-            with CustomImage(file=base_bytes) as img:
+            with magik.CustomImage(file=base_bytes) as img:
                 for i in range(n_iterations):
                     rotation = int(i / n_iterations * 20)
                     img.radial_blur(rotation)
@@ -1495,7 +1499,7 @@ class Manips(commands.Cog):
         image_url = await self._get_image_url(ctx, image_url)
         async with ctx.typing():
             base_bytes = await self.download_image_to_bytes(image_url)
-            with CustomImage(file=base_bytes) as img:
+            with magik.CustomImage(file=base_bytes) as img:
                 intensity = int(self._parameter_cache.get("cas_intensity", 4))
                 original_width = img.width
                 original_height = img.height
@@ -1,7 +1,6 @@
 """Micspam"""
-import asyncio
-import glob
 import logging
+from io import BytesIO
 from typing import List, Union, Optional
 import re
 import requests.utils
@@ -12,11 +11,13 @@ from discord.ext import commands
 from discord.ext.commands import Context
 
 from .utils import checks
-from cogs.utils.audio import audio_utils
+from cogs.utils.audio.audio_cache import get_audio_cache
+from cogs.utils.audio.clip_bank import ClipBank
+from cogs.utils.audio.voice_sessions import VoicePriority, get_voice_manager
 from sys import stderr
 from .utils.utils import check_ids, check_urls
-from .utils.audio.voiceloader_async import VoiceLoaderAsync
-from os import remove
+from .utils.audio.tts_client import get_tts_client
+from .utils.triggers import Trigger, get_trigger_engine
 import random
 
 
@@ -36,58 +37,68 @@ class CtxMessageWrapper:
 
 class Micspam(commands.Cog):
 
+    # Guilds each keyword plays a clip in
+    OWO_GUILDS = [274731851661443074, 283101596806676481, 401182039421747210, 78716585996455936, 146626123990564864,
+                  392161981261545473, 484966083795746816]
+    GOO_GUILDS = [78716585996455936, 344285545742204940]
+
     def __init__(self, bot):
         self.bot = bot
-        self.downloader = audio_utils.Downloader()
+        self.audio_cache = get_audio_cache(bot)
+        self.voice_sessions = get_voice_manager(bot)
+        self.tts = get_tts_client(bot)
         self.config = bot.config
 
+        # Local clips, pre-decoded so keyword responses start playing right away
+        self.clip_bank = ClipBank(bot.loop)
+        self.clip_bank.refresh_if_changed()
+
         # Guilds we're currently micspamming
         # If a guild in here has a pory voice client, then we are okay to disconnect the existing
         # voice client, since it'd just be interrupting more micspam.
         self._currently_active_guilds = set()
 
-    @staticmethod
-    def get_micspam(clip_chosen, song_list):
-        try:
-            return song_list[clip_chosen]
-        except IndexError:
-            return None
+        self.triggers = get_trigger_engine(bot)
+        self.triggers.register(type(self).__name__, self.on_keyword, [
+            Trigger("owo", guilds=self.OWO_GUILDS, whole_word=True),
+            Trigger("goo", guilds=self.GOO_GUILDS, whole_word=True),
+            Trigger("quagf", guilds=self.GOO_GUILDS),
+        ])
 
-    def micspam_after(self, voice_client: VoiceClient, err, song_path, song_downloaded=False):
+    def micspam_after(self, voice_client: VoiceClient, err, cached_audio=None):
 
-        coro = voice_client.disconnect()
-        fut = asyncio.run_coroutine_threadsafe(coro, self.bot.loop)
-        self._currently_active_guilds.remove(voice_client.guild.id)
+        # Keep the connection around for a bit in case there's more micspam on the way
+        self.voice_sessions.release_threadsafe(voice_client.guild, "micspam")
+        self._currently_active_guilds.discard(voice_client.guild.id)
 
-        if song_downloaded:
-            remove(song_path)
+        if cached_audio is not None:
+            # Leave it in the cache in case it's requested again
+            self.audio_cache.release_threadsafe(cached_audio)
 
         if err is not None:
             print("Error occured in future")
             print('{0.__class__.__name__}: {0}'.format(err), file=stderr)
 
-        try:
-            fut.result()
-        except Exception as e:
-            # an error happened
-            print("Error occured in future")
-            print('{0.__class__.__name__}: {0}'.format(e), file=stderr)
-
     async def _connect_cleanly(self, voice_channel) -> Optional[VoiceClient]:
-        current_connection = voice_channel.guild.voice_client
-        if current_connection and current_connection.guild.id in self._currently_active_guilds:
-            await current_connection.disconnect()
-        elif current_connection and current_connection.guild.id not in self._currently_active_guilds:
-            return None
-        self._currently_active_guilds.add(voice_channel.guild.id)
-        return await voice_channel.connect()
+        """
+        Claim the guild's voice connection, reusing it if we're already connected.
+        Returns None if another cog is holding onto it.
+        """
+        voice_client = await self.voice_sessions.acquire(
+            voice_channel, "micspam", VoicePriority.MICSPAM,
+            on_preempt=lambda: self._currently_active_guilds.discard(voice_channel.guild.id)
+        )
+        if voice_client is not None:
+            if voice_client.is_playing():
+                # Interrupting more micspam
+                voice_client.stop()
+            self._currently_active_guilds.add(voice_channel.guild.id)
+        return voice_client
 
     async def play_micspam(self, channel, clip_chosen, ctx, volume: float = 1.0):
         """Formerly are_you_capping()"""
         voice_client = None
-        downloaded = False
-
-        meme_list = glob.glob("micspam/*.*")
+        cached_audio = None
 
         try:
 
@@ -121,19 +132,20 @@ class Micspam(commands.Cog):
                 await ctx.send("Already connected to voice in the same guild for another cog.")
                 return
 
-            if check_urls(str(clip_chosen)):
-                await self.downloader.download_audio_threaded(clip_chosen, self.bot.loop)
-                stats = await self.downloader.download_stats_threaded(clip_chosen, self.bot.loop)
-                micspam_path = stats["expected_filename"]
-                downloaded = True
+            if isinstance(clip_chosen, bytes):
+                # Already in memory, such as synthesized speech
+                audio_source = discord.FFmpegPCMAudio(BytesIO(clip_chosen), pipe=True)
+            elif check_urls(str(clip_chosen)):
+                cached_audio = await self.audio_cache.acquire(clip_chosen)
+                audio_source = discord.FFmpegPCMAudio(cached_audio.path)
             else:
-                micspam_path = self.get_micspam(int(clip_chosen), meme_list)
+                audio_source = self.clip_bank.get_source(int(clip_chosen))
 
-            if micspam_path is not None:
-                audio_source = discord.FFmpegPCMAudio(micspam_path)
+            if audio_source is not None:
                 audio_source = discord.PCMVolumeTransformer(audio_source, volume)
-                voice_client.play(audio_source, after=lambda err: self.micspam_after(voice_client, err, micspam_path,
-                                                                                     downloaded))
+                voice_client.play(audio_source, after=lambda err: self.micspam_after(voice_client, err, cached_audio))
+                # The after callback owns it now
+                cached_audio = None
             else:
                 try:
                     await ctx.message.channel.send("That micspam value doesn't exist.")
@@ -144,17 +156,36 @@ class Micspam(commands.Cog):
         except Exception as e:
             # Ensure we don't get pory stuck in here
             if voice_client:
-                await voice_client.disconnect(force=True)
+                self._currently_active_guilds.discard(voice_client.guild.id)
+                await self.voice_sessions.disconnect(voice_client.guild, "micspam", force=True)
             raise e
 
+        finally:
+            if cached_audio is not None:
+                self.audio_cache.release(cached_audio)
+
     @checks.sudo()
     @commands.command()
     async def reset(self, ctx: Context):
         """
         Reset all voice clients in the current guild.
         """
-        if ctx.guild.voice_client is not None:
-            await ctx.guild.voice_client.disconnect(force=True)
+        await self.voice_sessions.disconnect(ctx.guild, force=True)
+
+    @checks.sudo()
+    @commands.command(hidden=True)
+    async def voice_stats(self, ctx: Context):
+        """
+        Show the voice connections shared between the audio cogs, and connection metrics.
+        """
+        stats = self.voice_sessions.stats()
+        embed = discord.Embed(description=self.voice_sessions.describe() or "No voice sessions.")
+        embed.set_author(name="Voice sessions")
+        embed.add_field(name="Connections", value="{connects} new, {reuses} reused, {moves} moved\n"
+                                                  "{avg_connect_time:.02f}s average connect time".format(**stats))
+        embed.add_field(name="Claims", value="{active} active, {idle} idle\n{preemptions} preempted, "
+                                             "{denied} denied, {idle_disconnects} idle disconnects".format(**stats))
+        await ctx.send(embed=embed)
 
     @checks.sudo()
     @commands.command(hidden=True, pass_context=True, aliases=["spam"])
@@ -177,9 +208,9 @@ class Micspam(commands.Cog):
     @checks.sudo()
     @commands.command(hidden=True)
     async def micspam(self, ctx):
-        meme_list = glob.glob("micspam/*.*")
+        self.clip_bank.refresh_if_changed()
         output_msg = ""
-        for n, file in enumerate(meme_list):
+        for n, file in enumerate(self.clip_bank.clips):
             output_msg += "{0}: {1}\n".format(n, file)
 
         await ctx.send(output_msg)
@@ -190,56 +221,50 @@ class Micspam(commands.Cog):
             endpoint = "http://tts.cyzon.us/tts?text={}".format(requests.utils.quote(message))
             await self.play_micspam(ctx.message.author.voice.channel, endpoint, ctx, 3)
 
+    async def _play_tts(self, ctx, message: str, voice_name: str):
+        if len(message) > 300:
+            await ctx.send("Message too long, trimmed to 300 chars")
+        if voice_name not in self.tts.voices:
+            await ctx.send("Unknown voice `{}`.".format(voice_name))
+            return
+        audio = await self.tts.synthesize(message[:300], voice_name)
+        await self.play_micspam(ctx.message.author.voice.channel.id, audio, ctx)
+
     @commands.command(hidden=True)
     async def tts(self, ctx, *, message: str):
         if ctx.message.author.voice is not None:
-            voice_loader = VoiceLoaderAsync()
-            if len(message) > 300:
-                await ctx.send("Message too long, trimmed to 300 chars")
-            url = await voice_loader.process_text(message[:300], "WillFromAfar")
-            await self.play_micspam(ctx.message.author.voice.channel.id, url, ctx)
+            await self._play_tts(ctx, message, "WillFromAfar")
 
     @commands.command(hidden=True)
     async def randtts(self, ctx, *, message: str):
         if ctx.message.author.voice is not None:
-            voice_loader = VoiceLoaderAsync()
-            voice = random.choice(voice_loader.voices)
-            url = await voice_loader.process_text(message[:300], voice.name)
-            if len(message) > 300:
-                await ctx.send("Message too long, trimmed to 300 chars")
-            await self.play_micspam(ctx.message.author.voice.channel.id, url, ctx)
+            await self._play_tts(ctx, message, self.tts.voices.random().name)
 
     @commands.command(hidden=True)
     async def choice_tts(self, ctx, voice: str, *, message: str):
         if ctx.message.author.voice is not None:
-            voice_loader = VoiceLoaderAsync()
-            url = await voice_loader.process_text(message[:300], voice)
-            if len(message) > 300:
-                await ctx.send("Message too long, trimmed to 300 chars")
-            await self.play_micspam(ctx.message.author.voice.channel.id, url, ctx)
+            await self._play_tts(ctx, message, voice)
 
     @commands.command(hidden=True)
     async def yoda(self, ctx, *, message: str):
         if ctx.message.author.voice is not None:
-            voice_loader = VoiceLoaderAsync()
-            url = await voice_loader.process_text(message[:300], "WillLittleCreature")
-            if len(message) > 300:
-                await ctx.send("Message too long, trimmed to 300 chars")
-            await self.play_micspam(ctx.message.author.voice.channel.id, url, ctx)
+            await self._play_tts(ctx, message, "WillLittleCreature")
 
     @commands.command(hidden=True)
     async def up_close(self, ctx, *, message: str):
         if ctx.message.author.voice is not None:
-            voice_loader = VoiceLoaderAsync()
-            url = await voice_loader.process_text(message[:300], "WillUpClose")
-            if len(message) > 300:
-                await ctx.send("Message too long, trimmed to 300 chars")
-            await self.play_micspam(ctx.message.author.voice.channel.id, url, ctx)
+            await self._play_tts(ctx, message, "WillUpClose")
+
+    @checks.sudo()
+    @commands.command(hidden=True)
+    async def tts_stats(self, ctx):
+        """Show TTS backend and cache stats."""
+        await ctx.send("```{}```".format("\n".join("{}: {}".format(k, v) for k, v in self.tts.stats().items())))
 
     async def kill_voice_connections(self):
         for voice_obj in self.bot.voice_clients:
             if voice_obj.channel.guild.id in self._currently_active_guilds:
-                await voice_obj.disconnect(force=True)
+                await self.voice_sessions.disconnect(voice_obj.guild, "micspam", force=True)
 
     async def respond_to_keyword(self, message, allowed_guilds: List[int], response: int):
         if message.guild is not None and message.guild.id in allowed_guilds and \
@@ -248,23 +273,17 @@ class Micspam(commands.Cog):
                                     response,
                                     CtxMessageWrapper(message))
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        # TODO FIX THIS NASTY HACK
-        if " owo " in message.content or message.content == "owo":
-            await self.respond_to_keyword(message,
-                                          [274731851661443074, 283101596806676481, 401182039421747210, 78716585996455936, 146626123990564864, 392161981261545473, 484966083795746816],
-                                          random.choice([2, 11, 20, 23, 30, 36, 40]))
-        elif " goo " in message.content or (message.content == "goo" and not message.content == "!goo"):
-            await self.respond_to_keyword(message,
-                                          [78716585996455936, 344285545742204940],
-                                          31)
-        elif "quagf" in message.content:
-            await self.respond_to_keyword(message,
-                                          [78716585996455936, 344285545742204940],
-                                          3)
-
-    def __unload(self):
+    async def on_keyword(self, message: discord.Message, keywords: List[str]):
+        """Called by the trigger engine for messages containing our keywords."""
+        if "owo" in keywords:
+            await self.respond_to_keyword(message, self.OWO_GUILDS, random.choice([2, 11, 20, 23, 30, 36, 40]))
+        elif "goo" in keywords:
+            await self.respond_to_keyword(message, self.GOO_GUILDS, 31)
+        elif "quagf" in keywords:
+            await self.respond_to_keyword(message, self.GOO_GUILDS, 3)
+
+    def cog_unload(self):
+        self.triggers.unregister(type(self).__name__)
         if self._currently_active_guilds:
             n = len(self._currently_active_guilds)
             self.bot.loop.create_task(self.kill_voice_connections())
@@ -7,6 +7,7 @@ import discord
 from discord.ext import commands
 import traceback
 from cogs.utils.audio.playlist import Playlist
+from cogs.utils.audio.voice_sessions import VoicePriority, get_voice_manager
 
 log = logging.getLogger()
 
@@ -17,11 +18,30 @@ class MusicPlayer(commands.Cog):
         self.bot = bot
         self.active_playlists = {}
         self.saved_songs = config.Config("saved_songs.json")
+        self.voice_sessions = get_voice_manager(bot)
 
     def kill_voice_connections(self):
         for active_playlist in self.active_playlists:
             del active_playlist
 
+    async def _bind(self, voice_channel: discord.VoiceChannel, text_channel) -> Optional[Playlist]:
+        """Claim the guild's voice connection and set up a playlist on it."""
+        guild = voice_channel.guild
+
+        def on_preempt():
+            playlist = self.active_playlists.pop(guild.id, None)
+            if playlist is not None:
+                playlist.shut_down()
+
+        voice_client = await self.voice_sessions.acquire(voice_channel, "music", VoicePriority.MUSIC,
+                                                         on_preempt=on_preempt)
+        if voice_client is None:
+            return None
+
+        playlist = Playlist(self.bot, voice_client, text_channel)
+        self.active_playlists[guild.id] = playlist
+        return playlist
+
     def get_playlist(self, ctx) -> Optional[Playlist]:
         """Shorthand for getting the current bound playlist."""
         return self.active_playlists.get(ctx.message.guild.id)
@@ -44,8 +64,9 @@ class MusicPlayer(commands.Cog):
             await ctx.send("Could not find a channel to bind to.")
             return
 
-        voice_client = await voice_channel.connect()
-        self.active_playlists[ctx.guild.id] = Playlist(self.bot, voice_client, ctx.message.channel)
+        if await self._bind(voice_channel, ctx.message.channel) is None:
+            await ctx.send("Already connected to voice in the same guild for another cog.")
+            return
 
         await ctx.send("`Bound to voice channel {0.name}`".format(voice_channel))
         log.info("Bound to voice channel {0.name}".format(voice_channel))
@@ -58,9 +79,10 @@ class MusicPlayer(commands.Cog):
         if self.get_playlist(ctx) is None:
             if ctx.author.voice is not None:
                 # TODO this is repeated above
-                voice_client = await ctx.author.voice.channel.connect()
+                if await self._bind(ctx.author.voice.channel, ctx.message.channel) is None:
+                    await ctx.send("Already connected to voice in the same guild for another cog.")
+                    return False
                 await ctx.send("`Bound to voice channel {0.name}`".format(ctx.author.voice.channel))
-                self.active_playlists[ctx.guild.id] = Playlist(self.bot, voice_client, ctx.message.channel)
 
             elif ctx.guild.id not in self.active_playlists.keys():
                 await ctx.send("Not bound to a voice channel. Use `!mp init` to connect me.")
@@ -81,9 +103,8 @@ class MusicPlayer(commands.Cog):
                 # Pull the track info first to check if it's a playlist or not
                 info_dict = await playlist.get_track_info(url)
                 if info_dict.get("_type") == "playlist":
-                    index = await playlist.queue_playlist(info_dict)
-                    await ctx.send("Playlist {} ({} items) queued successfully.".format(info_dict["title"],
-                                                                                        len(info_dict["entries"])))
+                    index = await playlist.queue_playlist(info_dict, ctx)
+                    await ctx.send("Playlist {} queued successfully.".format(info_dict.get("title", url)))
                 else:
                     info_dict, index = await playlist.add_to_queue(url, ctx)
             if index == 0 and not playlist.is_playing:
@@ -182,7 +203,8 @@ class MusicPlayer(commands.Cog):
         """Kill the voice connection"""
         if playlist.voice_client is not None:
             # Clean up
-            await playlist.voice_client.disconnect()
+            self.active_playlists.pop(ctx.guild.id, None)
+            await self.voice_sessions.disconnect(ctx.guild, "music")
             del playlist  # Needed so we don't run into garbage collection issues
             await ctx.send("Disconnected.")
             log.info("Voice player killed forcefully by {.message.author.name}".format(ctx))
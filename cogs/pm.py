@@ -17,6 +17,13 @@ guild
                 + reaction: A dict of {message_id: emoji_id) representing everywhere this role is used with reactions
                 + bans: hashmap of {user_id: unban_time_epoch}. Blacklisted users have a ban time of -1
                 + TODO prereqs: Set of role IDS which must be satisfied for this role to be added.
+        + bans
+            + expiry: sorted set of "[user_id]:[role title]" scored by unban_time_epoch (+inf for blacklists)
+
+roles
+    + bans
+        + expiry: sorted set of "[guild_id]:[user_id]:[role title]" scored by unban_time_epoch, for timed bans only.
+            Drained by the roleban sweeper as bans lapse.
 
 Flow: Mod registers role for guild. User attempts to add the role by name. Guild is checked.
 
@@ -29,6 +36,7 @@ from discord.ext import commands
 import discord
 import datetime
 import asyncio
+import logging
 
 from discord.ext.commands import Context
 from math import floor
@@ -38,6 +46,53 @@ from time import time
 from .utils import checks
 from .mod import DurationTimeStamp
 
+log = logging.getLogger()
+
+# Longest the sweeper will sleep before re-checking the schedule, in case something was written outside of this cog.
+ROLEBAN_SWEEP_MAX_SLEEP = 300
+
+
+class GuildRoleIndex:
+    """
+    In-memory snapshot of every role registered in a guild.
+
+    Built in two pipelined round trips and kept until one of the management commands writes to the guild's roles,
+    so reaction events and !set/!unset can be resolved without touching redis.
+    """
+
+    __slots__ = ("names", "reactions", "bans", "prereqs")
+
+    def __init__(self, names: dict = None):
+        # role title -> role id
+        self.names = names or {}
+        # (message id, emoji) -> role title
+        self.reactions = {}
+        # role title -> {user_id: unban_time_epoch}
+        self.bans = {}
+        # role title -> {role_id: ...}
+        self.prereqs = {}
+
+    @classmethod
+    def from_redis(cls, config, guild_id: int) -> "GuildRoleIndex":
+        index = cls(config.hgetall("guild:{}:roles:all:names".format(guild_id)))
+        titles = list(index.names)
+
+        pipe = config.pipeline(transaction=False)
+        for title in titles:
+            pipe.hgetall("guild:{}:roles:roles:{}:reactions".format(guild_id, title))
+            pipe.hgetall("guild:{}:roles:roles:{}:bans".format(guild_id, title))
+            pipe.hgetall("guild:{}:roles:roles:{}:prereqs".format(guild_id, title))
+        results = pipe.execute() if titles else []
+
+        for i, title in enumerate(titles):
+            reactions, bans, prereqs = results[i * 3:i * 3 + 3]
+            for message_id, emoji in reactions.items():
+                index.reactions[(message_id, emoji)] = title
+            index.bans[title] = bans
+            index.prereqs[title] = prereqs
+
+        return index
+
 
 class PMs(commands.Cog):
 
@@ -48,6 +103,16 @@ class PMs(commands.Cog):
         # Quick cache to ensure users don't get reaction roles while using management commands.
         self._ignore_reactions_from = set()
 
+        # guild id -> GuildRoleIndex, dropped whenever that guild's roles are written to
+        self._role_index = {}
+
+        # Set whenever a new timed ban is scheduled so the sweeper can re-evaluate how long to sleep.
+        self._roleban_scheduled = asyncio.Event()
+        self._roleban_sweeper = self.bot.loop.create_task(self.sweep_rolebans())
+
+    def cog_unload(self):
+        self._roleban_sweeper.cancel()
+
     # TODO create a bot-wide raid mode, disabling role-adding commands
 
     @property
@@ -60,21 +125,110 @@ class PMs(commands.Cog):
         member = discord.utils.get(guild.members, id=user.id)
         return discord.utils.get(member.roles, id=role_id) is not None
 
-    def get_rolebans(self, guild: Guild, role_title: str) -> dict:
-        """Get a guild's role-bans."""
+    def _get_role_index(self, guild: Guild) -> GuildRoleIndex:
+        """
+        Get the cached role index for a guild, building it if it isn't loaded yet.
+        A failed load isn't cached, so the next call will try again.
+        """
+        index = self._role_index.get(guild.id)
+        if index is None:
+            try:
+                index = GuildRoleIndex.from_redis(self.config, guild.id)
+            except RedisError:
+                return GuildRoleIndex()
+            self._role_index[guild.id] = index
+        return index
+
+    def _invalidate_role_index(self, guild: Guild) -> None:
+        """Drop a guild's role index. Must be called after anything writes to the guild's roles."""
+        self._role_index.pop(guild.id, None)
+
+    def _schedule_roleban(self, guild: Guild, user_id: int, role_title: str, expire_time: float, pipe=None) -> None:
+        """
+        Record a ban in the time-ordered expiry indexes.
+        Permanent bans (-1) are only kept in the guild index, where they sort after every timed ban.
+        """
+        execute = pipe is None
+        if pipe is None:
+            pipe = self.config.pipeline(transaction=False)
+
+        expire_time = float(expire_time)
+        member = "{}:{}".format(user_id, role_title)
+        if expire_time == -1:
+            pipe.zadd("guild:{}:roles:bans:expiry".format(guild.id), {member: float("inf")})
+            pipe.zrem("roles:bans:expiry", "{}:{}".format(guild.id, member))
+        else:
+            pipe.zadd("guild:{}:roles:bans:expiry".format(guild.id), {member: expire_time})
+            pipe.zadd("roles:bans:expiry", {"{}:{}".format(guild.id, member): expire_time})
+
+        if execute:
+            pipe.execute()
+            self._roleban_scheduled.set()
+
+    def _lift_roleban(self, guild_id: int, user_id, role_title: str) -> None:
+        """Remove a ban from the bans hash and both expiry indexes in one round trip."""
+        member = "{}:{}".format(user_id, role_title)
+        pipe = self.config.pipeline(transaction=False)
+        pipe.hdel("guild:{}:roles:roles:{}:bans".format(guild_id, role_title), user_id)
+        pipe.zrem("guild:{}:roles:bans:expiry".format(guild_id), member)
+        pipe.zrem("roles:bans:expiry", "{}:{}".format(guild_id, member))
+        pipe.execute()
+        self._role_index.pop(guild_id, None)
+
+    def _backfill_roleban_schedule(self) -> None:
+        """Index any bans that were written before the expiry indexes existed. Safe to re-run."""
+        pipe = self.config.pipeline(transaction=False)
+        for guild in self.bot.guilds:
+            for role_title, bans in self._get_role_index(guild).bans.items():
+                for user_id, expire_time in bans.items():
+                    self._schedule_roleban(guild, user_id, role_title, expire_time, pipe=pipe)
+        pipe.execute()
+
+    async def sweep_rolebans(self) -> None:
+        """
+        Lift timed role-bans as they lapse.
+
+        Sleeps until the earliest scheduled expiry, or until a new ban is scheduled, so each ban is lifted once
+        without having to poll every role's ban hash.
+        """
+        await self.bot.wait_until_ready()
+
         try:
-            return self.config.hgetall("guild:{}:roles:roles:{}:bans".format(guild.id, role_title))
+            self._backfill_roleban_schedule()
         except RedisError:
-            return {}
+            log.exception("Failed to backfill roleban expiry index")
+
+        while True:
+            self._roleban_scheduled.clear()
+            delay = ROLEBAN_SWEEP_MAX_SLEEP
+
+            try:
+                now = time()
+                for entry in self.config.zrangebyscore("roles:bans:expiry", "-inf", now):
+                    guild_id, user_id, role_title = entry.split(":", 2)
+                    self._lift_roleban(int(guild_id), user_id, role_title)
+                    log.info("Role-ban on {} for '{}' in guild {} expired.".format(user_id, role_title, guild_id))
+
+                upcoming = self.config.zrange("roles:bans:expiry", 0, 0, withscores=True)
+                if upcoming:
+                    delay = min(max(upcoming[0][1] - time(), 0), ROLEBAN_SWEEP_MAX_SLEEP)
+            except RedisError:
+                log.exception("Failed to sweep expired rolebans")
+
+            try:
+                await asyncio.wait_for(self._roleban_scheduled.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_rolebans(self, guild: Guild, role_title: str) -> dict:
+        """Get a guild's role-bans."""
+        return self._get_role_index(guild).bans.get(role_title, {})
 
     def get_role_prereqs(self, guild: Guild, role_title: str):
-        try:
-            return self.config.hgetall("guild:{}:roles:roles:{}:prereqs".format(guild.id, role_title))
-        except RedisError:
-            return set()
+        return self._get_role_index(guild).prereqs.get(role_title, {})
 
     def role_exists(self, guild: Guild, role_title: str) -> bool:
-        return self.config.hexists("guild:{}:roles:all:names".format(guild.id), role_title)
+        return role_title in self._get_role_index(guild).names
 
     def get_guild_config(self, guild: Guild) -> dict:
         try:
@@ -87,16 +241,10 @@ class PMs(commands.Cog):
         Get all role titles for the guild.
         """
         # TODO Consider adding alias tags which simply have a reference to another role.
-        try:
-            return self.config.hgetall("guild:{}:roles:all:names".format(guild.id))
-        except RedisError:
-            return {}
+        return self._get_role_index(guild).names
 
     def _get_role_id_from_title(self, guild: Guild, role_title: str) -> Optional[int]:
-        try:
-            return self.config.hget("guild:{}:roles:all:names".format(guild.id), role_title.lower())
-        except RedisError:
-            return None
+        return self._get_role_index(guild).names.get(role_title.lower())
 
     def _get_role_reactions(self, guild: Guild, role_title: str):
         """
@@ -104,10 +252,8 @@ class PMs(commands.Cog):
         :param guild: Guild to fetch from
         :param role_title: Title of the role
         """
-        try:
-            return self.config.hgetall("guild:{}:roles:roles:{}:reactions".format(guild.id, role_title))
-        except RedisError:
-            return {}
+        return {message_id: emoji for (message_id, emoji), title in self._get_role_index(guild).reactions.items()
+                if title == role_title}
 
     def _add_role_reaction(self, guild: Guild, role_title: str, message_id, emoji):
         """
@@ -118,6 +264,7 @@ class PMs(commands.Cog):
 
         self.config.hset("guild:{}:roles:roles:{}:reactions".format(guild.id, role_title),
                          str(message_id), str(emoji))
+        self._invalidate_role_index(guild)
 
     def _remove_role_reaction(self, guild: Guild, role_title: str, message_id):
         """
@@ -126,6 +273,7 @@ class PMs(commands.Cog):
 
         self.config.hdel("guild:{}:roles:roles:{}:reactions".format(guild.id, role_title),
                          message_id)
+        self._invalidate_role_index(guild)
 
     def _get_role_title_from_reaction(self, guild: Guild, message_id: int, emoji: discord.PartialEmoji) -> Optional[str]:
         """
@@ -134,20 +282,8 @@ class PMs(commands.Cog):
         :return:
         """
 
-        # Should only be O(n)
-        # - For all tracked roles: (O(n))
-        #   - Check that the message exists (O(1))
-
-        all_roles = self.get_guild_role_names(guild)
-
-        for role in all_roles:
-            rxn = self.config.hget("guild:{}:roles:roles:{}:reactions".format(guild.id, role), message_id)
-            # Only trigger if the emoji from the reaction on the message matches the role
-            if rxn == str(emoji):
-                return role
-
-        else:
-            return None
+        # Only trigger if the emoji from the reaction on the message matches the role
+        return self._get_role_index(guild).reactions.get((str(message_id), str(emoji)))
 
     @staticmethod
     def _format_datetime(dt: datetime.datetime) -> str:
@@ -221,13 +357,14 @@ class PMs(commands.Cog):
                 # convert the unix timestamp
                 unban_dt = datetime.datetime.utcfromtimestamp(roleban_ts)
 
-                # Ban has expired.
+                # Ban is still in effect
                 if unban_dt > datetime.datetime.utcnow():
                     await response_channel.send("You are temporarily banned from obtaining this role.\n"
                                                 "This ban will expire {}.".format(unban_dt.strftime(fmt)))
                     return
                 else:
-                    self.config.hdel("guild:{}:roles:roles:{}:bans".format(guild.id, role_title), member.id)
+                    # Ban has expired, but the sweeper hasn't gotten to it yet.
+                    self._lift_roleban(guild.id, member.id, role_title)
 
         role_id = self._get_role_id_from_title(guild, role_title)
 
@@ -299,6 +436,7 @@ class PMs(commands.Cog):
         self.config.set("{}:role_id".format(db_key), role_id)
 
         self.config.hset("guild:{}:roles:all:names".format(guild.id), role_title, role_id)
+        self._invalidate_role_index(guild)
 
         await ctx.send("New role '{}' registered with keyword '{}'".format(role_name, role_title))
 
@@ -320,10 +458,26 @@ class PMs(commands.Cog):
                 await ctx.send("Couldn't find the guild provided.")
                 return
 
-        role_key = "guild:{}:roles:roles:{}:role_id".format(guild_id, role_title.lower())
+        role_title = role_title.lower()
+        role_key = "guild:{}:roles:roles:{}:role_id".format(guild_id, role_title)
         if self.config.exists(role_key):
-            self.config.remove(role_key)
-            self.config.hdel("guild:{}:roles:all:names".format(guild_id), role_title)
+            bans_key = "guild:{}:roles:roles:{}:bans".format(guild_id, role_title)
+            expiry_key = "guild:{}:roles:bans:expiry".format(guild_id)
+
+            # Take the role's bans out of the expiry indexes too, or the sweeper would keep lifting them
+            banned = set(self.config.hkeys(bans_key))
+            banned.update(entry.split(":", 1)[0] for entry in self.config.zrange(expiry_key, 0, -1)
+                          if entry.split(":", 1)[1] == role_title)
+
+            pipe = self.config.pipeline(transaction=False)
+            pipe.delete(role_key, bans_key)
+            pipe.hdel("guild:{}:roles:all:names".format(guild_id), role_title)
+            if banned:
+                members = ["{}:{}".format(user_id, role_title) for user_id in banned]
+                pipe.zrem(expiry_key, *members)
+                pipe.zrem("roles:bans:expiry", *("{}:{}".format(guild_id, member) for member in members))
+            pipe.execute()
+            self._invalidate_role_index(guild)
             await ctx.send("Role '{}' was deregistered.".format(role_title))
         else:
             await ctx.send("The given role doesn't exist in the specified guild.")
@@ -432,7 +586,7 @@ class PMs(commands.Cog):
             # If not, we'll surely see it at scale
 
             # Perform a membership check, and see if we've even created any roles.
-            if member is not None and self.config.exists("guild:{}:roles:all:names".format(guild.id)):
+            if member is not None and self._get_role_index(guild).names:
                 guilds_shared.append(guild)
 
         if len(guilds_shared) == 0:  # This shouldn't normally appear
@@ -518,6 +672,8 @@ class PMs(commands.Cog):
                 (time() + duration.to_timedelta().total_seconds()) if duration.pieces.get("y", 0) < 50 else -1
 
             self.config.hset("guild:{}:roles:roles:{}:bans".format(guild.id, role_title), target.id, expire_time)
+            self._schedule_roleban(guild, target.id, role_title, expire_time)
+            self._invalidate_role_index(guild)
 
             # I actually think the way I handled the expiring tags was super clever, should remember that this is a
             # thing in redis
@@ -574,6 +730,8 @@ class PMs(commands.Cog):
                                           reason="Removed due to blacklisting user.")
 
             self.config.hset("guild:{}:roles:roles:{}:bans".format(guild.id, role_title), target.id, -1)
+            self._schedule_roleban(guild, target.id, role_title, -1)
+            self._invalidate_role_index(guild)
 
             # I actually think the way I handled the expiring tags was super clever, should remember that this is a
             # thing in redis
@@ -614,7 +772,7 @@ class PMs(commands.Cog):
             return
         else:
 
-            self.config.hdel("guild:{}:roles:roles:{}:bans".format(guild.id, role_title), target.id)
+            self._lift_roleban(guild.id, target.id, role_title)
 
             server_logs = self.bot.get_cog("ServerLogs")
             if server_logs:
@@ -633,36 +791,34 @@ class PMs(commands.Cog):
 
         embed = discord.Embed(description="Active rolebans", color=discord.Color.orange())
 
-        role_titles = self.get_guild_role_names(ctx.guild)
+        try:
+            # Anything scored before now is waiting on the sweeper, so it isn't active any more.
+            bans = self.config.zrangebyscore(
+                "guild:{}:roles:bans:expiry".format(ctx.guild.id), time(), "+inf", withscores=True
+            )
+        except RedisError:
+            bans = []
 
-        fields_added = False
+        output_lines = {}
 
-        for title in role_titles:
-            try:
-                bans = self.config.hgetall("guild:{}:roles:roles:{}:bans".format(ctx.guild.id, title))
-                output_lines = []
-                for user_id, ban_time in bans.items():
-                    fields_added = True
-                    member = discord.utils.get(ctx.guild.members, id=int(user_id))
-                    if member is None:
-                        user_name = "{} (not present in server)".format(user_id)
-                    else:
-                        user_name = "{} ({})".format(str(member), member.id)
-
-                    ban_time = int(floor(float(ban_time)))
-
-                    if ban_time == -1:
-                        output_lines.append("{}: {}".format(user_name, "Permanent"))
-                    else:
-                        ts = self._format_datetime(datetime.datetime.fromtimestamp(ban_time))
-                        output_lines.append("{}: {}".format(user_name, ts))
-
-                embed.add_field(name="**{}**".format(title), value="\n".join(output_lines))
+        for entry, ban_time in bans:
+            user_id, title = entry.split(":", 1)
+            member = ctx.guild.get_member(int(user_id))
+            if member is None:
+                user_name = "{} (not present in server)".format(user_id)
+            else:
+                user_name = "{} ({})".format(str(member), member.id)
 
-            except RedisError:
-                pass
+            if ban_time == float("inf"):
+                output_lines.setdefault(title, []).append("{}: {}".format(user_name, "Permanent"))
+            else:
+                ts = self._format_datetime(datetime.datetime.fromtimestamp(int(floor(ban_time))))
+                output_lines.setdefault(title, []).append("{}: {}".format(user_name, ts))
+
+        for title, lines in output_lines.items():
+            embed.add_field(name="**{}**".format(title), value="\n".join(lines))
 
-        await ctx.send(embed=embed) if fields_added else await ctx.send("No rolebans active on the server.")
+        await ctx.send(embed=embed) if output_lines else await ctx.send("No rolebans active on the server.")
 
     @checks.has_manage_roles()
     @commands.command(no_pm=True)
@@ -795,32 +951,40 @@ class PMs(commands.Cog):
         finally:
             self._ignore_reactions_from.remove(ctx.author.id)
 
+    def _get_reaction_target(self, payload: discord.RawReactionActionEvent) -> Optional[tuple]:
+        """
+        Resolve a raw reaction event to its guild and role title straight from the role index.
+        Returns None for DMs, ignored users, and reactions that aren't tied to a role, before any API calls are made.
+        """
+        if payload.guild_id is None or payload.user_id == self.bot.user.id \
+                or payload.user_id in self._ignore_reactions_from:
+            return None
+
+        guild = self.bot.get_guild(payload.guild_id)
+        if guild is None:
+            return None
+
+        role_title = self._get_role_title_from_reaction(guild, payload.message_id, payload.emoji)
+        return (guild, role_title) if role_title else None
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
-        chan = self.bot.get_channel(payload.channel_id)
-        message = await chan.fetch_message(payload.message_id)
-        member = await message.guild.fetch_member(payload.user_id)
-        self._ignore_reactions_from.add(self.bot.user.id)
-        if isinstance(message.channel, discord.DMChannel) or payload.user_id in self._ignore_reactions_from:
+        target = self._get_reaction_target(payload)
+        if target is None:
             return
-        role_title = self._get_role_title_from_reaction(message.guild, message.id, payload.emoji)
+        guild, role_title = target
+        member = await guild.fetch_member(payload.user_id)
         # Pass it through our normal mechanisms, but make the messages go to the user instead.
-
-        if role_title:
-            await self.add_role(member, role_title, message.guild, member)
+        await self.add_role(member, role_title, guild, member)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
-        chan = self.bot.get_channel(payload.channel_id)
-
-        message = await chan.fetch_message(payload.message_id)
-        self._ignore_reactions_from.add(self.bot.user.id)
-        member = await message.guild.fetch_member(payload.user_id)
-        if isinstance(message.channel, discord.DMChannel) or payload.user_id in self._ignore_reactions_from:
+        target = self._get_reaction_target(payload)
+        if target is None:
             return
-        role_title = self._get_role_title_from_reaction(message.guild, message.id, payload.emoji)
-        if role_title:
-            await self.remove_role(member, role_title, message.guild, member)
+        guild, role_title = target
+        member = await guild.fetch_member(payload.user_id)
+        await self.remove_role(member, role_title, guild, member)
 
 
 def setup(bot):
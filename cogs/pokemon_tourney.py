@@ -1,6 +1,7 @@
 """A pokemon tourney for the mods, woo hoo"""
+import asyncio
 import logging
-from typing import Dict
+from typing import Dict, Optional, Set
 
 import discord
 from discord.ext import commands
@@ -8,6 +9,7 @@ from discord.ext.commands import Context
 from redis import RedisError
 
 from .utils import checks, utils
+from .utils.badge_render import BadgeCaseRenderer
 
 log = logging.getLogger()
 
@@ -46,6 +48,86 @@ Thank you for participating in the event, and enjoy your permanent medallion in
 
 You can view your badge case by using `!league badge_case`."""
 
+# Guilds holding the badge, ribbon and medallion emoji
+EMOJI_GUILD_IDS = (320254070453567489, 458474187988664333)
+
+GYM_CHANNEL_ID = 325764029538762763
+GYM_BOARD_DEBOUNCE = 10  # Seconds to let a burst of leader updates settle before editing the board
+
+MAX_EMBED_FIELDS = 25
+
+
+class TourneyRegistry:
+    """
+    Leader, ribbon and medallion definitions, read from redis in one round trip and reloaded whenever a league command
+    changes them, so nothing has to scan for them on each use.
+
+    config:pkmn_tourney:leaders:<id> (hm)
+        badge_emoji, inactive ("True"/"False"), format_normal, ...
+    config:pkmn_tourney:ribbons:<emoji> (hm)
+        title, emoji, desc
+    config:pkmn_tourney:medallions:<emoji> (hm)
+        title, emoji, pieces
+    config:pkmn_tourney:active_medallion
+        emoji of the active medallion
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.leaders = {}  # type: Dict[int, Dict[str, str]]
+        self.inactive = set()  # type: Set[int]
+        self.ribbons = {}  # type: Dict[str, Dict[str, str]]  # Keyed by title
+        self.medallions = {}  # type: Dict[str, Dict[str, str]]  # Keyed by emoji
+        self.active_medallion_emoji = None  # type: Optional[str]
+        self.reload()
+
+    def reload(self):
+        leader_keys = []
+        for key in self.config.scan_iter("config:pkmn_tourney:leaders:*"):
+            *_, idx = key.split(":")
+            if idx.isdigit():  # Skips the old per-difficulty keys
+                leader_keys.append(key)
+        ribbon_keys = list(self.config.scan_iter("config:pkmn_tourney:ribbons:*"))
+        medallion_keys = list(self.config.scan_iter("config:pkmn_tourney:medallions:*"))
+
+        pipe = self.config.pipeline(transaction=False)
+        for key in leader_keys + ribbon_keys + medallion_keys:
+            pipe.hgetall(key)
+        pipe.get("config:pkmn_tourney:active_medallion")
+        *hashes, active_medallion_emoji = pipe.execute()
+
+        leader_hashes = hashes[:len(leader_keys)]
+        ribbon_hashes = hashes[len(leader_keys):len(leader_keys) + len(ribbon_keys)]
+        medallion_hashes = hashes[len(leader_keys) + len(ribbon_keys):]
+
+        self.leaders = {int(key.split(":")[-1]): info for key, info in zip(leader_keys, leader_hashes)}
+        # Older entries were written with a bare False, which comes back as the string "False"
+        self.inactive = {idx for idx, info in self.leaders.items() if info.get("inactive") == "True"}
+
+        self.ribbons = {}
+        for key, ribbon_info in zip(ribbon_keys, ribbon_hashes):
+            try:
+                self.ribbons[ribbon_info["title"]] = ribbon_info  # For backwards compatibility
+            except KeyError:
+                log.warning("Invalid ribbon in db: {}: {}".format(key, ribbon_info))
+
+        self.medallions = {key.split(":")[-1]: info for key, info in zip(medallion_keys, medallion_hashes)}
+
+        if str(active_medallion_emoji) == "None" or not active_medallion_emoji:
+            self.active_medallion_emoji = None
+        else:
+            self.active_medallion_emoji = active_medallion_emoji
+
+    @property
+    def badges(self) -> Dict[int, str]:
+        return {idx: info.get("badge_emoji") for idx, info in self.leaders.items()}
+
+    @property
+    def active_medallion(self) -> Optional[Dict[str, str]]:
+        if self.active_medallion_emoji is None:
+            return None
+        return self.medallions.get(self.active_medallion_emoji)
+
 
 class PokemonTourney(commands.Cog):
 
@@ -98,10 +180,51 @@ class PokemonTourney(commands.Cog):
         self.bot = bot
         self.config = bot.config
         self.emb_pag = utils.Paginator(page_limit=1020, trunc_limit=1850)
+        self.registry = TourneyRegistry(self.config)
+        self._emoji_pool = {}  # type: Dict[str, discord.Emoji]
+        self.badge_renderer = BadgeCaseRenderer(bot.loop)
+
+        # The pinned gym board in the gym channel is only edited when what it shows changes
+        self._gym_message = None  # type: Optional[discord.Message]
+        self._gym_board_hash = None  # type: Optional[int]
+        self._gym_board_dirty = asyncio.Event()
+        self._gym_board_dirty.set()  # Check it once on startup
+        self._gym_board_task = self.bot.loop.create_task(self._run_gym_board())
+
+    def cog_unload(self):
+        self._gym_board_task.cancel()
+        self.badge_renderer.close()
+
+    def _reload_registry(self):
+        self.registry.reload()
+        self.badge_renderer.clear()
+        self._gym_board_dirty.set()  # Leaders may have been added or retired
+
+    def _refresh_emoji_pool(self):
+        pool = {}
+        for guild_id in reversed(EMOJI_GUILD_IDS):  # The first guild wins on duplicate names
+            guild = self.bot.get_guild(guild_id)
+            if guild is not None:
+                pool.update((emoji.name, emoji) for emoji in guild.emojis)
+        self._emoji_pool = pool
+        self.badge_renderer.clear()
 
     @property
-    def emoji_pool(self):
-        return self.bot.get_guild(320254070453567489).emojis + self.bot.get_guild(458474187988664333).emojis
+    def emoji_pool(self) -> Dict[str, discord.Emoji]:
+        """{name: emoji} across the emoji guilds"""
+        if not self._emoji_pool:
+            # Guilds aren't available until the bot's ready
+            self._refresh_emoji_pool()
+        return self._emoji_pool
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._refresh_emoji_pool()
+
+    @commands.Cog.listener()
+    async def on_guild_emojis_update(self, guild, before, after):
+        if guild.id in EMOJI_GUILD_IDS:
+            self._refresh_emoji_pool()
 
     @property
     def emoji_guild(self):
@@ -109,15 +232,7 @@ class PokemonTourney(commands.Cog):
 
     @property
     def _leader_ids(self):
-        """More efficient way to find out all of the active leaders than searching"""
-        ids = set()
-        for key in self.config.scan_iter("config:pkmn_tourney:leaders:*"):
-            *_, idx = key.split(":")
-            try:
-                ids.add(int(idx))
-            except ValueError:
-                continue
-        return ids
+        return set(self.registry.leaders)
 
     @property
     def _leader_keys(self):
@@ -129,8 +244,7 @@ class PokemonTourney(commands.Cog):
 
         :return: {user_id: badge_name} for each badge
         """
-        return {int(idx): self.config.hget("config:pkmn_tourney:leaders:{}".format(idx), "badge_emoji")
-                for idx in self._leader_ids}
+        return self.registry.badges
 
     @property
     def ribbons(self):
@@ -139,26 +253,14 @@ class PokemonTourney(commands.Cog):
         Ribbons are stored in redis under
             config:pkmn_tourney:ribbons:<emoji>
         where emoji is in the format `xRibbon`
-        :return: Hashmap consisting of {title: emoji} pairs
+        :return: Hashmap consisting of {title: ribbon info} pairs
         """
-        ribbons = {}
-        for key in self.config.scan_iter("config:pkmn_tourney:ribbons:*"):
-            *_, emoji = key.split(":")
-            ribbon_info = self.config.hgetall(key)
-            try:
-                ribbons[ribbon_info["title"]] = ribbon_info  # For backwards compatibility
-            except KeyError:
-                log.warning("Invalid ribbon in db: {}: {}".format(key, ribbon_info))
-        return ribbons
+        return self.registry.ribbons
 
     @property
     def inactive_leaders(self):
         """Returns IDs of inactive leaders"""
-        inactives = []
-        for idx in self._leader_ids:
-            if self.config.hget("config:pkmn_tourney:leaders:{}".format(idx), "inactive"):
-                inactives.append(idx)
-        return inactives
+        return self.registry.inactive
 
     @property
     def green_dot_emoji(self):
@@ -179,19 +281,11 @@ class PokemonTourney(commands.Cog):
 
     @property
     def medallions(self):
-        medallions = {}
-        for key in self.config.scan_iter("config:pkmn_tourney:medallions:*"):
-            *_, emoji = key.split(":")
-            medallions[emoji] = self.config.hgetall(key)
-        return medallions
+        return self.registry.medallions
 
     @property
     def active_medallion(self):
-        active_medallion_emoji = self.config.get('config:pkmn_tourney:active_medallion')
-        if str(active_medallion_emoji) == "None" or not active_medallion_emoji:
-            return None
-        else:
-            return self.config.hgetall("config:pkmn_tourney:medallions:{}".format(active_medallion_emoji))
+        return self.registry.active_medallion
 
     def _get_medallion_progress_emoji(self, user_pieces_count, base_name):
         """
@@ -203,7 +297,7 @@ class PokemonTourney(commands.Cog):
         if user_pieces_count == 0:
             return base_name + "Unattained"
         # If this fails it's probably because the medallion doesn't exist
-        total_pieces = int(self.config.hget("config:pkmn_tourney:medallions:{}".format(base_name), "pieces"))
+        total_pieces = int(self.registry.medallions[base_name]["pieces"])
         if user_pieces_count < total_pieces:
             return base_name + str(user_pieces_count)
         else:
@@ -272,41 +366,64 @@ class PokemonTourney(commands.Cog):
         }
 
         self.config.hmset("config:pkmn_tourney:medallions:pumpkinRibbon", fall_medal)
+        self._reload_registry()
 
     def _is_inactive(self, member_id):
-        return self.config.hget("config:pkmn_tourney:leaders:{}".format(member_id), "inactive")
+        return member_id in self.registry.inactive
 
     def _get_emoji_from_name(self, name):
         if name is None:
             return "\N{QUESTION MARK}"
         else:
-            return discord.utils.get(self.emoji_pool, name=name)
+            return self.emoji_pool.get(name)
 
     def _get_mod_emoji(self, member_id):
         """Get emoji directly from mod id"""
-        return discord.utils.get(self.emoji_pool, name=self.badges[member_id])
+        return self.emoji_pool.get(self.registry.leaders[member_id].get("badge_emoji"))
+
+    def _get_collections(self, user_id):
+        """
+        Fetch a user's badges, ribbons and medallion pieces in one round trip.
+        :return: (badge emoji set, ribbon emoji set, {medallion emoji: pieces held})
+        """
+        medallion_emojis = list(self.registry.medallions)
+        pipe = self.config.pipeline(transaction=False)
+        pipe.smembers("user:{}:pkmn_tourney:badges".format(user_id))
+        pipe.smembers("user:{}:pkmn_tourney:ribbons".format(user_id))
+        for emoji_name in medallion_emojis:
+            pipe.hget("user:{}:pkmn_tourney:medallions:{}".format(user_id, emoji_name), "pieces")
+        badges, ribbons, *pieces = pipe.execute()
+
+        medallion_pieces = {emoji_name: int(count) for emoji_name, count in zip(medallion_emojis, pieces)
+                            if count is not None}
+        return badges, ribbons, medallion_pieces
 
     def _get_badge_short_name(self, member_id):
         return self.badges[member_id][:-5]  # Chop off "badge"
 
-    def get_in_the_gym_message(self, include_timestamp=False, include_online_members=False):
+    def _gym_board_lines(self, include_online_members=False):
         output = {
             "offline": [],
             "online": [],
             "in_the_gym": []
         }
 
-        for user_id in self.badges:
+        in_the_gym_role = discord.utils.get(self.pokemon_guild.roles, name="In The Gym")
+        for user_id in self.registry.leaders:
             mem = self.pokemon_guild.get_member(user_id)
             if mem is not None and not self._is_inactive(mem.id):
-                if discord.utils.get(mem.roles, name="In The Gym"):
+                if in_the_gym_role is not None and mem._roles.has(in_the_gym_role.id):
                     output["in_the_gym"].append("{} {}".format(str(self.green_dot_emoji), mem.display_name))
                 elif mem.status not in [discord.Status.offline, discord.Status.invisible] and include_online_members:
                     output["online"].append("🔵 {}".format(mem.display_name))
                 else:
                     output["offline"].append("⚫ {}".format(mem.display_name))
-        sorted_output = sorted(output["in_the_gym"]) + sorted(output["online"]) + (sorted(output["offline"]))
-        embed = discord.Embed(color=discord.Color.blue(), description="\n".join(sorted_output))
+        return sorted(output["in_the_gym"]) + sorted(output["online"]) + (sorted(output["offline"]))
+
+    def get_in_the_gym_message(self, include_timestamp=False, include_online_members=False, lines=None):
+        if lines is None:
+            lines = self._gym_board_lines(include_online_members)
+        embed = discord.Embed(color=discord.Color.blue(), description="\n".join(lines))
         embed.set_author(name="Current active gym leaders", icon_url=self.bot.user.avatar_url)
         if include_timestamp:
             embed.set_footer(text="Last updated {}".format(utils.get_timestamp()))
@@ -324,21 +441,21 @@ class PokemonTourney(commands.Cog):
         ribbons = self.ribbons
         badges_key = "user:{}:pkmn_tourney:badges".format(target.id)
         self.config.sadd(badges_key, badges[badge_holder.id])
+        self.badge_renderer.invalidate(target.id)
 
         total_badges = self.config.scard(badges_key)
         if total_badges == 8:
-            self.config.sadd("user:{}:pkmn_tourney:ribbons".format(target.id), ribbons["League Champion"])
+            self.config.sadd("user:{}:pkmn_tourney:ribbons".format(target.id), ribbons["League Champion"]["emoji"])
             await target.add_roles(self.champion_role)
             champion_msg = self._champion_message["League Champion"].format(
-                self._get_emoji_from_name(ribbons["League Champion"]))
-        elif total_badges == len(self.badges.keys()) - len(self.inactive_leaders):
-            self.config.sadd("user:{}:pkmn_tourney:ribbons".format(target.id), ribbons["Elite League Champion"])
-            if not self.config.sismember("user:{}:pkmn_tourney:ribbons".format(target.id), "Elite League Champion"):
+                self._get_emoji_from_name(ribbons["League Champion"]["emoji"]))
+        elif total_badges == len(badges) - len(self.inactive_leaders):
+            elite_emoji = ribbons["Elite League Champion"]["emoji"]
+            if self.config.sadd("user:{}:pkmn_tourney:ribbons".format(target.id), elite_emoji):
                 champion_msg = self._champion_message["Elite League Champion"].format(
-                    self._get_emoji_from_name(ribbons["Elite League Champion"]))
+                    self._get_emoji_from_name(elite_emoji))
             else:
                 champion_msg = ""
-            self.config.sadd("user:{}:pkmn_tourney:ribbons".format(target.id), ribbons["Elite League Champion"])
 
         else:
             champion_msg = ""
@@ -391,56 +508,34 @@ class PokemonTourney(commands.Cog):
 
         self.config.hset("config:pkmn_tourney:leaders:{}".format(ctx.message.author.id),
                          "format_normal", format_info)
+        self._reload_registry()
         await ctx.send("\N{OK HAND SIGN}")
 
-    @league.command(aliases=["profile"])
-    async def badge_case(self, ctx, *, member: discord.Member=None):
-        """Show a user's profile with corresponding badges based on the mods they've defeated."""
-
-        # Caching values so we only read them once
+    def _badge_case_entries(self, member):
+        """
+        Everything shown in a member's badge case, in order.
+        :return: List of (title, emoji name) pairs
+        """
+        # Everything but the user's own collection is already in memory
         inactive_leaders = self.inactive_leaders
         ribbons = self.ribbons
         badges = self.badges
         active_medallion = self.active_medallion
 
-        def get_collection(key):
-            return list(self.config.smembers(key)) if self.config.exists(key) else []
-
-        def get_medallions(user_id):
-            active_emoji_in_case = False
-            medallions = {}
-
-            active_medallion_emoji = self.active_medallion["emoji"] if active_medallion is not None else None
-            for hm_key in self.config.scan_iter("user:{}:pkmn_tourney:medallions:*".format(user_id)):
-                *_, emoji_name = hm_key.split(":")
-                piece_count = int(self.config.hget(hm_key, "pieces"))
-                medallion_progress_emoji = self._get_medallion_progress_emoji(piece_count, emoji_name)
-                medallion_title = self.config.hget("config:pkmn_tourney:medallions:{}".format(emoji_name), "title")
-                # only show partial medallions if they're completed
-                if "complete" not in medallion_progress_emoji.lower() and emoji_name != active_medallion_emoji:
-                    continue
-                else:
-                    medallions[medallion_title] = medallion_progress_emoji
-                    # This is gross but I'll have to take it for now
-                    if active_medallion is not None and active_medallion_emoji in medallion_progress_emoji:
-                        active_emoji_in_case = True
-
-            if not active_emoji_in_case and active_medallion_emoji is not None:
-                medallions[active_medallion["title"]] = active_medallion_emoji + "Unattained"
+        badge_collection, ribbon_collection, medallion_pieces = self._get_collections(member.id)
 
-            return medallions
+        # Only show partial medallions if they're completed, or if they're of the active medallion
+        medallion_collection = {}
+        active_medallion_emoji = active_medallion["emoji"] if active_medallion is not None else None
+        for emoji_name, piece_count in medallion_pieces.items():
+            medallion_progress_emoji = self._get_medallion_progress_emoji(piece_count, emoji_name)
+            if "complete" in medallion_progress_emoji.lower() or emoji_name == active_medallion_emoji:
+                medallion_collection[self.medallions[emoji_name]["title"]] = medallion_progress_emoji
 
-        if member is None:
-            member = ctx.message.author
+        if active_medallion_emoji is not None and active_medallion_emoji not in medallion_pieces:
+            medallion_collection[active_medallion["title"]] = active_medallion_emoji + "Unattained"
 
-        embed = discord.Embed(color=discord.Color.blurple())
-
-        embed.set_author(name="Badge collection for {}".format(member.display_name),
-                         icon_url=member.avatar_url)
-
-        badge_collection = get_collection("user:{}:pkmn_tourney:badges".format(member.id))
-        ribbon_collection = get_collection("user:{}:pkmn_tourney:ribbons".format(member.id))
-        medallion_collection = get_medallions(member.id)  # Returns a tuple (title, progress_emoji)
+        entries = []
 
         # If a badge hasn't been collected, its icon is replaced with a grayed out version.
         # These grayed out badges are shown as `badgenameUnattained`
@@ -459,26 +554,61 @@ class PokemonTourney(commands.Cog):
             else:
                 mod_name = mod_user.name
 
-            embed.add_field(name=mod_name,
-                            value=str(self._get_emoji_from_name(badge)))
+            entries.append((mod_name, badge))
 
         # Clean up in case they have a badge that isn't reflected in the active mod badges
-        for badge_name in self.config.smembers("user:{}:pkmn_tourney:badges".format(member.id)):
-            if badge_name not in badges.values():
-                embed.add_field(name=badge_name[:-5] + "Badge",
-                                value=str(self._get_emoji_from_name(badge_name)))
+        active_badges = set(badges.values())
+        for badge_name in badge_collection:
+            if badge_name not in active_badges:
+                entries.append((badge_name[:-5] + "Badge", badge_name))
 
         for title in sorted(ribbons.keys(), reverse=True):
             if ribbons[title]["emoji"] in ribbon_collection:
-                embed.add_field(name=title, value=str(self._get_emoji_from_name(ribbons[title]["emoji"])))
+                entries.append((title, ribbons[title]["emoji"]))
 
         # Sort over this one in a special way because we only care about the collected ones
         # and possibly the active yet uncollected one
-        for title, emoji in medallion_collection.items():
-            embed.add_field(name=title, value=str(self._get_emoji_from_name(emoji)))
+        entries.extend(medallion_collection.items())
+        return entries
+
+    def _badge_tile(self, title, emoji_name):
+        """Image tiles grey out the badge's own sprite rather than using its `Unattained` emoji."""
+        if emoji_name.endswith("Unattained"):
+            base_emoji = self._get_emoji_from_name(emoji_name[:-len("Unattained")])
+            if base_emoji is not None:
+                return title, base_emoji, False
+        return title, self._get_emoji_from_name(emoji_name), True
+
+    async def _send_badge_case(self, ctx, member, as_image=False):
+        entries = self._badge_case_entries(member)
 
+        embed = discord.Embed(color=discord.Color.blurple())
+        embed.set_author(name="Badge collection for {}".format(member.display_name),
+                         icon_url=member.avatar_url)
+
+        # Embeds can't hold large collections, so those are always sent as an image
+        if as_image or len(entries) > MAX_EMBED_FIELDS:
+            async with ctx.typing():
+                image = await self.badge_renderer.render(
+                    member.id, [self._badge_tile(title, emoji_name) for title, emoji_name in entries])
+            embed.set_image(url="attachment://badge_case.png")
+            await ctx.send(embed=embed, file=discord.File(image, filename="badge_case.png"))
+            return
+
+        for title, emoji_name in entries:
+            embed.add_field(name=title, value=str(self._get_emoji_from_name(emoji_name)))
         await ctx.send(embed=embed)
 
+    @league.command(aliases=["profile"])
+    async def badge_case(self, ctx, *, member: discord.Member=None):
+        """Show a user's profile with corresponding badges based on the mods they've defeated."""
+        await self._send_badge_case(ctx, member or ctx.message.author)
+
+    @league.command(aliases=["badge_image"])
+    async def badge_case_image(self, ctx, *, member: discord.Member=None):
+        """Show a user's badge case as a single image."""
+        await self._send_badge_case(ctx, member or ctx.message.author, as_image=True)
+
     @checks.r_pokemon()
     @league.command()
     async def leader_info(self, ctx, *, member: discord.Member):
@@ -491,7 +621,7 @@ class PokemonTourney(commands.Cog):
         embed.set_author(name="Leader information for {}{}".format(
             member.name, " (retired)" if self._is_inactive(member.id) else ""), icon_url=member.avatar_url)
         embed.set_thumbnail(url=self._get_mod_emoji(member.id).url)
-        user_info = self.config.hgetall("config:pkmn_tourney:leaders:{}".format(member.id))
+        user_info = self.registry.leaders[member.id]
         for difficulty, league_name in [("format_normal", "Mod League"), ("format_hard", "Mod League Plus")]:
             # user_info = self.config.hgetall("config:pkmn_tourney:leaders:{}:{}".format(member.id, difficulty))
             try:
@@ -542,6 +672,7 @@ class PokemonTourney(commands.Cog):
             await ctx.send("User {} already has the {}!".format(member.name, ribbon_name))
         else:
             self.config.sadd("user:{}:pkmn_tourney:ribbons".format(member.id), emoji)
+            self.badge_renderer.invalidate(member.id)
             # This double formatting stuff is needed so that we can possibly inject format strings into descs.
             await ctx.send((ribbon_get_message % (cur_ribbon.get("desc", "") + "\n"))
                            .format(member, ribbon_name, self._get_emoji_from_name(emoji)))
@@ -583,6 +714,7 @@ class PokemonTourney(commands.Cog):
             return
 
         self.config.hincrby("user:{}:pkmn_tourney:medallions:{}".format(member.id, active_medal_name), "pieces", 1)
+        self.badge_renderer.invalidate(member.id)
         user_medal_pieces_held += 1
 
         # Get the name combined with the number of pieces the user has -- or complete.
@@ -609,6 +741,7 @@ class PokemonTourney(commands.Cog):
         }
 
         self.config.hmset("config:pkmn_tourney:ribbons:{}".format(emoji_base_name), new_ribbon)
+        self._reload_registry()
         await ctx.send(
             "New ribbon created. You can update its description with `!set_ribbon_message <emoji> <message>`",
             embed=utils.embed_from_dict(new_ribbon, description="Current ribbon config")
@@ -620,13 +753,14 @@ class PokemonTourney(commands.Cog):
         """
         Set a special message for users when they are granted their ribbon.
         """
-        ribbon_emoji = self.ribbons.values()
+        ribbon_emoji = [ribbon["emoji"] for ribbon in self.ribbons.values()]
 
         if emoji_name not in ribbon_emoji:
             await ctx.message.author.send("Invalid ribbon emoji. Those that exist are {}".format(ribbon_emoji))
             return
         try:
             self.config.hset("config:pkmn_tourney:ribbons:{}".format(emoji_name), "desc", description)
+            self._reload_registry()
         except RedisError:
             raise commands.BadArgument("Could not find that ribbon. Did you mean to input an emoji?")
         else:
@@ -644,6 +778,7 @@ class PokemonTourney(commands.Cog):
             "title": full_name,
             "pieces": pieces
         })
+        self._reload_registry()
 
         await ctx.send("\N{OK HAND SIGN}")
 
@@ -656,6 +791,7 @@ class PokemonTourney(commands.Cog):
             await ctx.message.author.send("Medal doesn't exist. Addable medals are {}".format(medallions.keys()))
             return
         self.config.set("config:pkmn_tourney:active_medallion", emoji_name)
+        self._reload_registry()
         await ctx.send("Active medallion set.",
                        embed=utils.embed_from_dict(self.active_medallion, description="Medallion info"))
 
@@ -669,6 +805,7 @@ class PokemonTourney(commands.Cog):
         }
 
         self.config.hmset("config:pkmn_tourney:leaders:{}".format(member.id), base_leader_info)
+        self._reload_registry()
         await ctx.send("\N{OK HAND SIGN}")
 
     @checks.is_pokemon_mod()
@@ -696,6 +833,7 @@ class PokemonTourney(commands.Cog):
                     "badge_emoji": self.config.hget("config:pkmn_tourney:champion:badge_emoji"),
                     "format_normal": self.config.hget("config:pkmn_tourney:champion:format")
                 })
+                self._reload_registry()
                 await ctx.send("Member {} was registered as a new leader.".format(cur_champion_member))
         else:
             if cur_champion_member is None:
@@ -715,6 +853,7 @@ class PokemonTourney(commands.Cog):
                     "format_normal": self.config.hget("config:pkmn_tourney:champion:format")
                 })
 
+                self._reload_registry()
                 await ctx.send("Member {} was registered as the new leader.".format(cur_champion_member))
 
     @checks.is_pokemon_mod()
@@ -727,6 +866,7 @@ class PokemonTourney(commands.Cog):
             self.config.hset("config:pkmn_tourney:leaders:{}".format(cur_champion_id), "badge_emoji", badge_emoji)
         except RedisError:
             pass
+        self._reload_registry()
 
         await ctx.send("Badge emoji set to `{}`".format(badge_emoji))
 
@@ -739,6 +879,7 @@ class PokemonTourney(commands.Cog):
             self.config.hset("config:pkmn_tourney:leaders:{}".format(cur_champion_id), "format_normal", format_msg)
         except RedisError:
             pass
+        self._reload_registry()
 
         await ctx.send("Description set.")
 
@@ -749,6 +890,7 @@ class PokemonTourney(commands.Cog):
         key = "config:pkmn_tourney:leaders:{}".format(member.id)
         if self.config.exists(key):
             self.config.hset(key, "inactive", True)
+            self._reload_registry()
             await ctx.send("Member marked inactive.",
                            embed=utils.embed_from_dict(self.config.hgetall(key)))
         else:
@@ -760,31 +902,84 @@ class PokemonTourney(commands.Cog):
     async def update_db(self, ctx):
         self._update_db()
 
+    # Gym board
+
+    def _leader_updated(self, member):
+        if member.id in self.registry.leaders and member.guild.id == getattr(self.pokemon_guild, "id", None):
+            self._gym_board_dirty.set()
+
     @commands.Cog.listener()
-    async def on_timer_update(self, secs):
-        if secs % 60 == 0:
-            chan = self.bot.get_channel(325764029538762763)
-            gym_msg_id = self.config.get("config:pkmn_tourney:gym_message_id")
-            if gym_msg_id is None:
-                new_msg = await chan.send(embed=self.get_in_the_gym_message(include_timestamp=True))
-                await new_msg.pin()
-                self.config.set("config:pkmn_tourney:gym_message_id", new_msg.id)
-            else:
-                try:
-                    msg = await chan.fetch_message(int(gym_msg_id))
-                except AttributeError:  # Usually pops up during debugging as chan is None
-                    return
+    async def on_member_update(self, before, after):
+        self._leader_updated(after)
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        # Split out of on_member_update in newer versions of discord.py
+        self._leader_updated(after)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self._leader_updated(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self._leader_updated(member)
+
+    async def _post_gym_message(self, chan, embed):
+        self._gym_message = await chan.send(embed=embed)
+        await self._gym_message.pin()
+        self.config.set("config:pkmn_tourney:gym_message_id", self._gym_message.id)
 
+    async def _fetch_gym_message(self, chan):
+        gym_msg_id = self.config.get("config:pkmn_tourney:gym_message_id")
+        if gym_msg_id is None:
+            return None
+        try:
+            msg = await chan.fetch_message(int(gym_msg_id))
+        except discord.NotFound:
+            return None
+        if msg.embeds:
+            # Seed the hash from what's already up, so a restart doesn't cost an edit
+            self._gym_board_hash = hash(msg.embeds[0].description)
+        return msg
+
+    async def update_gym_board(self):
+        chan = self.bot.get_channel(GYM_CHANNEL_ID)
+        if chan is None:  # Usually pops up during debugging
+            return
+
+        if self._gym_message is None:
+            self._gym_message = await self._fetch_gym_message(chan)
+
+        lines = self._gym_board_lines()
+        board_hash = hash("\n".join(lines))
+        if self._gym_message is not None and board_hash == self._gym_board_hash:
+            return
+
+        embed = self.get_in_the_gym_message(include_timestamp=True, lines=lines)
+        if self._gym_message is None:
+            await self._post_gym_message(chan, embed)
+        else:
+            try:
+                await self._gym_message.edit(embed=embed)
+            except (discord.HTTPException, discord.Forbidden):
                 try:
-                    await msg.edit(embed=self.get_in_the_gym_message(include_timestamp=True))
+                    await self._gym_message.delete()
                 except (discord.HTTPException, discord.Forbidden):
-                    try:
-                        await chan.delete_message(msg)
-                    except (discord.HTTPException, discord.Forbidden):
-                        await msg.unpin()
-                    msg = await chan.send(embed=self.get_in_the_gym_message(include_timestamp=True))
-                    await msg.pin()
-                    self.config.set("config:pkmn_tourney:gym_message_id", msg.id)
+                    await self._gym_message.unpin()
+                await self._post_gym_message(chan, embed)
+        self._gym_board_hash = board_hash
+
+    async def _run_gym_board(self):
+        await self.bot.wait_until_ready()
+        while True:
+            await self._gym_board_dirty.wait()
+            await asyncio.sleep(GYM_BOARD_DEBOUNCE)
+            self._gym_board_dirty.clear()
+            try:
+                await self.update_gym_board()
+            except Exception:
+                log.exception("Could not update the gym board.")
 
 
 def setup(bot):
@@ -3,11 +3,12 @@
 import discord
 import random
 import logging
-import asyncio
 from sys import stderr
 
 from discord.ext import commands
 
+from cogs.utils.audio.voice_sessions import VoicePriority, get_voice_manager
+
 log = logging.getLogger()
 
 
@@ -15,27 +16,25 @@ class QuackBot(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.voice_sessions = get_voice_manager(bot)
         self._voice_client = None
 
-    def quack_after(self, voice_client):
-        coro = voice_client.disconnect()
-        fut = asyncio.run_coroutine_threadsafe(coro, self.bot.loop)
-        try:
-            fut.result()
-        except Exception as e:
-            # an error happened
+    def quack_after(self, voice_client, err):
+        self.voice_sessions.release_threadsafe(voice_client.guild, "quackbot")
+        if err is not None:
             print("Error occured in future")
-            print('{0.__class__.__name__}: {0}'.format(e), file=stderr)
+            print('{0.__class__.__name__}: {0}'.format(err), file=stderr)
 
     async def quack(self, channel):
-        if len(self.bot.voice_clients) > 0:  # TODO: Won't be a prob. w/ bot acct
+        # Quacking is the lowest priority, so this won't interrupt anything else playing
+        self._voice_client = await self.voice_sessions.acquire(channel, "quackbot", VoicePriority.QUACK)
+        if self._voice_client is None:
             log.info("Micspam failed. Already connected.")
             return
-        self._voice_client = await self.bot.join_voice_channel(channel)
 
-        player = self._voice_client.create_ffmpeg_player("micspam/quack.mp3",
-                                                         after=lambda: self.quack_after(self._voice_client))
-        player.start()
+        voice_client = self._voice_client
+        voice_client.play(discord.FFmpegPCMAudio("micspam/quack.mp3"),
+                          after=lambda err: self.quack_after(voice_client, err))
 
     @commands.Cog.listener()
     async def on_timer_update(self, seconds):
@@ -1,13 +1,21 @@
-"""Fancy channel logs using rich embeds"""
+"""
+Fancy channel logs using rich embeds
+
+Embeds are delivered through a ModlogDispatcher (utils/modlog.py), which batches them per modlog channel.
+"""
 
 from discord.ext import commands
 from .utils import checks, utils
+from .utils.attachments import get_attachment_preserver
+from .utils.audit_log import get_audit_log_tail
+from .utils.guild_config import EVENT_FLAGS, MEMBER_UPDATE_MASK, ModlogConfig
+from .utils.modlog import CaseNumbers, ModlogDispatcher, ModlogIndex, edit_embeds
 import discord
-from .utils.utils import get_timestamp, download_image
+from .utils.utils import get_timestamp
 import logging
 from asyncio import TimeoutError
-from io import BytesIO
-from asyncio import sleep
+from functools import partial
+from typing import Dict, Optional, Union
 
 log = logging.getLogger()
 
@@ -44,14 +52,36 @@ class ServerLogs(commands.Cog):
         self.bot = bot
         self.config = bot.config
         cache = {}
-        for key in self.config.scan_iter("config:mod:config*"):
+        keys = list(self.config.scan_iter("config:mod:config*"))
+
+        # Fetch every guild's config in one round trip rather than one per guild
+        pipe = self.config.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+
+        for key, guild_config in zip(keys, pipe.execute()):
             *_, guild_id = key.split(":")
             try:
-                cache[int(guild_id)] = self.config.hgetall(key)
-            except TypeError:
+                cache[int(guild_id)] = guild_config
+            except (TypeError, ValueError):
                 # Guild ID not found
                 self.config.delete(key)
         self._config_cache = cache
+        self._compiled = {}  # type: Dict[int, ModlogConfig]
+        for guild_id in cache:
+            self._compile_guild_config(guild_id)
+
+        self.dispatcher = ModlogDispatcher(bot)
+        self.cases = CaseNumbers(self.config, int(self.config.get("config:mod:case_lease_size") or 1))
+        self.index = ModlogIndex(self.config)
+        self.audit_log = get_audit_log_tail(bot)
+        self.attachments = get_attachment_preserver(bot)
+        self.precache_channels = {int(channel_id) for channel_id in self.config.smembers("config:mod:precache_channels")}
+
+    def cog_unload(self):
+        self.dispatcher.close()
+        # The preserver is shared with Logs, so leave it running; only the precache is ours
+        self.attachments.clear_precache()
 
     @property
     def active_guilds(self):
@@ -89,46 +119,70 @@ class ServerLogs(commands.Cog):
 
         self.config.hmset("config:mod:config:{}".format(guild_id), guild_config)
         self._config_cache[int(guild_id)] = guild_config
+        self._compile_guild_config(guild_id)
         return guild_config
 
-    def _is_tracked(self, guild, priority_event=False):
-        """Perform a simple check before running each event so that we don't waste time trying to log"""
-        if guild is None:  # DMs
-            return False
-        elif guild.id not in self._config_cache.keys():
-            return False
-        elif priority_event and self._config_cache[guild.id].get("priority_modlog") is None:
-            return False
-        elif not priority_event and self._config_cache[guild.id].get("default_modlog") is None:
-            return False
-        else:
-            return True
+    def _compile_guild_config(self, guild_id):
+        guild_id = int(guild_id)
+        self._compiled[guild_id] = ModlogConfig.compile(self.bot, guild_id, self._config_cache[guild_id])
 
-    def add_case_number(self, embed):
-        """Update the embed with the active case number, and write it out."""
-        case_id = self.config.get("admin:mod_case")
-        case_id = int(case_id if case_id is not None else 0) + 1
-        self.config.set("admin:mod_case", case_id)
+    def _modlog_config(self, guild, event) -> Optional[ModlogConfig]:
+        """
+        Perform a simple check before running each event so that we don't waste time trying to log.
+        :return: The guild's compiled config if it logs the event, otherwise None
+        """
+        if guild is None:  # DMs
+            return None
+        compiled = self._compiled.get(guild.id)
+        if compiled is None or not compiled.events & EVENT_FLAGS[event]:
+            return None
+        return compiled
+
+    def add_case_number(self, embed, guild_id):
+        """Add the guild's next case number to the embed, and return it."""
+        case_id = self.cases.next(guild_id)
         embed.add_field(name="Case", value=str(case_id))
-        return embed
+        return case_id
+
+    def _record_entry(self, guild_id, channel_id, event, user_id, case_id, sent):
+        message_id = sent.result()
+        if message_id is not None:
+            self.index.record(guild_id, channel_id, message_id, event=event, user_id=user_id, case_id=case_id)
+
+    async def send_embed_to_modlog(self, embed, guild_id, priority=False, file=None, event=None, user_id=None,
+                                   case_id=None):
+        """
+        Queue an embed for the guild's modlog. This returns as soon as it's queued; HTTP errors are logged and
+        swallowed by the dispatcher. Once it's sent, the message is added to the modlog index.
 
-    async def send_embed_to_modlog(self, embed, guild_id, priority=False, **kwargs):
-        """Have to use this backwards-ass method because it throws http exceptions."""
+        :param event: Kind of event, e.g. "ban", for the index
+        :param user_id: The user the entry is about, so it can be found with !modlog_search
+        :param case_id: The embed's case number, if it has one, so it can be found by case
+        :return: A future resolving to the ID of the message the embed was sent in, or None if it wasn't sent.
+        """
         if isinstance(guild_id, discord.Guild):
             guild_id = guild_id.id
 
-        guild_config = self.get_guild_config(guild_id)
-        dest_channel_id = (guild_config.get("default_modlog") if not priority
-                           else guild_config.get("priority_modlog"))
+        compiled = self._compiled.get(int(guild_id))
+        if compiled is None:
+            return None
 
-        if dest_channel_id is None:
-            return
+        channel = compiled.channel(priority)
+        if channel is None:
+            dest_channel_id = compiled.priority_modlog_id if priority else compiled.default_modlog_id
+            if dest_channel_id is None:
+                return None
 
-        try:
-            await self.bot.get_channel(int(dest_channel_id)).send(embed=embed, **kwargs)
-        except discord.HTTPException:
-            # Silently swallow the error
-            log.exception("Exception occurred when sending embed.\nParams:\n{}".format(embed.fields))
+            # Compiled before the channel was cached, or it's been deleted
+            self._compile_guild_config(guild_id)
+            channel = self._compiled[int(guild_id)].channel(priority)
+            if channel is None:
+                log.warning("Modlog channel {} for guild {} not found.".format(dest_channel_id, guild_id))
+                return None
+
+        sent = self.dispatcher.submit(channel, embed, priority=priority, file=file)
+        sent.add_done_callback(partial(self._record_entry, guild_id, channel.id, event, user_id, case_id))
+        return sent
 
     @staticmethod
     def format_embed(embed: discord.Embed, user) -> discord.Embed:
@@ -139,13 +193,11 @@ class ServerLogs(commands.Cog):
         return embed
 
     async def _get_last_audit_action(self, guild_id, action, member):
-        await sleep(0.5)
-        async for log_entry in self.bot.get_guild(guild_id).audit_logs(action=action, limit=10):
-            if log_entry.target.id == member.id:
-                # Let's stop at the first entry.
-                mod_responsible = log_entry.user
-                reason = log_entry.reason if log_entry.reason is not None else "None Given"  # Should be None
-                return mod_responsible, reason
+        log_entry = await self.audit_log.find(self.bot.get_guild(guild_id), action, member.id)
+        if log_entry is not None:
+            mod_responsible = log_entry.user
+            reason = log_entry.reason if log_entry.reason is not None else "None Given"  # Should be None
+            return mod_responsible, reason
         else:
             log.info("_get_last_audit_action() turned up empty for {} with member {}".format(action, member))
             return "Unknown", "None found."
@@ -172,12 +224,44 @@ class ServerLogs(commands.Cog):
         for name, value in kwargs.items():
             embed.add_field(name=name, value=value)
 
-        await self.send_embed_to_modlog(embed, ctx.guild, priority=priority)
+        await self.send_embed_to_modlog(embed, ctx.guild, priority=priority, event="mod_action", user_id=member.id)
+
+    # Channels and roles are resolved when a guild's config is compiled, so recompile when they change
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild_id, compiled in list(self._compiled.items()):
+            if not compiled.resolved or compiled.verified_role_id is None or compiled.mods_role_id is None:
+                self._compile_guild_config(guild_id)
+
+    def _recompile(self, guild):
+        if guild.id in self._compiled:
+            self._compile_guild_config(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        compiled = self._compiled.get(channel.guild.id)
+        if compiled is not None and compiled.is_modlog(channel.id):
+            self._compile_guild_config(channel.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self._recompile(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self._recompile(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name:
+            self._recompile(after.guild)
 
     @commands.Cog.listener()
     async def on_member_ban(self, guild, user):
-        if self._is_tracked(guild, priority_event=True):
-            priority_modlog = self.bot.get_channel(int(self._config_cache[guild.id]["priority_modlog"]))
+        compiled = self._modlog_config(guild, "ban")
+        if compiled is not None:
+            priority_modlog = compiled.priority_modlog
             try:
                 await priority_modlog.send("Member {} was banned".format(user.name))  # temporary failsafe
             except AttributeError:  # Modlog is None
@@ -187,13 +271,11 @@ class ServerLogs(commands.Cog):
                                   color=colors["ban"])
 
             embed = self.format_embed(embed, user)
-            embed = self.add_case_number(embed)
+            case_id = self.add_case_number(embed, guild.id)
             try:
                 mod_responsible, reason = await self._get_last_audit_action(guild.id, discord.AuditLogAction.ban, user)
             except discord.Forbidden:
-                mod_log_config = self.get_guild_config(guild.id)
-                mod_log_chan = self.bot.get_channel(int(mod_log_config["priority_modlog"]))
-                await mod_log_chan.send("Missing audit log perms, I cannot fetch the latest ban info.")
+                await priority_modlog.send("Missing audit log perms, I cannot fetch the latest ban info.")
                 return
 
             # Add reason
@@ -201,26 +283,28 @@ class ServerLogs(commands.Cog):
             embed.add_field(name="Reason", value=reason if reason else "None given.")
             embed.add_field(name="Mod responsible", value=mod_responsible if mod_responsible else "unknown")
 
-            await self.send_embed_to_modlog(embed, guild.id, priority=True)
+            await self.send_embed_to_modlog(embed, guild.id, priority=True, event="ban", user_id=user.id,
+                                            case_id=case_id)
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild, user):
-        if self._is_tracked(guild, priority_event=True):
+        if self._modlog_config(guild, "unban") is not None:
             embed = discord.Embed(title="User {0.name}#{0.discriminator} was unbanned.".format(user))
 
             embed = self.format_embed(embed, user)
-            embed = self.add_case_number(embed)
+            case_id = self.add_case_number(embed, guild.id)
 
             mod_responsible, reason = await self._get_last_audit_action(guild.id, discord.AuditLogAction.unban, user)
 
             embed.add_field(name="Reason", value=reason if reason else "None given.")
             embed.add_field(name="Mod responsible", value=mod_responsible.name if mod_responsible else "unknown")
 
-            await self.send_embed_to_modlog(embed, guild.id, priority=True)
+            await self.send_embed_to_modlog(embed, guild.id, priority=True, event="unban", user_id=user.id,
+                                            case_id=case_id)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        if self._is_tracked(member.guild):
+        if self._modlog_config(member.guild, "join") is not None:
             embed = discord.Embed(title="User {0.name}#{0.discriminator} joined.".format(member),
                                   color=colors["join"])
 
@@ -228,59 +312,47 @@ class ServerLogs(commands.Cog):
 
             embed.add_field(name="Account created", value=member.created_at)
 
-            await self.send_embed_to_modlog(embed, member.guild.id)
+            await self.send_embed_to_modlog(embed, member.guild.id, event="join", user_id=member.id)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member):
-        if self._is_tracked(member.guild):
+        compiled = self._modlog_config(member.guild, "leave")
+        if compiled is not None:
 
             # We need to check to see if it was a ban, which also triggers the member_remove handle
 
-            leave_was_kick = False
-
-            await sleep(1)
-
             # Check to see if the leave was a kick or just a regular leave
             try:
-                for log_entry in await member.guild.audit_logs(action=discord.AuditLogAction.kick, limit=1).flatten():
-                    # Let's stop at the first entry.
-                    if log_entry.target.id == member.id:  # The leave was a kick
-                        leave_was_kick = True
-                        try:
-                            mod_responsible = getattr(log_entry, "user", "Unknown")
-                            reason = getattr(log_entry, "reason", "No reason provided.")
-                            embed = discord.Embed(title="User {0} was kicked.".format(str(member)),
-                                                  color=colors["kick"])
-
-                            embed.add_field(name="Reason", value=reason)
-                            embed.add_field(name="Kicked by", value=mod_responsible)
-                            break
-                        except AttributeError:
-                            pass
-
-                else:
-                    embed = discord.Embed(title="User {0} left.".format(str(member)),
-                                          color=colors["leave"])
+                log_entry = await self.audit_log.find(member.guild, discord.AuditLogAction.kick, member.id)
             except discord.Forbidden:
-                mod_log_channel_id = self.get_guild_config(member.guild)["default_modlog"]
-                modlog_chan = self.bot.get_channel(int(mod_log_channel_id))
-                await modlog_chan.send("I'm missing audit log permissions, so ban and kick tracking won't work.")
+                await compiled.default_modlog.send("I'm missing audit log permissions, so ban and kick tracking won't work.")
                 return
 
+            leave_was_kick = log_entry is not None
+            if leave_was_kick:
+                embed = discord.Embed(title="User {0} was kicked.".format(str(member)),
+                                      color=colors["kick"])
+
+                embed.add_field(name="Reason", value=log_entry.reason or "No reason provided.")
+                embed.add_field(name="Kicked by", value=log_entry.user or "Unknown")
+            else:
+                embed = discord.Embed(title="User {0} left.".format(str(member)),
+                                      color=colors["leave"])
+
             embed = self.format_embed(embed, member)
             roles = ", ".join((i.name for i in member.roles))
             embed = embed.add_field(name="Roles", value=roles)
 
-            await self.send_embed_to_modlog(embed, member.guild, priority=leave_was_kick)
+            await self.send_embed_to_modlog(embed, member.guild, priority=leave_was_kick,
+                                            event="kick" if leave_was_kick else "leave", user_id=member.id)
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
-        if self._is_tracked(message.guild):
-
-            default_modlog_id = self._config_cache[message.guild.id].get("default_modlog")
+        compiled = self._modlog_config(message.guild, "delete")
+        if compiled is not None:
 
             # If the message was deleted from the modlog, make note of it but don't re-upload the deleted message.
-            if message.channel.id == default_modlog_id:
+            if message.channel.id == compiled.default_modlog_id:
 
                 if message.embeds:
                     # Just pull the title of the first embed, if it exists
@@ -293,10 +365,9 @@ class ServerLogs(commands.Cog):
                                       color=colors["delete"])
 
                 embed = self.format_embed(embed, message.author)
-                await self.send_embed_to_modlog(embed, message.guild.id)
+                await self.send_embed_to_modlog(embed, message.guild.id, event="modlog_delete")
                 return
 
-            reupload = None
             member = message.author
             embed = discord.Embed(title="Message by {0.name}#{0.discriminator} deleted.".format(member),
                                   description="**Attachment included above**" if message.attachments else None,
@@ -309,30 +380,23 @@ class ServerLogs(commands.Cog):
                 content = message.content if len(message.content) <= 1024 else message.content[:1021] + "..."
                 embed.add_field(name="Content", value=content)
 
-            # Try to re-download attached images if possible.
-            # The proxy url doesn't 404 immediately unlike the regular URL, so it may be possible to download from it
-            # before it goes down as well.
-
-            if message.attachments:
-                temp_image = BytesIO()
-                attachment = message.attachments[0]
-                if attachment.size > 5000000:
-                    # caching is important and all, but this will just cause more harm than good
-                    return
+            if not message.attachments:
+                await self.send_embed_to_modlog(embed, message.guild.id, event="delete", user_id=member.id)
+                return
 
-                try:
-                    await download_image(message.attachments[0].proxy_url, temp_image)
-                    reupload = discord.File(temp_image, filename="reupload.{}".format(attachment.filename))
-                except Exception:
-                    log.exception("Encountered exception when downloading attachment.")
-                    reupload = None
+            # Try to re-upload the attachment, from the precache if the channel's watched. Downloading happens in the
+            # background so a burst of deletes doesn't hold up the event loop.
+            async def deliver(files):
+                # The preserver keeps the file open until the dispatcher has uploaded it
+                return await self.send_embed_to_modlog(embed, message.guild.id, file=files[0] if files else None,
+                                                       event="delete", user_id=member.id)
 
-            await self.send_embed_to_modlog(embed, message.guild.id, file=reupload)
+            if not self.attachments.preserve(message.attachments[:1], deliver):
+                await self.send_embed_to_modlog(embed, message.guild.id, event="delete", user_id=member.id)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before, after):
-        if self._is_tracked(before.guild) and before.content != after.content and not isinstance(before.channel,
-                                                                                                 discord.DMChannel):
+        if before.content != after.content and self._modlog_config(before.guild, "edit") is not None:
             member = before.author
             embed = discord.Embed(title="Message by {0.name}#{0.discriminator} edited.".format(member),
                                   color=colors["edit"])
@@ -342,25 +406,26 @@ class ServerLogs(commands.Cog):
             embed.add_field(name="Before", value=before.content, inline=False)
             embed.add_field(name="After", value=after.content)
 
-            await self.send_embed_to_modlog(embed, before.guild.id)
+            await self.send_embed_to_modlog(embed, before.guild.id, event="edit", user_id=member.id)
 
     @commands.Cog.listener()
     async def on_member_update(self, before, after):
-        if self._is_tracked(before.guild):
+        compiled = self._compiled.get(before.guild.id)
+        if compiled is not None and compiled.events & MEMBER_UPDATE_MASK:
             if before.name != after.name:
                 embed = discord.Embed(title="Member {0.name} changed their name to {1.name}.".format(before, after),
                                       color=colors["name_change"])
 
                 embed = self.format_embed(embed, after)
 
-                await self.send_embed_to_modlog(embed, before.guild.id)
-            if before.roles != after.roles:
-                if discord.utils.get(before.roles, name="Verified") is None and \
-                        discord.utils.get(after.roles, name="Verified") is not None:
+                await self.send_embed_to_modlog(embed, before.guild.id, event="name_change", user_id=after.id)
+            # Compare the sorted role ID arrays directly; Member.roles builds a new list of Role objects each access
+            if compiled.tracks("verified") and before._roles != after._roles:
+                if not before._roles.has(compiled.verified_role_id) and after._roles.has(compiled.verified_role_id):
                     embed = discord.Embed(title="Member {0.name} verified themselves.".format(before),
                                           color=colors["verified"])
                     embed = self.format_embed(embed, after)
-                    await self.send_embed_to_modlog(embed, before.guild.id)
+                    await self.send_embed_to_modlog(embed, before.guild.id, event="verified", user_id=after.id)
             if before.nick != after.nick:
                 if after.nick is None:
                     embed = discord.Embed(title="Member {} reset their nickname.".format(before),
@@ -370,7 +435,7 @@ class ServerLogs(commands.Cog):
                                           color=colors["nickname_change"])
 
                 embed = self.format_embed(embed, after)
-                await self.send_embed_to_modlog(embed, after.guild.id)
+                await self.send_embed_to_modlog(embed, after.guild.id, event="nickname_change", user_id=after.id)
 
     @checks.sudo()
     @commands.command()
@@ -389,8 +454,42 @@ class ServerLogs(commands.Cog):
         config["{}_modlog".format(level.lower())] = ctx.message.channel.id
         self.config.hmset("config:mod:config:{}".format(guild_id), config)
         self._config_cache[guild_id] = config
+        self._compile_guild_config(guild_id)
         await ctx.send("\N{OK HAND SIGN}")
 
+    @checks.sudo()
+    @commands.command(hidden=True)
+    async def modlog_stats(self, ctx):
+        """Show modlog delivery stats and the current queue depth per channel."""
+        stats = self.dispatcher.stats
+        embed = discord.Embed(title="Modlog dispatch", color=discord.Color.blurple())
+        embed.add_field(name="Embeds queued", value=str(stats["queued"]))
+        embed.add_field(name="Sent", value="{} embeds in {} messages".format(stats["embeds"], stats["messages"]))
+        embed.add_field(name="Dropped / failed", value="{} / {}".format(stats["dropped"], stats["failed"]))
+
+        stats = self.attachments.stats
+        embed.add_field(name="Attachments", value="{} queued, {} pending, {} dropped, {} failed".format(
+            stats["queued"], self.attachments.queue.qsize(), stats["dropped"], stats["failed"]))
+        embed.add_field(name="Precache", value="{} cached, {} hits".format(stats["precached"], stats["precache_hits"]))
+
+        depths = ["<#{}>: {}".format(channel_id, depth) for channel_id, depth in self.dispatcher.depths().items()]
+        embed.add_field(name="Queue depth", value="\n".join(depths) or "No queues", inline=False)
+        await ctx.send(embed=embed)
+
+    @checks.sudo()
+    @commands.command(hidden=True)
+    async def precache_attachments(self, ctx, channel: discord.TextChannel = None):
+        """Toggle downloading attachments in a channel as they're posted, so they survive being deleted."""
+        channel = channel or ctx.channel
+        if channel.id in self.precache_channels:
+            self.precache_channels.discard(channel.id)
+            self.config.srem("config:mod:precache_channels", channel.id)
+            await ctx.send("No longer precaching attachments in {}.".format(channel.mention))
+        else:
+            self.precache_channels.add(channel.id)
+            self.config.sadd("config:mod:precache_channels", channel.id)
+            await ctx.send("Precaching attachments in {}.".format(channel.mention))
+
     @checks.sudo()
     @commands.command()
     async def enable_modlog_tracking(self, ctx):
@@ -437,31 +536,38 @@ class ServerLogs(commands.Cog):
         Expected input should be like id message
         """
         msg = None
-        # Check for the last logged case
+        embed_index = 0
         if message_id.lower() == "last":
-            async for message in ctx.message.channel.history(limit=3):
-                if message.author.id == self.bot.user.id and message.embeds:  # Hacky way to check for embeds
-                    msg = message
-
+            # The last entry sent to this channel
+            entry = self.index.last(ctx.guild.id, ctx.channel.id)
+            embed_index = -1
+        elif message_id.isdigit():
+            # Check it as a case number first, since those are indexed
+            entry = self.index.case(ctx.guild.id, message_id)
         else:
-            # Check it as if it is a message ID
+            entry = None
+
+        if entry is not None:
+            msg = await self._fetch_entry(entry)
+            if msg is not None and message_id.isdigit():
+                # The case may have been sent in a batch, so find its embed
+                for i, embed in enumerate(msg.embeds):
+                    if any(field.name == "Case" and field.value == message_id for field in embed.fields):
+                        embed_index = i
+
+        # Otherwise check it as if it is a message ID
+        if msg is None and message_id.isdigit():
             try:
-                msg = ctx.message.channel.fetch_message(message_id)
-            except discord.NotFound or discord.HTTPException:
+                msg = await ctx.message.channel.fetch_message(int(message_id))
+            except discord.HTTPException:
                 pass
 
-            # Check the past messages for one that matches the case number
-            if msg is None:
-                async for message in ctx.message.channel.history(limit=500):
-                    if message.author.id == self.bot.user.id and message.embeds:
-                        if discord.utils.get(message.embeds[0].fields, case=str(message_id)):
-                            msg = message
-
-        if msg is None:
+        if msg is None or not msg.embeds:
             await ctx.send("Message not found.")
             return
 
-        embed = msg.embeds[0]
+        embeds = msg.embeds
+        embed = embeds[embed_index]
         field = discord.utils.get(embed.fields, name="Notes")
         note = "{}: {}".format(ctx.message.author.name, note)
 
@@ -472,20 +578,52 @@ class ServerLogs(commands.Cog):
             embed.add_field(name="Notes", value=note)
         else:
             embed.set_field_at(len(embed.fields) - 1, name="Notes", value=note)
-        await msg.edit(embed=embed)
+        await edit_embeds(self.bot, msg, embeds)
         log.info('User {} added a modnote to embed with ID {}.'.format(ctx.message.author.name, msg.id))
 
         await ctx.message.delete()
 
+    async def _fetch_entry(self, entry):
+        channel = self.bot.get_channel(entry.channel_id)
+        if channel is None:
+            return None
+        try:
+            return await channel.fetch_message(entry.message_id)
+        except discord.HTTPException:
+            return None
+
+    @checks.mod_server()
+    @commands.command(hidden=True, aliases=["modlog_history"])
+    async def modlog_search(self, ctx, user: Union[discord.Member, int], limit: int = 10):
+        """List a user's latest modlog entries in this server, with links to them. Works for users who have left."""
+        user_id = getattr(user, "id", user)
+        entries = self.index.for_user(ctx.guild.id, user_id, min(limit, 25))
+        if not entries:
+            await ctx.send("No modlog entries found for that user.")
+            return
+
+        lines = ["[{}]({}) - {}".format(entry.event, entry.jump_url(ctx.guild.id),
+                                        discord.utils.snowflake_time(entry.message_id).strftime("%Y-%m-%d %H:%M"))
+                 for entry in entries]
+        embed = discord.Embed(title="Modlog entries for {}".format(user), description="\n".join(lines),
+                              color=discord.Color.blurple())
+        await ctx.send(embed=embed)
+
     @commands.Cog.listener()
     async def on_message(self, message):
-        if len(message.role_mentions) > 0 and discord.utils.get(message.role_mentions, name="Mods") is not None:
+        if message.attachments and message.channel.id in self.precache_channels:
+            self.bot.loop.create_task(self.attachments.precache(message))
+
+        if not message.role_mentions:
+            return
+        compiled = self._modlog_config(message.guild, "mention_mods")
+        if compiled is not None and any(role.id == compiled.mods_role_id for role in message.role_mentions):
             embed = discord.Embed(title="Message by {0.name}#{0.discriminator} mentioned mods.".format(message.author),
                                   color=colors["mention_mods"])
             embed = self.format_embed(embed, message.author)
             embed.add_field(name="Channel", value=message.channel.name)
 
-            await self.send_embed_to_modlog(embed, message.guild)
+            await self.send_embed_to_modlog(embed, message.guild, event="mention_mods", user_id=message.author.id)
 
 
 def setup(bot):
@@ -1,9 +1,14 @@
 """Basic tag support"""
 
+import json
+
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Optional, Tuple, List
+
 from discord.ext import commands
 from .utils import checks, utils
-from discord import DMChannel, Embed, Color
-from redis import RedisError
+from discord import DMChannel, Embed, Color, File
 
 
 tag_ctx_keys = {
@@ -12,6 +17,9 @@ tag_ctx_keys = {
     "guild": "{}:tags"
 }
 
+# Most tag scopes (global, guild or channel hashes) kept in memory at once
+TAG_CACHE_SCOPES = 1024
+
 list_desc = """
 Global tags:
 {}
@@ -30,35 +38,74 @@ class Tags(commands.Cog):
         self.bot = bot
         self.config = bot.config
 
-    def get_tag_context(self, ctx, tag_name):
+        # Scope key -> {tag name: content}, filled on first use and dropped when a tag in that scope changes.
+        # Least recently used first, and capped at TAG_CACHE_SCOPES.
+        self._tag_cache = OrderedDict()
+
+    def _scopes(self, ctx) -> List[Tuple[str, str]]:
+        """Get the (context, key) pairs a tag can live in for ctx, in order of precedence."""
+        scopes = [("global", "config:tags:global")]
+        if not isinstance(ctx.message.channel, DMChannel):
+            scopes.append(("guild", "guild:{}:tags".format(ctx.message.guild.id)))
+        scopes.append(("chan", "chan:{}:tags".format(ctx.message.channel.id)))
+        return scopes
+
+    def _load_scopes(self, keys: List[str]) -> Dict[str, Dict[str, str]]:
+        """Get the tags in each of the given scopes, loading any that aren't cached in one round trip."""
+        scopes = {}
+        missing = []
+        for key in keys:
+            tags = self._tag_cache.get(key)
+            if tags is None:
+                missing.append(key)
+            else:
+                self._tag_cache.move_to_end(key)
+                scopes[key] = tags
+
+        if missing:
+            pipe = self.config.pipeline(transaction=False)
+            for key in missing:
+                pipe.hgetall(key)
+
+            for key, tags in zip(missing, pipe.execute()):
+                self._tag_cache[key] = scopes[key] = tags
+
+            while len(self._tag_cache) > TAG_CACHE_SCOPES:
+                self._tag_cache.popitem(last=False)
+
+        return scopes
+
+    def _invalidate_scope(self, key: str) -> None:
+        self._tag_cache.pop(key, None)
+
+    def resolve_tag(self, ctx, tag_name) -> Tuple[Optional[str], Optional[str]]:
         """
-        Check the appropriate contexts if a tag exists.
-        We want to respect a hierarchy of:
+        Find a tag, respecting a hierarchy of:
             - global
             - local (server)
             - local (channel)
         which is backwards from the way we'd normally be checking.
-        
-        Returns the context in which it exists, else none
+
+        Returns (context, content) for the context in which it exists, else (None, None)
         """
+        scopes = self._scopes(ctx)
         # We want the error to fall through if the global tags don't work.
-        if self.config.hexists("config:tags:global", tag_name):
-            return "global"
+        loaded = self._load_scopes([key for _, key in scopes])
 
-        if not isinstance(ctx.message.channel, DMChannel):
-            try:
-                if self.config.hexists("guild:{}:tags".format(ctx.message.guild.id), tag_name):
-                    return "guild"
-            except RedisError:
-                pass
+        for tag_context, key in scopes:
+            content = loaded[key].get(tag_name)
+            if content is not None:
+                return tag_context, content
 
-        try:
-            if self.config.hexists("chan:{}:tags".format(ctx.message.channel.id), tag_name):
-                return "chan"
-            else:
-                return None
-        except RedisError:
-            return None
+        return None, None
+
+    def get_tag_context(self, ctx, tag_name):
+        """
+        Check the appropriate contexts if a tag exists.
+
+        Returns the context in which it exists, else none
+        """
+        return self.resolve_tag(ctx, tag_name)[0]
 
     def _key_from_bounds(self, ctx, bounds):
         """Get a key based on some bounds given ctx"""
@@ -87,13 +134,11 @@ class Tags(commands.Cog):
     @checks.is_regular()
     @commands.group(invoke_without_command=True)
     async def tag(self, ctx, name: str):
-        tag_ctx = self.get_tag_context(ctx, name)
+        tag_ctx, tag = self.resolve_tag(ctx, name)
         if not tag_ctx:
             await ctx.send("Tag doesn't exist.")
             return
         else:
-            tag = self.config.hget(self._key_from_context(ctx, name))
-
             await ctx.send(tag)
 
     @checks.is_pokemon_mod()
@@ -116,39 +161,93 @@ class Tags(commands.Cog):
             elif existing_tag_ctx == "global" and not checks.sudo_check(ctx.message):
                 await ctx.send("Only {} can add a global tag.".format(self.bot.owner))
             else:
-                try:
-                    self.config.hset(self._key_from_bounds(ctx, bounds), name, content)
-                except KeyError:
+                key = self._key_from_bounds(ctx, bounds)
+                if key is None:
                     await ctx.send("Invalid bound.")
                     return
                 else:
+                    self.config.hset(key, name, content)
+                    self._invalidate_scope(key)
                     await ctx.send("Tag {} added successfully.".format(name))
 
     @checks.is_pokemon_mod()
     @tag.command()
     async def remove(self, ctx, name: str):
         """Remove a tag. Mods can remove channel or server tags, but only the owner can remove global tags."""
-        if self.config.hexists("config:tags:global", name):
-            if not checks.sudo_check(ctx.message):
-                await ctx.send("Only {} can remove global tags.".format(self.bot.owner))
-            else:
-                self.config.hdel("config:tags:global", name)
+        tag_ctx = self.get_tag_context(ctx, name)
+        if tag_ctx is None:
+            await ctx.send("Tag doesn't exist.")
+            return
 
-        elif self.config.hexists("chan:{}:tags".format(ctx.message.channel.id), name):
-            self.config.hdel("chan:{}:tags".format(ctx.message.channel.id), name)
-            # Don't allow ability to remove global tags
+        # Don't allow ability to remove global tags
+        if tag_ctx == "global" and not checks.sudo_check(ctx.message):
+            await ctx.send("Only {} can remove global tags.".format(self.bot.owner))
+            return
 
-        elif self.config.hexists("guild:{}:tags".format(ctx.message.guild.id), name):
-            self.config.hdel("guild:{}:tags".format(ctx.message.guild.id, name))
+        key = self._key_from_bounds(ctx, tag_ctx)
+        self.config.hdel(key, name)
+        self._invalidate_scope(key)
 
         await ctx.send("Tag {} removed.".format(name))
 
+    @checks.is_pokemon_mod()
+    @tag.command()
+    async def export(self, ctx):
+        """Export every global, server and channel tag visible from this server as a JSON file."""
+        scopes = {"global": "config:tags:global", "guild": "guild:{}:tags".format(ctx.guild.id)}
+        for channel in ctx.guild.text_channels:
+            scopes[str(channel.id)] = "chan:{}:tags".format(channel.id)
+
+        loaded = self._load_scopes(list(scopes.values()))
+
+        dump = {"global": loaded[scopes.pop("global")],
+                "guild": loaded[scopes.pop("guild")],
+                "chan": {chan_id: loaded[key] for chan_id, key in scopes.items() if loaded[key]}}
+
+        fp = BytesIO(json.dumps(dump, indent=2).encode("utf-8"))
+        await ctx.send(file=File(fp, filename="tags_{}.json".format(ctx.guild.id)))
+
+    @checks.sudo()
+    @tag.command(name="import")
+    async def import_(self, ctx):
+        """
+        Import tags from a JSON file attached to the message, in the format produced by !tag export.
+        Server tags are imported into the current server, and channel tags are skipped if the channel isn't in it.
+        """
+        if not ctx.message.attachments:
+            await ctx.send("Attach a file exported with !tag export.")
+            return
+
+        try:
+            dump = json.loads(await ctx.message.attachments[0].read())
+        except ValueError:
+            await ctx.send("That file isn't valid JSON.")
+            return
+
+        scopes = {"config:tags:global": dump.get("global", {}),
+                  "guild:{}:tags".format(ctx.guild.id): dump.get("guild", {})}
+        for chan_id, tags in dump.get("chan", {}).items():
+            if ctx.guild.get_channel(int(chan_id)) is not None:
+                scopes["chan:{}:tags".format(chan_id)] = tags
+
+        pipe = self.config.pipeline(transaction=False)
+        for key, tags in scopes.items():
+            if tags:
+                pipe.hmset(key, tags)
+            self._invalidate_scope(key)
+        pipe.execute()
+
+        await ctx.send("Imported {} tags.".format(sum(len(tags) for tags in scopes.values())))
+
     @checks.is_pokemon_mod()
     @tag.command()
     async def list(self, ctx):
-        global_tags = self.config.hkeys("config:tags:global")
-        chan_tags = self.config.hkeys("{}:tags".format(ctx.message.channel.id))
-        guild_tags = self.config.hkeys("{}:tags".format(ctx.message.guild.id))
+        global_key, guild_key, chan_key = (key for _, key in self._scopes(ctx))
+        loaded = self._load_scopes([global_key, guild_key, chan_key])
+
+        global_tags = loaded[global_key]
+        chan_tags = loaded[chan_key]
+        guild_tags = loaded[guild_key]
 
         global_txt = ", ".join(global_tags) if global_tags else None
         chan_txt = ", ".join(chan_tags) if chan_tags else None
@@ -14,14 +14,14 @@ user:
             whitelisted_guilds: <set of guilds user has whitelisted
 
 """
-from typing import Set, Optional
+from bisect import bisect_right
+from typing import Set, Optional, Dict, Iterable, Tuple
 
 from discord.ext import commands
 from discord.ext.commands import Context, Bot
 import discord
 import pytz
 import datetime
-import dateutil.relativedelta
 
 TZ_SET_PROMPT_MSG_INIT = """
 What's the 2-character code for your country? (for example, US for United States).
@@ -41,12 +41,67 @@ For example, !tz set America/Santiago
 
 DT_FORMAT = "%a %I:%M:%S %p %Z"
 
+# How long a cached offset for a zone without transition data is trusted before it's recomputed.
+OFFSET_FALLBACK_TTL = datetime.timedelta(hours=1)
+
+
+class TimeZoneTable:
+    """
+    Cache of tzinfo objects and their current UTC offsets.
+
+    Each cached offset is kept until the zone's next DST transition, so lookups don't have to rebuild the timezone or
+    re-localize anything until the offset actually changes.
+    """
+
+    def __init__(self):
+        # zone name -> (tzinfo, utc offset, naive utc datetime the offset is valid until)
+        self._offsets = {}
+
+    def get_tz(self, name: str) -> datetime.tzinfo:
+        return self._get_entry(name)[0]
+
+    def utcoffset(self, name: str) -> datetime.timedelta:
+        return self._get_entry(name)[1]
+
+    def now(self, name: str) -> datetime.datetime:
+        """Get the current local time in a zone."""
+        return pytz.utc.localize(datetime.datetime.utcnow()).astimezone(self.get_tz(name))
+
+    def diff_hours(self, name1: str, name2: str) -> int:
+        """
+        Returns the difference in whole hours between timezone 1 and timezone 2
+        """
+        return int((self.utcoffset(name1) - self.utcoffset(name2)).total_seconds() / 3600)
+
+    def _get_entry(self, name: str) -> Tuple[datetime.tzinfo, datetime.timedelta, datetime.datetime]:
+        utcnow = datetime.datetime.utcnow()
+        entry = self._offsets.get(name)
+        if entry is None or entry[2] <= utcnow:
+            tz = entry[0] if entry is not None else pytz.timezone(name)
+            entry = (tz, pytz.utc.localize(utcnow).astimezone(tz).utcoffset(), self._next_transition(tz, utcnow))
+            self._offsets[name] = entry
+        return entry
+
+    @staticmethod
+    def _next_transition(tz: datetime.tzinfo, utcnow: datetime.datetime) -> datetime.datetime:
+        """Get the next time the zone's UTC offset changes."""
+        transitions = getattr(tz, "_utc_transition_times", None)
+        if transitions is None:
+            # Static zones never change
+            return datetime.datetime.max if isinstance(tz, pytz.tzinfo.StaticTzInfo) or tz is pytz.utc \
+                else utcnow + OFFSET_FALLBACK_TTL
+
+        i = bisect_right(transitions, utcnow)
+        # Past the end of the transition table, so the zone has either stopped observing DST or the table ran out.
+        return transitions[i] if i < len(transitions) else utcnow + OFFSET_FALLBACK_TTL
+
 
 class TimeZones(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
         self.config = bot.config
+        self.tz_table = TimeZoneTable()
 
     def set_timezone(self, user_id: int, timezone_str: str):
         """
@@ -74,6 +129,27 @@ class TimeZones(commands.Cog):
         else:
             return self.get_timezone(user_id)
 
+    def get_timezones_respecting_privacy(self, user_ids: Iterable[int], guild_id: int) -> Dict[int, Optional[str]]:
+        """
+        Bulk version of get_timezone_respecting_privacy, fetching every user's settings in a single round trip.
+        :param user_ids: Users to pull from
+        :param guild_id: Guild to reference for privacy settings
+        :return: Dict of user id to timezone name, or None if it's hidden or unset
+        """
+        user_ids = list(user_ids)
+        pipe = self.config.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.get("user:{}:tz:timezone".format(user_id))
+            pipe.get("user:{}:tz:privacy_enabled".format(user_id))
+            pipe.sismember("user:{}:tz:whitelist_guilds".format(user_id), guild_id)
+        results = pipe.execute() if user_ids else []
+
+        timezones = {}
+        for i, user_id in enumerate(user_ids):
+            tz_name, privacy, whitelisted = results[i * 3:i * 3 + 3]
+            timezones[user_id] = tz_name if not (privacy == "1" and not whitelisted) else None
+        return timezones
+
     def has_privacy_enabled(self, user_id: int) -> bool:
         return self._privacy_setting(user_id) == "1"
 
@@ -100,17 +176,6 @@ class TimeZones(commands.Cog):
         self.config.delete("user:{}:tz:timezone".format(user_id))
         self.config.delete("user:{}:tz:privacy_enabled".format(user_id))
 
-    @staticmethod
-    def tz_diff(tz1, tz2):
-        """
-        Returns the difference in hours between timezone2 and timezone 1
-        """
-
-        utcnow = pytz.timezone('utc').localize(datetime.datetime.utcnow())  # generic time
-        here = utcnow.astimezone(tz1).replace(tzinfo=None)
-        there = utcnow.astimezone(tz2).replace(tzinfo=None)
-        return dateutil.relativedelta.relativedelta(here, there).hours
-
     @commands.group()
     async def tz(self, ctx: Context):
         """
@@ -246,41 +311,36 @@ class TimeZones(commands.Cog):
         The first two users can be specified by name, but any beyond that must be tagged.
         """
 
-        user_tz_name = self.get_timezone(ctx.author.id)
+        # Timezones the members don't want exposed in here come back as None
+        timezones = self.get_timezones_respecting_privacy(
+            [ctx.author.id] + [m.id for m in mentions if m.id != ctx.author.id], ctx.guild.id
+        )
 
         desc = []
-        user_dt = None
-        user_tz = None
+        user_tz_name = timezones[ctx.author.id]
 
-        if user_tz_name and not (self.has_privacy_enabled(ctx.author.id) and
-                                 not self.is_whitelisted(ctx.author.id, ctx.guild.id)):
-            user_tz = pytz.timezone(user_tz_name)
-            user_dt = datetime.datetime.now(tz=user_tz)
+        if user_tz_name:
+            user_dt = self.tz_table.now(user_tz_name)
             desc.append("**{}**:\n {}".format("{}'s local time".format(ctx.author.name),
                                               user_dt.strftime(DT_FORMAT)))
 
         for member in mentions:
             if member.id == ctx.author.id:
                 continue
-            mem_tz = self.get_timezone(member.id)
+            mem_tz = timezones[member.id]
 
             if mem_tz is None:
                 continue
-            elif self.has_privacy_enabled(member.id) and not self.is_whitelisted(member.id, ctx.guild.id):
-                # Skip the user if they don't want their TZ exposed in here
-                continue
             else:
-                new_tz = pytz.timezone(mem_tz)
-                new_dt = datetime.datetime.now(tz=new_tz)
-                # Storing them as a tuple of (display name, tz_info)
+                new_dt = self.tz_table.now(mem_tz)
 
                 new_desc = "**{}**:\n {}".format(member.display_name, new_dt.strftime(DT_FORMAT))
 
                 # show the difference between the calling user's timezone and the displayed ones, if the
                 # calling user doesn't have privacy enabled
 
-                if user_tz is not None:
-                    time_dif_hrs = self.tz_diff(new_tz, user_tz)
+                if user_tz_name is not None:
+                    time_dif_hrs = self.tz_table.diff_hours(mem_tz, user_tz_name)
                     if time_dif_hrs != 0:
                         new_desc += " ({} hours {})".format(
                             abs(time_dif_hrs), "ahead" if time_dif_hrs > 0 else "behind"
@@ -292,6 +352,42 @@ class TimeZones(commands.Cog):
 
         await ctx.send(embed=embed)
 
+    @tz.command()
+    async def channel(self, ctx: Context):
+        """
+        Show the local time of everyone online in this channel who has a timezone set, grouped by timezone.
+        """
+
+        members = [m for m in ctx.channel.members if not m.bot and m.status != discord.Status.offline]
+        timezones = self.get_timezones_respecting_privacy([m.id for m in members], ctx.guild.id)
+
+        # zone name -> display names, so each zone only gets localized once
+        by_zone = {}
+        for member in members:
+            tz_name = timezones[member.id]
+            if tz_name is not None:
+                by_zone.setdefault(tz_name, []).append(member.display_name)
+
+        if not by_zone:
+            await ctx.send("Nobody online here has shared their timezone.")
+            return
+
+        desc = []
+        for tz_name in sorted(by_zone, key=self.tz_table.utcoffset):
+            desc.append("**{}** ({}):\n {}".format(
+                self.tz_table.now(tz_name).strftime(DT_FORMAT), tz_name, ", ".join(sorted(by_zone[tz_name]))
+            ))
+
+        # Cut it off before we hit the embed description limit
+        description = "Local times in #{}:\n\n".format(ctx.channel.name)
+        for i, line in enumerate(desc):
+            if len(description) + len(line) > 4000:
+                description += "\n...and {} more timezones.".format(len(desc) - i)
+                break
+            description += line + "\n"
+
+        await ctx.send(embed=discord.Embed(description=description))
+
     @tz.command()
     async def reltime(self, ctx: Context, src: discord.Member, target: discord.Member, *, time: str):
         """
@@ -304,8 +400,9 @@ class TimeZones(commands.Cog):
         not_found_user = None
         format_str = "%H:%M"
 
-        src_tz_str = self.get_timezone_respecting_privacy(src.id, ctx.guild.id)
-        target_tz_str = self.get_timezone_respecting_privacy(target.id, ctx.guild.id)
+        timezones = self.get_timezones_respecting_privacy([src.id, target.id], ctx.guild.id)
+        src_tz_str = timezones[src.id]
+        target_tz_str = timezones[target.id]
 
         if not src_tz_str:
             not_found_user = src
@@ -316,15 +413,15 @@ class TimeZones(commands.Cog):
             await ctx.send("Cannot compare, {} has no timezone info.".format(not_found_user.display_name))
             return
 
-        src_tz = pytz.timezone(src_tz_str)
-        target_tz = pytz.timezone(target_tz_str)
+        src_tz = self.tz_table.get_tz(src_tz_str)
+        target_tz = self.tz_table.get_tz(target_tz_str)
 
         src_time = datetime.datetime.strptime(time, format_str)
 
-        now = datetime.datetime.now()
+        now = self.tz_table.now(src_tz_str)
 
-        src_time = src_time.replace(year=now.year, month=now.month, day=now.day,
-                                    tzinfo=src_tz)
+        # Localizing (rather than replacing tzinfo) picks up the zone's actual offset for today
+        src_time = src_tz.localize(src_time.replace(year=now.year, month=now.month, day=now.day))
         # src_time = src_tz.normalize(src_time)
 
         # src_dt = src_tz.fromutc(src_time)
@@ -7,6 +7,8 @@ structure:
 user:{id}:mod:{guild_id}
     :notes
         :all: list of all timestamp keys associated to a user
+        :index: sorted set of all timestamp keys, scored by timestamp
+            :<note_type>: sorted set of the timestamp keys of notes with that type
         :<timestamp>: timestamp when the note was created, truncated to the second.
 
 Note structure:
@@ -19,28 +21,59 @@ Note structure:
 }
 
 guild:{id}:mod:notes:track_mod_actions: 0/1 if mod actions are tracked or not
+config:mod:notes:indexed: set once notes from before the sorted indexes existed have been indexed, so the startup
+    migration only ever scans the keyspace once
 """
-import asyncio
+from math import ceil
 from threading import Lock
-from typing import Union, Tuple, List, Dict, Any
+from typing import Union, Tuple, List, Dict, Iterator
 
 from discord.ext import commands
-from discord.ext.menus import ListPageSource, MenuPages
+from discord.ext.menus import MenuPages, PageSource
+from cogs.utils.audit_log import get_audit_log_tail
 from cogs.utils.checks import has_manage_roles
 import discord
 import time
 
 SUPPORTED_KEYWORDS = {"POS", "NEG", "INFO", "KICK", "BAN"}
 
+# How many notes are fetched per round trip when streaming a user's whole history
+NOTE_FETCH_BATCH_SIZE = 50
 
-class InventoryPageSource(ListPageSource):
 
-    def __init__(self, entries: List[discord.Embed]):  # Specify Embeds
-        super().__init__(entries, per_page=1)  # Only one embed per message (page)
+class NotePageSource(PageSource):
+    """
+    Page source that only fetches the notes on the page being shown, newest first.
+    """
 
-    async def format_page(self, menu: MenuPages, page: Any):  # Copied from example
-        offset = menu.current_page * self.per_page
-        return self.entries[offset]
+    def __init__(self, cog: "UserNotes", user, guild, note_types: List[str], title: str, per_page: int = 5):
+        self.cog = cog
+        self.user = user
+        self.guild = guild
+        self.title = title
+        self.per_page = per_page
+        self.index_key = cog.note_index_key(user, guild, note_types)
+        self._note_types = note_types
+        self._count = 0
+
+    async def prepare(self):
+        self._count = self.cog.count_notes(self.user, self.guild, self._note_types)
+
+    def is_paginating(self):
+        return self._count > self.per_page
+
+    def get_max_number_of_pages(self):
+        return max(ceil(self._count / self.per_page), 1)
+
+    async def get_page(self, page_number: int) -> List[Dict]:
+        start = page_number * self.per_page
+        return self.cog.get_notes_page(self.user, self.guild, self._note_types, start, start + self.per_page - 1)
+
+    async def format_page(self, menu: MenuPages, page: List[Dict]):
+        return discord.Embed(
+            title=self.title,
+            description="\n".join(self.cog._format_note(note) for note in page) or "(No notes found)"
+        )
 
 
 class InventoryMenuPages(MenuPages):
@@ -81,9 +114,37 @@ class UserNotes(commands.Cog):
 
     MOD_NOTE_ID_KEY = "config:mod:notes:id"
 
+    MOD_NOTE_INDEXED_KEY = "config:mod:notes:indexed"
+
     def __init__(self, bot):
         self.bot = bot
         self.config = bot.config
+        self._index_legacy_notes()
+
+    def _index_legacy_notes(self) -> None:
+        """
+        Build the sorted note indexes for notes that were only ever written to the :all sets.
+        Only needs to run once, after which every note is indexed as it's written.
+        """
+        if self.config.exists(self.MOD_NOTE_INDEXED_KEY):
+            return
+
+        for list_key in self.config.scan_iter("user:*:mod:*:notes:all"):
+            base_key = list_key[:-len(":all")]
+            note_timestamps = list(self.config.smembers(list_key))
+
+            pipe = self.config.pipeline(transaction=False)
+            for note_ts in note_timestamps:
+                pipe.hget("{}:{}".format(base_key, note_ts), "note_type")
+            note_types = pipe.execute()
+
+            for note_ts, note_type in zip(note_timestamps, note_types):
+                pipe.zadd("{}:index".format(base_key), {note_ts: int(note_ts)})
+                if note_type:
+                    pipe.zadd("{}:index:{}".format(base_key, note_type.upper()), {note_ts: int(note_ts)})
+            pipe.execute()
+
+        self.config.set(self.MOD_NOTE_INDEXED_KEY, 1)
 
     @staticmethod
     def _ensure_ids(user: Union[str, int, discord.User],
@@ -137,6 +198,16 @@ class UserNotes(commands.Cog):
     def note_list_key(self, user, guild):
         return "{}:all".format(self.note_base_key(user, guild))
 
+    def note_index_key(self, user, guild, note_types: List[str] = None) -> str:
+        """
+        Get the key of the sorted index holding the user's notes of the given types, or all of them if none are given.
+        Indexes covering more than one type are built on demand by get_notes_page.
+        """
+        base_key = "{}:index".format(self.note_base_key(user, guild))
+        if not note_types:
+            return base_key
+        return "{}:{}".format(base_key, "+".join(sorted(note_types)))
+
     def _get_note_key(self, user, guild, note_ts: str) -> str:
         """
         Get a note key based on ID
@@ -149,22 +220,57 @@ class UserNotes(commands.Cog):
         note_key = "{}:{}".format(self.note_base_key(user, guild), note_ts)
         return note_key
 
-    def get_all_notes(self, user, guild) -> List[Dict]:
+    def count_notes(self, user, guild, note_types: List[str] = None) -> int:
         """
-        Fetch all notes on a given user.
-        :param user: User to fetch notes from.
-        :param guild: Guild in which the notes are scoped
-        :return: List of all note dicts
+        Count a user's notes of the given types, or all of them if none are given.
         """
+        if not note_types:
+            return int(self.config.zcard(self.note_index_key(user, guild)))
 
-        all_notes = []
-
-        all_note_timestamps = self.config.smembers(self.note_list_key(user, guild))
+        pipe = self.config.pipeline(transaction=False)
+        for note_type in note_types:
+            pipe.zcard(self.note_index_key(user, guild, [note_type]))
+        return sum(pipe.execute())
 
-        for note_ts in all_note_timestamps:
-            all_notes.append(self.config.hgetall(self._get_note_key(user, guild, note_ts)))
+    def get_notes_page(self, user, guild, note_types: List[str], start: int, end: int) -> List[Dict]:
+        """
+        Fetch a slice of a user's notes, newest first, in two round trips.
+        :param user: User to fetch notes from.
+        :param guild: Guild in which the notes are scoped
+        :param note_types: Types of notes to include, or None for every note
+        :param start: Index of the first note to fetch
+        :param end: Index of the last note to fetch (inclusive)
+        """
+        index_key = self.note_index_key(user, guild, note_types)
+
+        pipe = self.config.pipeline(transaction=False)
+        if note_types and len(note_types) > 1:
+            # Merge the per-type indexes into a short-lived combined one
+            pipe.zunionstore(index_key, [self.note_index_key(user, guild, [t]) for t in note_types])
+            pipe.expire(index_key, 60)
+        pipe.zrevrange(index_key, start, end)
+        note_timestamps = pipe.execute()[-1]
+
+        pipe = self.config.pipeline(transaction=False)
+        for note_ts in note_timestamps:
+            pipe.hgetall(self._get_note_key(user, guild, note_ts))
+        return pipe.execute() if note_timestamps else []
+
+    def get_all_notes(self, user, guild) -> Iterator[Dict]:
+        """
+        Stream all notes on a given user, newest first, fetching them in batches.
+        :param user: User to fetch notes from.
+        :param guild: Guild in which the notes are scoped
+        :return: Iterator of note dicts
+        """
 
-        return all_notes
+        start = 0
+        while True:
+            notes = self.get_notes_page(user, guild, None, start, start + NOTE_FETCH_BATCH_SIZE - 1)
+            yield from notes
+            if len(notes) < NOTE_FETCH_BATCH_SIZE:
+                return
+            start += NOTE_FETCH_BATCH_SIZE
 
     def add_note(self, creator, user, guild, note_type: str, note_message: str) -> str:
         # Not too many checks needed; dupes are okay
@@ -197,8 +303,12 @@ class UserNotes(commands.Cog):
 
         note_key = self._get_note_key(user, guild, note_ts)
 
-        self.config.hmset(note_key, note_dict)
-        self.config.sadd(self.note_list_key(user, guild), note_ts)
+        pipe = self.config.pipeline(transaction=False)
+        pipe.hmset(note_key, note_dict)
+        pipe.sadd(self.note_list_key(user, guild), note_ts)
+        pipe.zadd(self.note_index_key(user, guild), {note_ts: int(note_ts)})
+        pipe.zadd(self.note_index_key(user, guild, [note_type]), {note_ts: int(note_ts)})
+        pipe.execute()
 
         return note_ts
 
@@ -278,8 +388,12 @@ class UserNotes(commands.Cog):
                 await server_logs_cog.handle_external_embed(ctx, "deleted a mod note from {}".format(user.id),
                                                             priority=True, member=ctx.author,
                                                             note_message=note["note_text"])
-            self.config.delete(note_key)
-            self.config.srem(self.note_list_key(user, ctx.guild), note_id)
+            pipe = self.config.pipeline(transaction=False)
+            pipe.delete(note_key)
+            pipe.srem(self.note_list_key(user, ctx.guild), note_id)
+            pipe.zrem(self.note_index_key(user, ctx.guild), note_id)
+            pipe.zrem(self.note_index_key(user, ctx.guild, [note["note_type"].upper()]), note_id)
+            pipe.execute()
             await ctx.send("Note removed.")
 
     @staticmethod
@@ -289,33 +403,12 @@ class UserNotes(commands.Cog):
         return "__[{note_type}]__\t'**{note_text}**'\t(by <@{creator}> at <t:{datetime}:T>, ID {datetime})".format(
                     **note_dict)
 
-    async def create_menu(self, ctx, title, matched_tag_rows: List[str]):
-        pages = list()
-
-        # This will set how many fields are in the embed
-        page_length = 5
-
-        row_buckets = [matched_tag_rows[n:n + page_length] for n in range(0, len(matched_tag_rows), page_length)]
-
-        for page_number, page in enumerate(row_buckets):
-
-            # Build embed base with the current page number
-            em = discord.Embed(
-                title=title,
-                description="\n".join(page)
-            )
-
-            pages.append(em)
-
-        # Initial message
-        msg = await ctx.send(embed=pages[0])
-
+    async def create_menu(self, ctx, source: PageSource):
         menu = InventoryMenuPages(
-            source=InventoryPageSource(pages),
+            source=source,
             timeout=20.0,
             delete_message_after=True,
             clear_reactions_after=True,
-            message=msg
         )
 
         await menu.start(ctx)
@@ -332,48 +425,33 @@ class UserNotes(commands.Cog):
         if args:
             matched_tags = set([i.upper() for i in args.split()])
 
-        # Fetch the note IDs and sort by them
-        user_notes = self.config.smembers(self.note_list_key(user, ctx.guild))
-        if not user_notes:
+        if not self.count_notes(user, ctx.guild):
             await ctx.send("User has no notes.")
             return
 
-        output = []
-
-        user_notes = reversed(sorted(user_notes))
-
-        for note_id in user_notes:
-            note_key = self._get_note_key(user, ctx.guild, note_id)
-            note_dict = self.config.hgetall(note_key)
-            if not matched_tags or matched_tags and note_dict["note_type"] in matched_tags:
-                output.append(self._format_note(note_dict))
-
         embed_title = "User Notes for {}".format(user)
 
         if matched_tags:
             embed_title += " (matching tags {})".format(", ".join(matched_tags))
 
-        if not output and matched_tags:
-            output = ["(No notes found)"]
-
-        await self.create_menu(ctx, embed_title, output)
+        await self.create_menu(ctx, NotePageSource(self, user, ctx.guild, sorted(matched_tags), embed_title))
 
     @note.command()
     async def qlist(self, ctx, user: discord.Member):
         """
         Get a quick summary of a user's notes
         """
-        user_notes = self.get_all_notes(user, ctx.guild)
-        if not user_notes:
+        # Every note type has its own index, so this is just one zcard per type
+        keywords = sorted(SUPPORTED_KEYWORDS)
+        pipe = self.config.pipeline(transaction=False)
+        for note_type in keywords:
+            pipe.zcard(self.note_index_key(user, ctx.guild, [note_type]))
+        note_types = {k: v for k, v in zip(keywords, pipe.execute()) if v}
+
+        if not note_types:
             await ctx.send("User has no notes.")
             return
 
-        note_types = {}
-
-        for note in user_notes:
-            type_count = note_types.get(note["note_type"].upper(), 0)
-            note_types[note["note_type"].upper()] = type_count + 1
-
         summary = ["{}: {}".format(k.upper(), v) for k, v in note_types.items()]
 
         embed = discord.Embed(title="Quick summary for {}".format(user),
@@ -382,37 +460,37 @@ class UserNotes(commands.Cog):
         await ctx.send(embed=embed)
 
     async def get_audit_log_info(self, target_id: int, guild_id: int,
-                                 action: discord.AuditLogAction, limit: int=10) -> Tuple[str, str]:
+                                 action: discord.AuditLogAction) -> Tuple[str, str]:
         """
         Get information from audit logs relating to the last mod action.
         :param target_id: User who the action was performed on.
         :param guild_id: Guild in which the event was triggered
         :param action: Audit log action to look for
-        :param limit: Number of logs to search back through
-        :return: (mod responsible, reason)
-        """
-        async for log_entry in self.bot.get_guild(guild_id).audit_logs(action=action, limit=limit):
-            if log_entry.target.id == target_id:
-                # Let's stop at the first entry.
-                mod_responsible = log_entry.user
-                reason = log_entry.reason if log_entry.reason is not None else "None Given"  # Should be None
-                return mod_responsible, reason
-        else:
-            return "Unknown", "None found."
+        :return: (mod responsible, reason), or (None, None) if no matching entry was found.
+        """
+        mod_responsible, reason = await get_audit_log_tail(self.bot).find_responsible(
+            self.bot.get_guild(guild_id), action, target_id)
+        if mod_responsible is None:
+            return None, None
+        return mod_responsible, reason if reason is not None else "None Given"
 
     @commands.Cog.listener()
-    async def on_member_ban(self, member):
-        if not self._kicks_bans_tracked(member.guild):
+    async def on_member_ban(self, guild, member):
+        if not self._kicks_bans_tracked(guild):
             return
         try:
             # Check audit logs to see if we can glean why the user was banned
-            mod_responsible, reason = await self.get_audit_log_info(member.id, member.guild.id,
+            mod_responsible, reason = await self.get_audit_log_info(member.id, guild.id,
                                                                     discord.AuditLogAction.ban)
         except discord.Forbidden:  # No audit log perms
-            mod_responsible = self.bot.user.id  # Track an ID anyway since otherwise we might run into issues
+            mod_responsible = None
             reason = "(Unknown, missing audit log permissions)"
 
-        self.add_note(mod_responsible, member, member.guild, "BAN",
+        if mod_responsible is None:
+            mod_responsible = self.bot.user.id  # Track an ID anyway since otherwise we might run into issues
+            reason = reason or "None found."
+
+        self.add_note(mod_responsible, member, guild, "BAN",
                       "(auto) Reason: {}".format(reason))
 
     @commands.Cog.listener()
@@ -425,16 +503,15 @@ class UserNotes(commands.Cog):
         if not self._kicks_bans_tracked(member.guild):
             return
 
-        # wait a second to let multiple events take place
-        await asyncio.sleep(1)
-
         try:
-            # Check audit logs to see if we can glean why the user was banned
+            # Check audit logs to see if the leave was a kick
             mod_responsible, reason = await self.get_audit_log_info(member.id, member.guild.id,
-                                                                    discord.AuditLogAction.kick, limit=1)
-        except discord.Forbidden:  # No audit log perms
-            mod_responsible = self.bot.user.id  # Track an ID anyway since otherwise we might run into issues
-            reason = "(Unknown, missing audit log permissions)"
+                                                                    discord.AuditLogAction.kick)
+        except discord.Forbidden:  # No audit log perms, so there's no telling kicks from leaves
+            return
+
+        if mod_responsible is None:  # Just a regular leave
+            return
 
         self.add_note(mod_responsible, member, member.guild, "KICK",
                       "(auto) Reason: {}".format(reason))
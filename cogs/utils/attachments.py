@@ -0,0 +1,244 @@
+"""
+Preserving attachments from deleted messages and forwarded DMs.
+
+Event handlers hand attachments to the AttachmentPreserver along with a coroutine that delivers the downloaded files,
+and return straight away. If delivery only queues the upload elsewhere, it returns a future for it; the files are held
+until that resolves, without tying up a worker. A pool of workers does the downloading and delivery off a bounded
+queue:
+    - at most MAX_CONCURRENT_DOWNLOADS downloads run at once
+    - the bytes held across every download and pending upload are capped at MAX_INFLIGHT_BYTES; downloads wait for
+      room rather than piling up in memory
+    - files are streamed in CHUNK_SIZE chunks into spooled temp files, which move to disk past SPOOL_THRESHOLD
+
+By the time a delete event arrives, the attachment's URLs may already 404. Channels in `config:mod:precache_channels`
+have their attachments downloaded as soon as they're posted and held for up to PRECACHE_TTL, within a byte budget of
+PRECACHE_BYTES, so deletes there can be served from the local copy.
+
+The preserver is shared between cogs and lives as long as the bot does; cogs shouldn't close it when they unload.
+"""
+
+import asyncio
+import logging
+
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
+from time import monotonic
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import aiohttp
+import discord
+from discord.ext.commands import Bot
+
+log = logging.getLogger()
+
+MAX_ATTACHMENT_SIZE = 8 * 1024 ** 2  # Discord's upload limit without boosts
+MAX_CONCURRENT_DOWNLOADS = 4
+MAX_INFLIGHT_BYTES = 48 * 1024 ** 2
+SPOOL_THRESHOLD = 1024 ** 2
+CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 30
+UPLOAD_QUEUE_SIZE = 200
+UPLOAD_WORKERS = 2
+
+PRECACHE_BYTES = 128 * 1024 ** 2
+PRECACHE_TTL = 3600
+
+# Returns a future for the upload if it's still pending, or None once it's done with the files
+Deliver = Callable[[List[discord.File]], Awaitable[Optional[asyncio.Future]]]
+
+
+class PreservedFile:
+    __slots__ = ("attachment_id", "filename", "fp", "size", "created")
+
+    def __init__(self, attachment_id: int, filename: str, fp: SpooledTemporaryFile, size: int) -> None:
+        self.attachment_id = attachment_id
+        self.filename = filename
+        self.fp = fp
+        self.size = size
+        self.created = monotonic()
+
+    def to_file(self) -> discord.File:
+        self.fp.seek(0)
+        return discord.File(self.fp, filename="reupload.{}".format(self.filename))
+
+    def close(self) -> None:
+        self.fp.close()
+
+
+class PreservationJob:
+    __slots__ = ("attachments", "deliver")
+
+    def __init__(self, attachments: List[discord.Attachment], deliver: Deliver) -> None:
+        self.attachments = attachments
+        self.deliver = deliver
+
+
+class AttachmentPreserver:
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT))
+        self.queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+
+        self._download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        self._budget = asyncio.Condition()
+        self._inflight_bytes = 0
+
+        self._precache = OrderedDict()  # type: OrderedDict[int, PreservedFile]
+        self._precache_bytes = 0
+
+        self.stats = {"queued": 0, "delivered": 0, "dropped": 0, "too_large": 0, "failed": 0,
+                      "precached": 0, "precache_hits": 0}
+
+        self._workers = [self.bot.loop.create_task(self._worker()) for _ in range(UPLOAD_WORKERS)]
+
+    async def close(self) -> None:
+        """Only for when the bot is shutting down. Anything still queued is dropped."""
+        for worker in self._workers:
+            worker.cancel()
+        self.clear_precache()
+        await self.session.close()
+
+    # Queueing
+
+    def preserve(self, attachments: List[discord.Attachment], deliver: Deliver) -> bool:
+        """
+        Queue attachments to be downloaded and passed to `deliver`, which is always called, with whichever files
+        could be preserved. Returns False if the queue is full, in which case deliver is never called.
+
+        The files stay open until deliver returns, or until the future it returns is done.
+        """
+        try:
+            self.queue.put_nowait(PreservationJob(attachments, deliver))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            log.warning("Attachment queue is full, dropping {} attachments.".format(len(attachments)))
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            preserved = []
+            pending = None
+            try:
+                preserved = await asyncio.gather(*(self._get(attachment) for attachment in job.attachments))
+                preserved = [p for p in preserved if p is not None]
+                pending = await job.deliver([p.to_file() for p in preserved])
+                self.stats["delivered"] += 1
+            except Exception:
+                log.exception("Encountered exception when preserving attachments.")
+            finally:
+                self.queue.task_done()
+                if pending is not None:
+                    # Still waiting to be uploaded; hand the files off to the upload rather than waiting on it here
+                    pending.add_done_callback(lambda _, preserved=preserved: self._dispose(preserved))
+                else:
+                    self._dispose(preserved)
+
+    def _dispose(self, preserved: Iterable[PreservedFile]) -> None:
+        """Close files once they're no longer needed and give their bytes back to the budget."""
+        size = 0
+        for p in preserved:
+            p.close()
+            size += p.size
+        if size:
+            self.bot.loop.create_task(self._release(size))
+
+    # Downloading
+
+    async def _reserve(self, size: int) -> None:
+        async with self._budget:
+            await self._budget.wait_for(lambda: self._inflight_bytes + size <= MAX_INFLIGHT_BYTES)
+            self._inflight_bytes += size
+
+    async def _release(self, size: int) -> None:
+        if size:
+            async with self._budget:
+                self._inflight_bytes -= size
+                self._budget.notify_all()
+
+    async def _download(self, attachment: discord.Attachment) -> PreservedFile:
+        fp = SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+        try:
+            # The proxy url doesn't 404 immediately unlike the regular URL, so try it first
+            for url in (attachment.proxy_url, attachment.url):
+                async with self.session.get(url) as resp:
+                    if resp.status != 200:
+                        continue
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        fp.write(chunk)
+                    return PreservedFile(attachment.id, attachment.filename, fp, attachment.size)
+            raise FileNotFoundError(attachment.url)
+        except BaseException:
+            fp.close()
+            raise
+
+    async def _get(self, attachment: discord.Attachment) -> Optional[PreservedFile]:
+        """Take the attachment from the precache, or download it. Its bytes count against the in-flight budget."""
+        cached = self._precache.pop(attachment.id, None)
+        if cached is not None:
+            self._precache_bytes -= cached.size
+            self.stats["precache_hits"] += 1
+            await self._reserve(cached.size)
+            return cached
+
+        if attachment.size > MAX_ATTACHMENT_SIZE:
+            # caching is important and all, but this will just cause more harm than good
+            self.stats["too_large"] += 1
+            return None
+
+        await self._reserve(attachment.size)
+        try:
+            async with self._download_slots:
+                return await self._download(attachment)
+        except Exception as e:
+            await self._release(attachment.size)
+            self.stats["failed"] += 1
+            log.warning("Could not download attachment {}: {}: {}".format(attachment.id, type(e).__name__, e))
+            return None
+
+    # Precaching
+
+    def clear_precache(self) -> None:
+        for cached in self._precache.values():
+            cached.close()
+        self._precache.clear()
+        self._precache_bytes = 0
+
+    def _evict_precache(self, needed: int = 0) -> None:
+        now = monotonic()
+        while self._precache:
+            oldest = next(iter(self._precache.values()))
+            if now - oldest.created < PRECACHE_TTL and self._precache_bytes + needed <= PRECACHE_BYTES:
+                break
+            del self._precache[oldest.attachment_id]
+            self._precache_bytes -= oldest.size
+            oldest.close()
+
+    async def precache(self, message: discord.Message) -> None:
+        """Download a message's attachments now, in case it's deleted after its URLs stop working."""
+        for attachment in message.attachments:
+            if attachment.size > MAX_ATTACHMENT_SIZE or attachment.id in self._precache:
+                continue
+            self._evict_precache(attachment.size)
+            if self._precache_bytes + attachment.size > PRECACHE_BYTES:
+                continue
+            try:
+                async with self._download_slots:
+                    cached = await self._download(attachment)
+            except Exception:
+                log.exception("Encountered exception when precaching attachment.")
+                continue
+            self._precache[attachment.id] = cached
+            self._precache_bytes += cached.size
+            self.stats["precached"] += 1
+
+
+def get_attachment_preserver(bot: Bot) -> AttachmentPreserver:
+    """Get the attachment preserver shared between cogs, creating it on first use."""
+    preserver = getattr(bot, "attachment_preserver", None)
+    if preserver is None:
+        preserver = bot.attachment_preserver = AttachmentPreserver(bot)
+    return preserver
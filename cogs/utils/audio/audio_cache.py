@@ -0,0 +1,199 @@
+"""
+Shared on-disk cache for downloaded audio.
+
+Clips are keyed by youtube-dl's extractor and video id, so the same clip requested through different urls is only
+downloaded once. Each entry holds the file along with its info dict and duration. Callers that need a clip's info before
+committing to the download (to check its length, say) can extract it themselves and pass it to acquire(), which
+downloads from it rather than extracting again.
+
+The cache is bounded by total size on disk. Entries are reference counted while they're being played, and only
+unreferenced entries are evicted, least recently used first.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import youtube_dl
+
+from cogs.utils.audio.audio_utils import Downloader
+
+
+log = logging.getLogger()
+
+
+CACHE_DIR = ".tmp/audio_cache"
+
+# Default cap on the total size of the cache
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Longest we'll wait on youtube-dl to download a single clip. Full tracks can be long, so this is generous;
+# it's only there so a wedged download doesn't hold up everyone waiting on that url forever.
+DOWNLOAD_TIMEOUT = 15 * 60
+
+
+class CachedAudio:
+    """A downloaded clip in the cache."""
+
+    __slots__ = ("key", "path", "info", "duration", "size", "refs", "last_used")
+
+    def __init__(self, key: str, path: str, info: dict):
+        self.key = key
+        self.path = path
+        self.info = info
+        self.duration = info.get("duration")
+        self.size = os.path.getsize(path)
+        self.refs = 0
+        self.last_used = time.time()
+
+    def __repr__(self):
+        return "<CachedAudio {0.key} ({0.size} bytes, {0.refs} refs)>".format(self)
+
+
+class AudioCache:
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_bytes: int = DEFAULT_MAX_BYTES,
+                 cache_dir: str = CACHE_DIR):
+        self.loop = loop
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+
+        # Name files after the extractor and id so the same clip always lands in the same place
+        self.downloader = Downloader(outtmpl=os.path.join(cache_dir, "%(extractor_key)s-%(id)s.%(ext)s"))
+
+        # key -> CachedAudio, in least to most recently used order
+        self._entries = OrderedDict()
+        # url -> key, so repeat requests for a url don't need to touch youtube-dl at all
+        self._url_keys = {}
+        # url -> future for downloads in progress, so concurrent requests share a download
+        self._pending = {}
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        # Anything left over from a previous run isn't tracked, so start from scratch
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key_from_info(info: dict) -> str:
+        return "{}:{}".format(info.get("extractor_key", info.get("extractor")), info["id"])
+
+    def get(self, url: str) -> Optional[CachedAudio]:
+        """Get an entry that's already cached for a url, without downloading anything."""
+        key = self._url_keys.get(url)
+        return self._entries.get(key) if key is not None else None
+
+    async def acquire(self, url: str, info: Optional[dict] = None) -> CachedAudio:
+        """
+        Get the cached clip for a url, downloading it if it isn't cached yet.
+        The entry is held until release() is called with it, and won't be evicted until then.
+
+        :param info: The url's info, if the caller has already extracted it with Downloader.download_stats, so the
+            download doesn't have to extract it again
+        """
+        entry = self.get(url)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            while entry is None:
+                future = self._pending.get(url)
+                if future is None:
+                    future = asyncio.ensure_future(self._download(url, info))
+                    self._pending[url] = future
+                    future.add_done_callback(lambda _: self._pending.pop(url, None))
+                entry = await asyncio.shield(future)
+                if entry.key not in self._entries:
+                    # Evicted by a release before we got to take our reference; fetch it again
+                    entry = None
+
+        entry.refs += 1
+        entry.last_used = time.time()
+        self._entries.move_to_end(entry.key)
+        return entry
+
+    def release(self, entry: CachedAudio) -> None:
+        """Stop holding an entry. Must be called from the event loop; use release_threadsafe from voice threads."""
+        entry.refs = max(entry.refs - 1, 0)
+        self._evict()
+
+    def release_threadsafe(self, entry: CachedAudio) -> None:
+        self.loop.call_soon_threadsafe(self.release, entry)
+
+    async def _run_download(self, func, *args) -> dict:
+        return await asyncio.wait_for(asyncio.wrap_future(self.downloader.executor.submit(func, *args)),
+                                      DOWNLOAD_TIMEOUT)
+
+    async def _download(self, url: str, info: Optional[dict] = None) -> CachedAudio:
+        if info is None:
+            info = await self._run_download(self.downloader.download_with_stats, url)
+        elif self._key_from_info(info) not in self._entries:
+            try:
+                info = await self._run_download(self.downloader.download_from_info, info)
+            except youtube_dl.utils.DownloadError:
+                # The extracted media urls only last so long, so start over if they've gone stale
+                log.warning("Download from extracted info failed for {}, extracting again.".format(url))
+                info = await self._run_download(self.downloader.download_with_stats, url)
+
+        key = self._key_from_info(info)
+        self._url_keys[url] = key
+
+        entry = self._entries.get(key)
+        if entry is None:
+            # Another url for a clip we already have would have been skipped by youtube-dl, since the file exists
+            entry = CachedAudio(key, info["expected_filename"], info)
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            # Nobody holds the new entry until acquire() takes its reference, so don't evict it out from under them
+            self._evict(keep=key)
+
+        return entry
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """
+        Remove unreferenced entries, least recently used first, until we're under the size cap.
+        :param keep: Key of an entry to leave alone even if it's unreferenced
+        """
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        for entry in [e for e in self._entries.values() if e.refs == 0 and e.key != keep]:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._remove(entry)
+
+    def _remove(self, entry: CachedAudio) -> None:
+        del self._entries[entry.key]
+        self._url_keys = {url: key for url, key in self._url_keys.items() if key != entry.key}
+        self.total_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        log.info("Evicted {} from the audio cache.".format(entry.key))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "in_use": sum(1 for e in self._entries.values() if e.refs),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def get_audio_cache(bot) -> AudioCache:
+    """Get the cache shared by every audio cog, creating it on first use."""
+    cache = getattr(bot, "audio_cache", None)
+    if cache is None:
+        cache = bot.audio_cache = AudioCache(bot.loop)
+    return cache
@@ -35,9 +35,12 @@ youtube_dl.utils.bug_reports_message = lambda: ''
 
 class Downloader:
 
-    def __init__(self):
+    def __init__(self, **ytdl_options):
+        """
+        :param ytdl_options: Overrides for the base youtube-dl options, such as outtmpl.
+        """
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
-        self.client = youtube_dl.YoutubeDL(base_ytdl_options)
+        self.client = youtube_dl.YoutubeDL({**base_ytdl_options, **ytdl_options})
 
     def download_audio(self, url):
         """Download audio using yt-dl to a given path-like object."""
@@ -46,11 +49,33 @@ class Downloader:
             log.info("Downloaded audio for {}".format(url))
         return
 
-    def download_stats(self, url):
+    def download_with_stats(self, url) -> dict:
+        """Download audio and extract its info in a single youtube-dl pass."""
+        with self.client:
+            info = self.client.extract_info(url, download=True)
+            info["expected_filename"] = self.client.prepare_filename(info)
+            log.info("Downloaded audio and extracted info for {}".format(url))
+        return info
 
+    def download_from_info(self, info) -> dict:
+        """Download audio for info already extracted by download_stats, without extracting it again."""
         with self.client:
-            info = self.client.extract_info(url, download=False)
+            self.client.process_info(info)
             info["expected_filename"] = self.client.prepare_filename(info)
+            log.info("Downloaded audio for {}".format(info.get("webpage_url")))
+        return info
+
+    def download_stats(self, url, process=True):
+        """
+        Extract info for a url without downloading it.
+        If process is False, nothing beyond the top level is resolved: playlists come back with `entries` as a lazy
+        iterator of unresolved entries, which have to be consumed off the event loop.
+        """
+
+        with self.client:
+            info = self.client.extract_info(url, download=False, process=process)
+            if process:
+                info["expected_filename"] = self.client.prepare_filename(info)
             log.info("Extracted info for {}".format(url))
         return info
 
@@ -0,0 +1,173 @@
+"""
+Bank of short clips pre-decoded to raw PCM, for playing with as little latency as possible.
+
+Every clip in a directory is decoded once by ffmpeg to 48kHz 16-bit stereo PCM (what discord.py's voice client
+expects), and the result is memory-mapped. Playing a clip then just reads frames out of the mapping, so there's no
+ffmpeg process to spin up and nothing to decode before the first frame goes out.
+
+The directory is re-scanned whenever its mtime changes, or when a clip turns out to have no decode for its current
+mtime, as happens when it's overwritten in place. Decoded files for clips that have since been removed or replaced
+are deleted then.
+"""
+import asyncio
+import glob
+import logging
+import mmap
+import os
+import subprocess
+from typing import Optional, Set
+
+import discord
+from discord.opus import Encoder
+
+
+log = logging.getLogger()
+
+
+CLIP_BANK_CACHE_DIR = ".tmp/clip_bank"
+
+
+class MappedPCMAudio(discord.AudioSource):
+    """Audio source reading raw PCM frames straight out of a shared memory-mapped buffer."""
+
+    def __init__(self, buffer: mmap.mmap):
+        self._buffer = buffer
+        self._position = 0
+
+    def read(self) -> bytes:
+        frame = self._buffer[self._position:self._position + Encoder.FRAME_SIZE]
+        self._position += Encoder.FRAME_SIZE
+        if frame and len(frame) < Encoder.FRAME_SIZE:
+            # The encoder only takes whole frames
+            frame += b"\x00" * (Encoder.FRAME_SIZE - len(frame))
+        return frame
+
+    def is_opus(self) -> bool:
+        return False
+
+
+class ClipBank:
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, clip_glob: str = "micspam/*.*",
+                 cache_dir: str = CLIP_BANK_CACHE_DIR):
+        self.loop = loop
+        self.clip_glob = clip_glob
+        self.cache_dir = cache_dir
+
+        # Clip paths, in the same order as the indices we list out for %micspam. Listing them is cheap, so don't wait
+        # for the first refresh.
+        self.clips = glob.glob(clip_glob)
+        # decoded path (see _pcm_path) -> memory-mapped PCM, so a clip replaced at the same path is decoded again
+        self._buffers = {}
+
+        self._dir_mtime = None
+        self._refresh_task = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.clips)
+
+    def get_path(self, index: int) -> Optional[str]:
+        try:
+            return self.clips[index]
+        except IndexError:
+            return None
+
+    def get_source(self, index: int) -> Optional[discord.AudioSource]:
+        """
+        Get a playable source for a clip by index.
+        Falls back to decoding with ffmpeg if the clip hasn't been pre-decoded yet.
+        """
+        self.refresh_if_changed()
+
+        path = self.get_path(index)
+        if path is None:
+            return None
+
+        try:
+            buffer = self._buffers.get(self._pcm_path(path))
+        except OSError:
+            return None  # Removed since the last scan
+        if buffer is not None:
+            return MappedPCMAudio(buffer)
+
+        # New or replaced since the last refresh
+        self._start_refresh()
+        return discord.FFmpegPCMAudio(path)
+
+    def _directory_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(os.path.dirname(self.clip_glob) or ".").st_mtime
+        except FileNotFoundError:
+            return None
+
+    def refresh_if_changed(self) -> None:
+        """Kick off a background refresh if clips have been added or removed since the last one."""
+        if self._directory_mtime() != self._dir_mtime:
+            self._start_refresh()
+
+    def _start_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = self.loop.create_task(self.refresh())
+
+    async def refresh(self) -> None:
+        """Re-scan the clip directory and decode anything new, off the event loop."""
+        self._dir_mtime = self._directory_mtime()
+        clips = glob.glob(self.clip_glob)
+        self.clips = clips
+
+        current = set()
+        for path in clips:
+            try:
+                pcm_path = self._pcm_path(path)
+            except OSError:
+                continue  # Removed since the scan
+            current.add(pcm_path)
+
+            if pcm_path not in self._buffers:
+                try:
+                    buffer = await self.loop.run_in_executor(None, self._decode, path, pcm_path)
+                except (OSError, subprocess.CalledProcessError):
+                    log.exception("Failed to decode clip {}".format(path))
+                    continue
+                if buffer is not None:
+                    self._buffers[pcm_path] = buffer
+
+        for pcm_path in set(self._buffers) - current:
+            # Any sources still reading from it keep the mapping alive
+            del self._buffers[pcm_path]
+
+        await self.loop.run_in_executor(None, self._remove_stale, current)
+
+        log.info("Clip bank loaded {} of {} clips.".format(len(self._buffers), len(clips)))
+
+    def _pcm_path(self, path: str) -> str:
+        """Decoded clips are named after their mtime as well, so they're redone if the clip is replaced."""
+        return os.path.join(self.cache_dir, "{}-{}.pcm".format(os.path.basename(path), int(os.path.getmtime(path))))
+
+    def _remove_stale(self, current: Set[str]) -> None:
+        """Delete decoded files that don't belong to any current clip."""
+        for pcm_path in glob.glob(os.path.join(self.cache_dir, "*.pcm")):
+            if pcm_path not in current:
+                try:
+                    os.remove(pcm_path)
+                except OSError:
+                    # Still mapped somewhere that doesn't allow it; it'll go on a later refresh
+                    log.warning("Could not remove stale decoded clip {}".format(pcm_path))
+
+    def _decode(self, path: str, pcm_path: str) -> Optional[mmap.mmap]:
+        if not os.path.exists(pcm_path):
+            tmp_path = pcm_path + ".part"
+            subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-y", "-i", path,
+                 "-f", "s16le", "-ar", str(Encoder.SAMPLING_RATE), "-ac", str(Encoder.CHANNELS), tmp_path],
+                check=True, stdin=subprocess.DEVNULL
+            )
+            os.replace(tmp_path, pcm_path)
+
+        if os.path.getsize(pcm_path) == 0:
+            return None
+
+        with open(pcm_path, "rb") as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
@@ -13,15 +13,26 @@ Procedure should be like this:
         as a `history` queue. The track should never be in the playing queue if it has been touched.
     - Proceed to the next one.
 
+Nothing here should block the event loop: all youtube-dl work runs on the downloader's executor and is awaited with
+asyncio.wrap_future. The active song and the next PREFETCH_COUNT tracks are kept downloaded in the background, and the
+next track's ffmpeg process is spawned ahead of time, so moving on to it doesn't have to wait on either.
+
+Tracks are fetched through the shared audio cache, which holds onto each file until the playlist is done with it.
+
+Playlists are expanded lazily, only pulling more entries out of youtube-dl as the queue runs low. Playlists queued
+while another is still pending are expanded after it, one at a time.
 """
-from cogs.utils.audio.audio_utils import Downloader
-import concurrent.futures
+import asyncio
 import logging
-import os
 import discord
 import traceback
+from collections import deque
 from random import shuffle
 
+from cogs.utils.audio.audio_utils import Downloader
+from cogs.utils.audio.audio_cache import get_audio_cache
+from cogs.utils.audio.voice_sessions import get_voice_manager
+
 
 log = logging.getLogger()
 
@@ -37,6 +48,12 @@ base_ytdl_options = {
     # "quiet": True
 }
 
+# Number of upcoming tracks to keep downloaded in the background.
+PREFETCH_COUNT = 3
+
+# Longest we'll wait on youtube-dl to extract a track's info. Downloads themselves are timed by the audio cache.
+EXTRACT_TIMEOUT = 30
+
 
 class Playlist:
 
@@ -53,6 +70,7 @@ class Playlist:
         self.bound_text_channel = bound_text_channel
         self._bound_voice_channel = voice_client.channel
         self.downloader = Downloader()
+        self.audio_cache = get_audio_cache(bot)
         if executor is None:
             self.executor = self.downloader.executor
         else:
@@ -63,10 +81,22 @@ class Playlist:
         self._history_queue = []
         self._skipped_last = False
 
+        # Iterators of playlist entries that haven't been pulled into the live queue yet, in the order queued.
+        # Only one expansion runs at a time, since a generator can't be advanced from two threads at once.
+        self._pending_playlists = deque()
+        self._expand_lock = asyncio.Lock()
+        self._expand_task = None
+
+        # (entry, audio source) for the next track, opened ahead of time so it can start right away
+        self._next_source = None
+
         # amount of times to loop the current track.
         # if negative, the track will loop forever.
         self.loop_count = 0
 
+        # Set once another cog has taken the voice connection; nothing more gets played after that
+        self._shut_down = False
+
     def __len__(self):
         return len(self.live_queue)
 
@@ -97,29 +127,106 @@ class Playlist:
         output += "\n".join([self._build_track_message(i) for i in self.live_queue])
         return output
 
+    async def _run_in_executor(self, func, *args):
+        """Run a blocking info extraction call on the executor without blocking the event loop."""
+        return await asyncio.wait_for(asyncio.wrap_future(self.executor.submit(func, *args)), EXTRACT_TIMEOUT)
+
     async def _create_new_entry(self, song_url):
-        """Download and initialize a new song/track."""
-        # Start the music download first
-        audio_future = self.executor.submit(self.downloader.download_audio, song_url)
-        # Get the track info while that's going on, since it might take longer
-        info_future = self.executor.submit(self.downloader.download_stats, song_url)
+        """
+        Fetch the info for a new song/track. The audio itself is downloaded separately by _prefetch, from the info
+        extracted here, so youtube-dl only has to extract it once.
+        """
+        cached_audio = self.audio_cache.get(song_url)
+        if cached_audio is not None:
+            info_dict = dict(cached_audio.info)
+        else:
+            extracted_info = await self._run_in_executor(self.downloader.download_stats, song_url)
+            info_dict = dict(extracted_info)
+            info_dict["extracted_info"] = extracted_info
+        info_dict["source_url"] = song_url
+        info_dict["not_downloaded"] = True
+        return info_dict
+
+    async def get_track_info(self, song_url):
+        """Get the top-level info for a url, without resolving every entry if it's a playlist."""
+        return await self._run_in_executor(self.downloader.download_stats, song_url, False)
+
+    def _ensure_downloaded(self, entry) -> asyncio.Future:
+        """
+        Start downloading an entry in the background if it isn't already.
+        Returns a future which completes once the track is on disk.
+        """
+        future = entry.get("download_future")
+        if future is None:
+            future = asyncio.ensure_future(self._download_entry(entry))
+            future.add_done_callback(lambda _: self._preload_next_source())
+            entry["download_future"] = future
+        return future
+
+    async def _download_entry(self, entry):
+        # Held until the track is done playing; see _release_entry
+        cached_audio = await self.audio_cache.acquire(entry["source_url"], info=entry.pop("extracted_info", None))
+        entry.update(cached_audio.info)
+        entry["expected_filename"] = cached_audio.path
+        entry["cached_audio"] = cached_audio
+        entry.pop("not_downloaded", None)
+
+    def _release_entry(self, entry):
+        """Let the cache know we're done with an entry's file. It'll be re-fetched if it's played again."""
+        if entry is None:
+            return
+        cached_audio = entry.pop("cached_audio", None)
+        if cached_audio is not None:
+            self.audio_cache.release(cached_audio)
+        future = entry.pop("download_future", None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    def _prefetch(self):
+        """Keep the active song and the next few tracks downloaded, expanding any pending playlist as needed."""
+        upcoming = self.live_queue[:PREFETCH_COUNT]
+        if self.active_song is not None:
+            upcoming.insert(0, self.active_song)
 
-        concurrent.futures.wait([audio_future, info_future], 30, return_when=concurrent.futures.ALL_COMPLETED)
+        for entry in upcoming:
+            self._ensure_downloaded(entry)
 
-        return info_future.result()  # Might be able to do something with this at this point, maybe emit an event
+        if len(self.live_queue) < PREFETCH_COUNT and self._pending_playlists \
+                and (self._expand_task is None or self._expand_task.done()):
+            self._expand_task = asyncio.ensure_future(self._expand_playlist(PREFETCH_COUNT))
 
-    async def get_track_info(self, song_url):
-        info_future = self.executor.submit(self.downloader.download_stats, song_url)
-        return info_future.result()
+        self._preload_next_source()
+
+    def _preload_next_source(self):
+        """Spawn ffmpeg for the next track ahead of time, so it's ready to go as soon as the current one ends."""
+        next_entry = self.live_queue[0] if self.live_queue else None
+
+        if self._next_source is not None and self._next_source[0] is not next_entry:
+            # The queue has changed (skip, shuffle) since we opened it
+            self._next_source[1].cleanup()
+            self._next_source = None
+
+        if self._next_source is None and next_entry is not None:
+            future = next_entry.get("download_future")
+            if future is not None and future.done() and not future.cancelled() and future.exception() is None:
+                self._next_source = (next_entry, discord.FFmpegPCMAudio(next_entry["expected_filename"]))
+
+    def _take_source(self, entry):
+        """Get an audio source for an entry, using the preloaded one if it matches."""
+        if self._next_source is not None and self._next_source[0] is entry:
+            source = self._next_source[1]
+            self._next_source = None
+            return source
+        return discord.FFmpegPCMAudio(entry["expected_filename"])
 
     def _send_message(self, message_content):
-        """Send a message to the bound text channel from a non-async context"""
-        self.bot.loop.create_task(self.bound_text_channel.send(message_content))
+        """Send a message to the bound text channel. Safe to call from outside of the event loop."""
+        asyncio.run_coroutine_threadsafe(self.bound_text_channel.send(message_content), self.bot.loop)
 
     @staticmethod
     def _build_track_message(info_dict, mention_requester=False):
         """Most we are sure to get is url, title, and ID. Create a song repr that doesn't crash out."""
-        ret = "**{}**".format(info_dict["title"])
+        ret = "**{}**".format(info_dict.get("title", info_dict.get("source_url")))
         if info_dict.get("uploader"):
             ret += " by {}\n".format(info_dict["uploader"])
 
@@ -131,6 +238,7 @@ class Playlist:
 
     def shuffle(self):
         shuffle(self.live_queue)
+        self._prefetch()
 
     async def add_to_queue(self, url, ctx=None, **extra_info_tags):
         # TODO add basic playlist support
@@ -152,35 +260,75 @@ class Playlist:
         if index == 0 and self.active_song is None:
             # As soon as it pops up, set it to be active. This avoids any leftovers.
             self.active_song = self.live_queue.pop(0)
+            # This one's about to be played, so it has to be on disk before we return.
+            await self._ensure_downloaded(self.active_song)
+
+        self._prefetch()
 
         # If the index is 0, then we'd play
         return info_dict, index
 
+    def _iter_playlist_entries(self, playlist_info_dict, ctx=None):
+        """Lazily turn the raw entries of a playlist into queueable stubs."""
+        for entry in playlist_info_dict["entries"]:
+            if entry is None:
+                continue
+            stub = {
+                "source_url": entry.get("webpage_url") or entry["url"],
+                "title": entry.get("title"),
+                "not_downloaded": True
+            }
+            if ctx:
+                stub["requester"] = ctx.message.author
+            yield stub
+
+    async def _expand_playlist(self, count):
+        """Pull up to `count` more entries out of the pending playlists into the live queue."""
+        async with self._expand_lock:
+            added = 0
+            while added < count and self._pending_playlists:
+                # Pulling from the iterator can hit the network, so it has to happen off the loop.
+                entry = await self._run_in_executor(next, self._pending_playlists[0], None)
+                if entry is None:
+                    self._pending_playlists.popleft()
+                    continue
+                self.live_queue.append(entry)
+                added += 1
+
+        self._prefetch()
+
     async def queue_playlist(self, playlist_info_dict, ctx=None):
-        # TODO Consider making this a generator function which just sits in the playlist and yields items
-        # Implement this to reduce the initial load time so we don't just kill off pory
+        """
+        Queue up a playlist, only resolving the first entry up front.
+        The rest are pulled in and downloaded in the background as the queue runs low.
+        """
         first_index = 2e32
 
-        for i, entry in enumerate(playlist_info_dict["entries"]):
-            # The downloaded_url is a little different
-            entry["expected_filename"] = self.downloader.client.prepare_filename(entry)
-            if ctx:
-                entry["requester"] = ctx.message.author
-
-            if i < 3:
-                await self._create_new_entry(entry["url"])  # Download the track
-            else:
-                entry["not_downloaded"] = True
-            # info_dict, index = await self.add_to_queue(entry["url"])
-            self.live_queue.append(entry)
-            index = self.live_queue.index(entry)
-            if i == 0 and self.active_song is None and index == 0:
-                first_index = index
-                self.active_song = self.live_queue.pop(0)
+        self._pending_playlists.append(self._iter_playlist_entries(playlist_info_dict, ctx))
+        await self._expand_playlist(1)
+
+        if self.active_song is None and len(self.live_queue) == 1:
+            first_index = 0
+            self.active_song = self.live_queue.pop(0)
+            await self._ensure_downloaded(self.active_song)
+            self._prefetch()
 
         return first_index
 
+    def shut_down(self):
+        """Stop advancing through the queue, for when the voice connection is taken over by another cog."""
+        self._shut_down = True
+        self.loop_count = 0
+
     def after_song(self, err):
+        """Called from the voice thread once a track ends. Hands off to the event loop so it's never blocked here."""
+        if self._shut_down:
+            return
+        asyncio.run_coroutine_threadsafe(self._advance(err), self.bot.loop)
+
+    async def _advance(self, err):
+        if self._shut_down:
+            return
 
         if err:
             traceback.print_exception(type(err), err, err.__traceback__)
@@ -195,34 +343,44 @@ class Playlist:
             return
 
         self._history_queue.append(self.active_song)
+        self._release_entry(self.active_song)
+
+        if not self.live_queue and self._expand_task is not None and not self._expand_task.done():
+            # Still pulling the rest of a playlist in
+            await self._expand_task
+
         try:
             # We need to check to see if the last one was skipped because it seems that sometimes a skip will have
             # already executed the after_song in its after
             self.active_song = self.live_queue.pop(0)
-            # if not self._skipped_last:
-            #     self.active_song = self.live_queue.pop(0)
-            # else:
-            #     self.active_song = self.live_queue.pop(0)
-            #     self._skipped_last = False
-
-            if self.active_song.get("not_downloaded"):
-                future = self.executor.submit(self.downloader.download_audio, self.active_song["url"])
-                concurrent.futures.wait([future], 30, return_when=concurrent.futures.FIRST_COMPLETED)
-                future.result()
-            # self.bot.loop.create_task(self.play_song())
-            self.play_song()
         except IndexError:
             # It's empty: end of playlist
             self.active_song = None
             self._send_message("End of queue reached.")
+            return
+
+        try:
+            # Normally already done by the prefetcher
+            await self._ensure_downloaded(self.active_song)
+            if self._shut_down:
+                return
+        except Exception as e:
+            log.exception("Failed to download {}".format(self.active_song.get("source_url")))
+            self._send_message("Couldn't download {}, skipping. ({})".format(
+                self._build_track_message(self.active_song), type(e).__name__))
+            await self._advance(None)
+            return
+
+        self.play_song()
 
     def play_song(self, print_output: bool = True):
         # TODO: Give more info
         # We are only guaranteed url, title, id, filename
-        audio_source = discord.FFmpegPCMAudio(self.active_song["expected_filename"])
+        audio_source = self._take_source(self.active_song)
         self.voice_client.play(audio_source, after=lambda err: self.after_song(err))
         if print_output:
             self._send_message("Now playing: {}".format(self._build_track_message(self.active_song)))
+        self._prefetch()
 
     async def skip(self):
         self.loop_count = 0
@@ -231,12 +389,15 @@ class Playlist:
         self._send_message("Skipping.")
 
     def __del__(self):
-        """Clean up any remaining cache files that we're keeping track of"""
+        """Release any remaining cache files that we're keeping track of"""
+        if self._expand_task is not None:
+            self._expand_task.cancel()
+        if self._next_source is not None:
+            self._next_source[1].cleanup()
+
         for info in self.live_queue:
-            os.remove(info["expected_filename"])
-        for info in self._history_queue:
-            os.remove(info["expected_filename"])
-        if self.active_song is not None:
-            os.remove(self.active_song["expected_filename"])
+            self._release_entry(info)
+        self._release_entry(self.active_song)
 
-        self.bot.loop.create_task(self.voice_client.disconnect())
+        # Hand the connection back, in case another cog wants it
+        get_voice_manager(self.bot).release(self.voice_client.guild, "music")
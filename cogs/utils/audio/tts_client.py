@@ -0,0 +1,240 @@
+"""
+Async text-to-speech client.
+
+One TTSClient is shared by the bot. It holds a single long-lived backend (and with it, one HTTP session and nonce), and
+keeps an LRU cache of synthesized audio keyed by (voice, text), so repeated phrases don't hit the service at all.
+
+Backends are pluggable: AcapelaBackend talks to the real service, while LocalBackend synthesizes placeholder audio
+locally so latency and cache behaviour can be measured offline. Run this module directly for a quick benchmark.
+"""
+import abc
+import asyncio
+import io
+import logging
+import math
+import random
+import re
+import struct
+import time
+import wave
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import aiohttp
+import requests.utils
+
+from .voices import Voice, Voices
+
+
+log = logging.getLogger()
+
+
+# Default number of synthesized phrases to keep around
+TTS_CACHE_SIZE = 128
+
+
+class VoiceRegistry:
+    """Every available voice, loaded once and shared."""
+
+    _instance = None
+
+    def __init__(self):
+        self.voices = Voices.load()
+        self.voices_map = {voice.name: voice for voice in self.voices}
+
+    @classmethod
+    def get(cls) -> "VoiceRegistry":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __getitem__(self, voice_name: str) -> Voice:
+        return self.voices_map[voice_name]
+
+    def __contains__(self, voice_name: str) -> bool:
+        return voice_name in self.voices_map
+
+    def random(self) -> Voice:
+        return random.choice(self.voices)
+
+
+class TTSBackend(abc.ABC):
+    """Turns text into audio bytes in any format ffmpeg can read."""
+
+    @abc.abstractmethod
+    async def synthesize(self, text: str, voice: Voice) -> bytes:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class AcapelaBackend(TTSBackend):
+
+    NONCE_URL = "https://acapelavoices.acapela-group.com/index/getnonce"
+    SYNTH_URL = "http://www.acapela-group.com:8080/webservices/1-34-01-Mobility/Synthesizer"
+
+    def __init__(self):
+        self._session = None
+        # (email, nonce), reused until the service stops accepting it
+        self._credentials = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def _get_credentials(self, refresh: bool = False) -> Tuple[str, str]:
+        if self._credentials is None or refresh:
+            email = "".join(chr(random.randint(1, 26) + 64) for _ in range(random.randint(10, 20))) + "@gmail.com"
+
+            async with self.session.post(self.NONCE_URL, data={"json": {"googleid": email}}) as resp:
+                resp.raise_for_status()
+                nonce = (await resp.json())["nonce"]
+
+            self._credentials = (email, nonce)
+        return self._credentials
+
+    async def request_sound_url(self, text: str, voice_id: str) -> Optional[str]:
+        """Get a url for the synthesized audio, refreshing the nonce once if it's been rejected."""
+        for refresh in (False, True):
+            email, nonce = await self._get_credentials(refresh)
+
+            enc = "req_voice={}&cl_pwd=&cl_vers=1-30&req_echo=ON&cl_login=AcapelaGroup&req_comment=%7B%22nonce%22%3A%22{}%22%2C%22user%22%3A%22{}%22%7D&req_text={}&cl_env=ACAPELA_VOICES&prot_vers=2&cl_app=AcapelaGroup_WebDemo_Android".format(
+                voice_id,
+                nonce,
+                email,
+                requests.utils.quote(text)
+            )
+
+            async with self.session.post(self.SYNTH_URL, data=enc.encode("ascii"),
+                                         headers={"Content-Type": "application/x-www-form-urlencoded"}) as resp:
+                resp_content = await resp.text(encoding="utf-8")
+
+            regs = re.search("snd_url=(.+)&snd_size", resp_content)
+            if regs:
+                return regs.group(1)
+
+        return None
+
+    async def synthesize(self, text: str, voice: Voice) -> bytes:
+        url = await self.request_sound_url(text, voice.voice_file)
+        if url is None:
+            raise RuntimeError("TTS service didn't return any audio.")
+
+        async with self.session.get(url) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+class LocalBackend(TTSBackend):
+    """
+    Offline stand-in for the real service. Produces a short tone per word as a WAV, after an optional simulated delay.
+    """
+
+    SAMPLE_RATE = 22050
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    async def synthesize(self, text: str, voice: Voice) -> bytes:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        # Pitch depends on the voice so different voices are at least distinguishable
+        frequency = 220 + (sum(map(ord, voice.name)) % 440)
+        samples = int(self.SAMPLE_RATE * 0.15) * max(len(text.split()), 1)
+
+        fp = io.BytesIO()
+        with wave.open(fp, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(b"".join(
+                struct.pack("<h", int(8000 * math.sin(2 * math.pi * frequency * i / self.SAMPLE_RATE)))
+                for i in range(samples)
+            ))
+        return fp.getvalue()
+
+
+class TTSClient:
+
+    def __init__(self, backend: TTSBackend = None, cache_size: int = TTS_CACHE_SIZE):
+        self.backend = backend or AcapelaBackend()
+        self.voices = VoiceRegistry.get()
+        self.cache_size = cache_size
+
+        # (voice name, text) -> audio bytes, least recently used first
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def synthesize(self, text: str, voice_name: str) -> bytes:
+        """
+        Get audio for some text in a voice.
+        :raises KeyError: if the voice doesn't exist
+        """
+        voice = self.voices[voice_name]
+        key = (voice.name, text)
+
+        audio = self._cache.get(key)
+        if audio is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return audio
+
+        self.misses += 1
+        audio = await self.backend.synthesize(text, voice)
+        self._cache[key] = audio
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return audio
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "cached": len(self._cache),
+            "cached_bytes": sum(len(audio) for audio in self._cache.values()),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def get_tts_client(bot) -> TTSClient:
+    """
+    Get the TTS client shared by the bot, creating it on first use.
+    Set config:tts:backend to "local" to use the offline backend.
+    """
+    client = getattr(bot, "tts_client", None)
+    if client is None:
+        backend = LocalBackend() if bot.config.get("config:tts:backend") == "local" else AcapelaBackend()
+        client = bot.tts_client = TTSClient(backend)
+    return client
+
+
+if __name__ == '__main__':
+    async def benchmark():
+        client = TTSClient(LocalBackend(latency=0.25), cache_size=16)
+        phrases = ["owo what's this", "hello world", "goo", "quagsire is the best pokemon"] * 5
+        voice_names = ["WillFromAfar", "WillLittleCreature", "WillUpClose"]
+
+        for phrase in phrases:
+            voice_name = random.choice(voice_names)
+            started = time.perf_counter()
+            audio = await client.synthesize(phrase, voice_name)
+            print("{:>7.1f}ms  {:>6} bytes  {}: {}".format(
+                (time.perf_counter() - started) * 1000, len(audio), voice_name, phrase))
+
+        print(client.stats())
+
+    asyncio.get_event_loop().run_until_complete(benchmark())
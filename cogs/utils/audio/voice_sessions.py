@@ -0,0 +1,203 @@
+"""
+Voice connection pool shared by every cog that plays audio.
+
+There's only ever one voice connection per guild, so cogs claim it through the manager rather than connecting on their
+own. A claim reuses the guild's existing connection (moving it if it's in another channel) instead of tearing it down
+and reconnecting.
+
+Each claim has a priority. A cog can take over a connection held by a lower priority cog, which is told through its
+on_preempt callback so it can clean up after itself. The callback is also used if the connection is lost. Released connections are kept around for a little while in case
+something else wants them, and disconnected once they've been idle for long enough.
+"""
+import asyncio
+import logging
+import time
+from enum import IntEnum
+from typing import Callable, Optional
+
+import discord
+
+
+log = logging.getLogger()
+
+
+# How long a released connection is kept around before disconnecting
+IDLE_DISCONNECT_SECONDS = 30
+
+
+class VoicePriority(IntEnum):
+    QUACK = 0
+    BOOWOMP = 10
+    MICSPAM = 20
+    MUSIC = 30
+
+
+class VoiceSession:
+    """A cog's claim on a guild's voice connection."""
+
+    __slots__ = ("guild_id", "owner", "priority", "on_preempt", "claimed_at", "idle_task")
+
+    def __init__(self, guild_id: int, owner: str, priority: int, on_preempt: Optional[Callable[[], None]]):
+        self.guild_id = guild_id
+        self.owner = owner
+        self.priority = priority
+        self.on_preempt = on_preempt
+        self.claimed_at = time.time()
+        self.idle_task = None
+
+    @property
+    def idle(self) -> bool:
+        return self.owner is None
+
+
+class VoiceSessionManager:
+
+    def __init__(self, bot):
+        self.bot = bot
+        # guild id -> VoiceSession
+        self._sessions = {}
+
+        self.metrics = {
+            "connects": 0,
+            "reuses": 0,
+            "moves": 0,
+            "preemptions": 0,
+            "denied": 0,
+            "idle_disconnects": 0,
+            "connect_time_total": 0.0
+        }
+
+        bot.add_listener(self.on_voice_state_update)
+
+    def get_session(self, guild: discord.Guild) -> Optional[VoiceSession]:
+        return self._sessions.get(guild.id)
+
+    def owner_of(self, guild: discord.Guild) -> Optional[str]:
+        session = self._sessions.get(guild.id)
+        return session.owner if session else None
+
+    async def acquire(self, channel: discord.VoiceChannel, owner: str, priority: int,
+                      on_preempt: Callable[[], None] = None) -> Optional[discord.VoiceClient]:
+        """
+        Claim the voice connection in a channel's guild, connecting or moving to the channel as needed.
+        :param channel: Voice channel to play in
+        :param owner: Name of the cog making the claim
+        :param priority: Claims can only take over connections held at a lower priority
+        :param on_preempt: Called if a higher priority claim takes over the connection, before its audio is stopped.
+            Must stop the owner from playing anything else on the connection, without awaiting.
+        :return: The voice client, or None if the connection is held by something at an equal or higher priority.
+        """
+        guild = channel.guild
+        session = self._sessions.get(guild.id)
+
+        if session is not None and not session.idle and session.owner != owner:
+            if session.priority >= priority:
+                self.metrics["denied"] += 1
+                return None
+
+            self.metrics["preemptions"] += 1
+            log.info("{} preempted {}'s voice connection in {}".format(owner, session.owner, guild.id))
+            # Tell the old owner first, so stopping its audio doesn't make it queue up more on our connection
+            if session.on_preempt is not None:
+                session.on_preempt()
+            if guild.voice_client is not None and guild.voice_client.is_playing():
+                guild.voice_client.stop()
+
+        if session is not None and session.idle_task is not None:
+            session.idle_task.cancel()
+
+        voice_client = guild.voice_client
+        if voice_client is not None and voice_client.is_connected():
+            if voice_client.channel != channel:
+                await voice_client.move_to(channel)
+                self.metrics["moves"] += 1
+            else:
+                self.metrics["reuses"] += 1
+        else:
+            if voice_client is not None:
+                # Half-dead connection
+                await voice_client.disconnect(force=True)
+            started = time.perf_counter()
+            voice_client = await channel.connect()
+            self.metrics["connects"] += 1
+            self.metrics["connect_time_total"] += time.perf_counter() - started
+
+        self._sessions[guild.id] = VoiceSession(guild.id, owner, priority, on_preempt)
+        return voice_client
+
+    def release(self, guild: discord.Guild, owner: str, idle_timeout: float = IDLE_DISCONNECT_SECONDS) -> None:
+        """
+        Give up a claim on a guild's connection. The connection stays up for idle_timeout seconds in case it's
+        claimed again, then disconnects.
+        """
+        session = self._sessions.get(guild.id)
+        if session is None or session.owner != owner:
+            return
+
+        session.owner = None
+        session.priority = -1
+        session.on_preempt = None
+        session.idle_task = self.bot.loop.create_task(self._idle_disconnect(guild, idle_timeout))
+
+    def release_threadsafe(self, guild: discord.Guild, owner: str, idle_timeout: float = IDLE_DISCONNECT_SECONDS):
+        """release() for use from voice threads, such as in an after callback."""
+        self.bot.loop.call_soon_threadsafe(self.release, guild, owner, idle_timeout)
+
+    async def _idle_disconnect(self, guild: discord.Guild, idle_timeout: float) -> None:
+        await asyncio.sleep(idle_timeout)
+        session = self._sessions.get(guild.id)
+        if session is not None and session.idle:
+            self.metrics["idle_disconnects"] += 1
+            await self.disconnect(guild)
+
+    async def disconnect(self, guild: discord.Guild, owner: str = None, force: bool = False) -> None:
+        """
+        Disconnect from voice in a guild right away.
+        If owner is given, only disconnect if that cog holds the connection (or nobody does).
+        """
+        session = self._sessions.get(guild.id)
+        if owner is not None and session is not None and not session.idle and session.owner != owner:
+            return
+
+        self._drop_session(guild.id)
+        if guild.voice_client is not None:
+            await guild.voice_client.disconnect(force=force)
+
+    def _drop_session(self, guild_id: int) -> None:
+        session = self._sessions.pop(guild_id, None)
+        if session is not None and session.idle_task is not None:
+            session.idle_task.cancel()
+
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState,
+                                    after: discord.VoiceState) -> None:
+        # Forget about connections that were closed out from under us
+        if member.id == self.bot.user.id and after.channel is None:
+            session = self._sessions.get(member.guild.id)
+            if session is not None and session.on_preempt is not None:
+                session.on_preempt()
+            self._drop_session(member.guild.id)
+
+    def stats(self) -> dict:
+        stats = dict(self.metrics)
+        stats["active"] = sum(1 for s in self._sessions.values() if not s.idle)
+        stats["idle"] = sum(1 for s in self._sessions.values() if s.idle)
+        stats["avg_connect_time"] = stats["connect_time_total"] / stats["connects"] if stats["connects"] else 0.0
+        return stats
+
+    def describe(self) -> str:
+        lines = []
+        for guild_id, session in self._sessions.items():
+            guild = self.bot.get_guild(guild_id)
+            channel = guild.voice_client.channel if guild and guild.voice_client else None
+            lines.append("{}: {} in {}".format(
+                guild.name if guild else guild_id, session.owner or "(idle)", channel.name if channel else "nowhere"
+            ))
+        return "\n".join(lines)
+
+
+def get_voice_manager(bot) -> VoiceSessionManager:
+    """Get the voice manager shared by every audio cog, creating it on first use."""
+    manager = getattr(bot, "voice_sessions", None)
+    if manager is None:
+        manager = bot.voice_sessions = VoiceSessionManager(bot)
+    return manager
@@ -0,0 +1,143 @@
+"""
+Shared in-memory tail of each guild's audit log.
+
+Ban, unban and kick handlers used to each sleep and then page the audit log themselves, so a mass leave cost one
+REST call per member. Instead, recent entries are kept per guild in a ring buffer indexed by (action, target id).
+Lookups are answered from memory; on a miss, the lookup waits on a refresh that's shared by every lookup for that
+guild, so a burst of events costs one audit log request rather than one each.
+
+Entries also arrive through the gateway's audit log event on discord.py versions that dispatch it.
+"""
+
+import asyncio
+import logging
+
+from collections import deque
+from time import monotonic, time
+from typing import Deque, Dict, Optional, Tuple
+
+import discord
+from discord.ext.commands import Bot
+
+log = logging.getLogger()
+
+RING_SIZE = 200  # Entries kept per guild
+POLL_LIMIT = 50  # Entries requested per refresh
+POLL_COALESCE_DELAY = 0.5  # Wait this long before refreshing so entries for a burst of events can land together
+MIN_POLL_INTERVAL = 1.0
+LOOKUP_POLLS = 2  # Refreshes a lookup will wait through before giving up
+ENTRY_MAX_AGE = 120  # Seconds; older entries aren't attributed to new events
+
+
+def entry_age(entry: discord.AuditLogEntry) -> float:
+    return time() - ((entry.id >> 22) + discord.utils.DISCORD_EPOCH) / 1000
+
+
+class GuildAuditLog:
+    __slots__ = ("entries", "index", "last_id", "last_poll", "poll")
+
+    def __init__(self) -> None:
+        self.entries = deque(maxlen=RING_SIZE)  # type: Deque[discord.AuditLogEntry]
+        self.index = {}  # type: Dict[Tuple[discord.AuditLogAction, int], discord.AuditLogEntry]
+        self.last_id = 0
+        self.last_poll = 0.0
+        self.poll = None  # type: Optional[asyncio.Task]
+
+    def add(self, entry: discord.AuditLogEntry) -> None:
+        if len(self.entries) == self.entries.maxlen:
+            oldest = self.entries[0]
+            key = (oldest.action, getattr(oldest.target, "id", None))
+            if self.index.get(key) is oldest:
+                del self.index[key]
+
+        self.entries.append(entry)
+        self.index[(entry.action, getattr(entry.target, "id", None))] = entry
+        self.last_id = max(self.last_id, entry.id)
+
+
+class AuditLogTail:
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.guilds = {}  # type: Dict[int, GuildAuditLog]
+        self.stats = {"hits": 0, "misses": 0, "polls": 0}
+
+        self.bot.add_listener(self.on_audit_log_entry_create)
+
+    def _guild_log(self, guild_id: int) -> GuildAuditLog:
+        guild_log = self.guilds.get(guild_id)
+        if guild_log is None:
+            guild_log = self.guilds[guild_id] = GuildAuditLog()
+        return guild_log
+
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry) -> None:
+        self._guild_log(entry.guild.id).add(entry)
+
+    async def _poll(self, guild: discord.Guild, guild_log: GuildAuditLog, delay: float) -> None:
+        await asyncio.sleep(delay)
+        new_entries = []
+        async for entry in guild.audit_logs(limit=POLL_LIMIT):
+            if entry.id <= guild_log.last_id:
+                break
+            new_entries.append(entry)
+
+        # Oldest first, so the index ends up pointing at the latest entry for each key
+        for entry in reversed(new_entries):
+            guild_log.add(entry)
+        guild_log.last_poll = monotonic()
+        self.stats["polls"] += 1
+
+    async def refresh(self, guild: discord.Guild) -> None:
+        """
+        Pull new entries for the guild, joining a refresh already underway if there is one.
+        Raises discord.Forbidden without audit log permissions.
+        """
+        guild_log = self._guild_log(guild.id)
+        if guild_log.poll is None or guild_log.poll.done():
+            delay = max(POLL_COALESCE_DELAY, guild_log.last_poll + MIN_POLL_INTERVAL - monotonic())
+            guild_log.poll = self.bot.loop.create_task(self._poll(guild, guild_log, delay))
+        await asyncio.shield(guild_log.poll)
+
+    def lookup(self, guild_id: int, action: discord.AuditLogAction, target_id: int,
+               max_age: float = ENTRY_MAX_AGE) -> Optional[discord.AuditLogEntry]:
+        """Check memory only."""
+        guild_log = self.guilds.get(guild_id)
+        if guild_log is None:
+            return None
+        entry = guild_log.index.get((action, target_id))
+        if entry is not None and entry_age(entry) <= max_age:
+            return entry
+        return None
+
+    async def find(self, guild: discord.Guild, action: discord.AuditLogAction, target_id: int,
+                   max_age: float = ENTRY_MAX_AGE) -> Optional[discord.AuditLogEntry]:
+        """
+        Find the latest entry for an action on a target, refreshing if it hasn't been seen yet.
+        Raises discord.Forbidden without audit log permissions.
+        """
+        for _ in range(LOOKUP_POLLS):
+            entry = self.lookup(guild.id, action, target_id, max_age)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry
+            await self.refresh(guild)
+
+        entry = self.lookup(guild.id, action, target_id, max_age)
+        self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    async def find_responsible(self, guild: discord.Guild, action: discord.AuditLogAction,
+                               target_id: int) -> Tuple[Optional[discord.User], Optional[str]]:
+        """(mod responsible, reason) for the latest matching entry, or (None, None) if there isn't one."""
+        entry = await self.find(guild, action, target_id)
+        if entry is None:
+            return None, None
+        return entry.user, entry.reason
+
+
+def get_audit_log_tail(bot: Bot) -> AuditLogTail:
+    """Get the audit log tail shared between cogs, creating it on first use."""
+    tail = getattr(bot, "audit_log_tail", None)
+    if tail is None:
+        tail = bot.audit_log_tail = AuditLogTail(bot)
+    return tail
@@ -0,0 +1,142 @@
+"""
+Badge cases rendered as a single PNG.
+
+Large collections don't fit in an embed's 25 fields, and every emoji in one has to be resolved by the client. Instead,
+each badge's emoji is downloaded once, scaled to SPRITE_SIZE and kept in a SpriteAtlas alongside a greyed out copy
+for unattained badges. Rendering a case is then just pasting sprites into a grid, done in an executor.
+
+Renders are cached per user until invalidated, which happens whenever they're granted something.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import discord
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFont
+import PIL.ImageOps
+
+log = logging.getLogger()
+
+SPRITE_SIZE = 64
+COLUMNS = 6
+CELL_WIDTH = 104
+LABEL_HEIGHT = 14
+PADDING = 8
+MAX_LABEL_LENGTH = 16
+UNATTAINED_ALPHA = 0.45
+
+BACKGROUND = (47, 49, 54, 255)  # Discord's dark theme, so the image sits flush with the embed
+LABEL_COLOR = (220, 221, 222, 255)
+
+RENDER_CACHE_SIZE = 256
+
+# (label, emoji, attained)
+Tile = Tuple[str, Optional[discord.Emoji], bool]
+
+
+class SpriteAtlas:
+    """Decoded badge sprites, keyed by (emoji ID, attained)."""
+
+    def __init__(self) -> None:
+        self._sprites = {}  # type: Dict[Tuple[int, bool], PIL.Image.Image]
+
+    def __contains__(self, emoji_id: int) -> bool:
+        return (emoji_id, True) in self._sprites
+
+    def get(self, emoji_id: int, attained: bool = True) -> Optional[PIL.Image.Image]:
+        return self._sprites.get((emoji_id, attained))
+
+    @staticmethod
+    def _decode(raw: bytes) -> Tuple[PIL.Image.Image, PIL.Image.Image]:
+        sprite = PIL.Image.open(BytesIO(raw)).convert("RGBA")
+        sprite.thumbnail((SPRITE_SIZE, SPRITE_SIZE), PIL.Image.LANCZOS)
+
+        greyed = PIL.ImageOps.grayscale(sprite).convert("RGBA")
+        greyed.putalpha(sprite.getchannel("A").point(lambda a: int(a * UNATTAINED_ALPHA)))
+        return sprite, greyed
+
+    async def load(self, emojis: Iterable[discord.Emoji], loop: asyncio.AbstractEventLoop,
+                   executor: concurrent.futures.Executor) -> None:
+        """Fetch and decode any sprites that aren't in the atlas yet."""
+        missing = {emoji.id: emoji for emoji in emojis if emoji is not None and emoji.id not in self}
+        if not missing:
+            return
+
+        raw_sprites = await asyncio.gather(*(emoji.url.read() for emoji in missing.values()), return_exceptions=True)
+        for emoji, raw in zip(missing.values(), raw_sprites):
+            if isinstance(raw, Exception):
+                log.warning("Could not fetch sprite for emoji {}: {}".format(emoji.name, raw))
+                continue
+            sprite, greyed = await loop.run_in_executor(executor, self._decode, raw)
+            self._sprites[(emoji.id, True)] = sprite
+            self._sprites[(emoji.id, False)] = greyed
+
+
+class BadgeCaseRenderer:
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.atlas = SpriteAtlas()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self._font = PIL.ImageFont.load_default()
+        self._renders = OrderedDict()  # type: OrderedDict[int, Tuple[tuple, bytes]]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._renders.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._renders.clear()
+
+    def _label(self, label: str) -> str:
+        return label if len(label) <= MAX_LABEL_LENGTH else label[:MAX_LABEL_LENGTH - 2] + ".."
+
+    def _composite(self, tiles: List[Tile]) -> bytes:
+        rows = max(1, -(-len(tiles) // COLUMNS))
+        cell_height = SPRITE_SIZE + LABEL_HEIGHT + PADDING
+        case = PIL.Image.new("RGBA", (min(max(len(tiles), 1), COLUMNS) * CELL_WIDTH, rows * cell_height + PADDING),
+                             BACKGROUND)
+        draw = PIL.ImageDraw.Draw(case)
+
+        for i, (label, emoji, attained) in enumerate(tiles):
+            x = (i % COLUMNS) * CELL_WIDTH
+            y = (i // COLUMNS) * cell_height + PADDING
+
+            sprite = self.atlas.get(emoji.id, attained) if emoji is not None else None
+            if sprite is not None:
+                case.paste(sprite, (x + (CELL_WIDTH - sprite.width) // 2, y + (SPRITE_SIZE - sprite.height) // 2),
+                           sprite)
+
+            text = self._label(label)
+            text_width = self._font.getmask(text).size[0]
+            draw.text((x + (CELL_WIDTH - text_width) // 2, y + SPRITE_SIZE + 2), text, fill=LABEL_COLOR,
+                      font=self._font)
+
+        output = BytesIO()
+        case.save(output, "PNG")
+        return output.getvalue()
+
+    async def render(self, user_id: int, tiles: List[Tile]) -> BytesIO:
+        """Render a user's badge case, or return their cached render if nothing shown in it has changed."""
+        key = tuple((label, emoji.id if emoji is not None else None, attained) for label, emoji, attained in tiles)
+        cached = self._renders.get(user_id)
+        if cached is not None and cached[0] == key:
+            self._renders.move_to_end(user_id)
+            return BytesIO(cached[1])
+
+        await self.atlas.load((emoji for _, emoji, _ in tiles), self.loop, self._executor)
+        png = await self.loop.run_in_executor(self._executor, self._composite, tiles)
+
+        self._renders[user_id] = (key, png)
+        if len(self._renders) > RENDER_CACHE_SIZE:
+            self._renders.popitem(last=False)
+        return BytesIO(png)
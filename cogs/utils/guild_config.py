@@ -0,0 +1,166 @@
+"""
+Compiled per-guild modlog config.
+
+Guild configs are stored as string hashes in `config:mod:config:{guild_id}`:
+    priority_modlog, default_modlog
+        channel IDs, or missing/"None" if the guild doesn't have that modlog
+    verified_role, mods_role
+        optional role IDs; looked up by the names "Verified" and "Mods" if not set
+
+Every member update, message edit and delete in a tracked guild checks the config, so rather than parsing it on each
+event it's compiled into a ModlogConfig on load and whenever it changes: channels resolved to objects, roles resolved
+to IDs, and the events the guild logs folded into a bitmask. Checking or routing an event is then an attribute load
+and an AND.
+
+Run this module for a benchmark of a member update storm against the old checks.
+"""
+
+import logging
+
+from typing import Optional
+
+import discord
+from discord.ext.commands import Bot
+
+log = logging.getLogger()
+
+# Events that go to the priority modlog; everything else goes to the default one
+PRIORITY_EVENTS = ("ban", "unban", "kick")
+DEFAULT_EVENTS = ("join", "leave", "delete", "modlog_delete", "edit", "name_change", "nickname_change", "verified",
+                  "mention_mods", "mod_action")
+
+EVENT_FLAGS = {event: 1 << i for i, event in enumerate(PRIORITY_EVENTS + DEFAULT_EVENTS)}
+PRIORITY_MASK = sum(EVENT_FLAGS[event] for event in PRIORITY_EVENTS)
+DEFAULT_MASK = sum(EVENT_FLAGS[event] for event in DEFAULT_EVENTS)
+
+MEMBER_UPDATE_MASK = EVENT_FLAGS["name_change"] | EVENT_FLAGS["nickname_change"] | EVENT_FLAGS["verified"]
+
+
+def parse_id(value) -> Optional[int]:
+    """Config values come back as strings, with None stored as "None" by older clients."""
+    if value is None or value in ("", "None"):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ModlogConfig:
+    __slots__ = ("guild_id", "default_modlog_id", "priority_modlog_id", "default_modlog", "priority_modlog",
+                 "verified_role_id", "mods_role_id", "events")
+
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+        self.default_modlog_id = None  # type: Optional[int]
+        self.priority_modlog_id = None  # type: Optional[int]
+        self.default_modlog = None  # type: Optional[discord.TextChannel]
+        self.priority_modlog = None  # type: Optional[discord.TextChannel]
+        self.verified_role_id = None  # type: Optional[int]
+        self.mods_role_id = None  # type: Optional[int]
+        self.events = 0
+
+    @classmethod
+    def compile(cls, bot: Bot, guild_id: int, raw: dict) -> 'ModlogConfig':
+        compiled = cls(guild_id)
+        compiled.default_modlog_id = parse_id(raw.get("default_modlog"))
+        compiled.priority_modlog_id = parse_id(raw.get("priority_modlog"))
+
+        # Channels and roles aren't cached until the bot's ready, in which case they're resolved on a recompile
+        if compiled.default_modlog_id is not None:
+            compiled.default_modlog = bot.get_channel(compiled.default_modlog_id)
+            compiled.events |= DEFAULT_MASK
+        if compiled.priority_modlog_id is not None:
+            compiled.priority_modlog = bot.get_channel(compiled.priority_modlog_id)
+            compiled.events |= PRIORITY_MASK
+
+        guild = bot.get_guild(guild_id)
+        compiled.verified_role_id = parse_id(raw.get("verified_role")) or cls._role_id(guild, "Verified")
+        compiled.mods_role_id = parse_id(raw.get("mods_role")) or cls._role_id(guild, "Mods")
+        if compiled.verified_role_id is None:
+            compiled.events &= ~EVENT_FLAGS["verified"]
+        if compiled.mods_role_id is None:
+            compiled.events &= ~EVENT_FLAGS["mention_mods"]
+        return compiled
+
+    @staticmethod
+    def _role_id(guild: Optional[discord.Guild], name: str) -> Optional[int]:
+        role = discord.utils.get(guild.roles, name=name) if guild is not None else None
+        return role.id if role is not None else None
+
+    @property
+    def resolved(self) -> bool:
+        return ((self.default_modlog_id is None or self.default_modlog is not None) and
+                (self.priority_modlog_id is None or self.priority_modlog is not None))
+
+    def tracks(self, event: str) -> bool:
+        return bool(self.events & EVENT_FLAGS[event])
+
+    def channel(self, priority: bool = False) -> Optional[discord.TextChannel]:
+        return self.priority_modlog if priority else self.default_modlog
+
+    def is_modlog(self, channel_id: int) -> bool:
+        return channel_id == self.default_modlog_id or channel_id == self.priority_modlog_id
+
+
+if __name__ == "__main__":
+    # Simulated member update storm: a role sync touching every member of a large guild, checked the old way
+    # (string config lookups and role scans) and through the compiled config.
+    import random
+    from timeit import timeit
+    from types import SimpleNamespace
+
+    GUILD_ID = 111504456838819840
+    ROLE_COUNT = 150
+    UPDATES = 50000
+
+    roles = [SimpleNamespace(id=GUILD_ID + i, name="role {}".format(i)) for i in range(ROLE_COUNT)]
+    roles[-1].name = "Verified"
+    raw_config = {"priority_modlog": str(GUILD_ID + 1000), "default_modlog": str(GUILD_ID + 1001)}
+    config_cache = {GUILD_ID: raw_config}
+    guild = SimpleNamespace(id=GUILD_ID, roles=roles)
+    bot = SimpleNamespace(get_channel=lambda channel_id: SimpleNamespace(id=channel_id),
+                          get_guild=lambda guild_id: guild)
+    compiled_cache = {GUILD_ID: ModlogConfig.compile(bot, GUILD_ID, raw_config)}
+
+    def member(member_roles):
+        return SimpleNamespace(guild=guild, name="member", nick=None, roles=member_roles,
+                               _roles=discord.utils.SnowflakeList(role.id for role in member_roles))
+
+    updates = []
+    for _ in range(UPDATES):
+        member_roles = random.sample(roles[:-1], 20)
+        before = member(member_roles)
+        after = member(member_roles + [roles[-1]] if random.random() < 0.01 else member_roles[1:])
+        updates.append((before, after))
+
+    def legacy():
+        verified = 0
+        for before, after in updates:
+            if before.guild.id not in config_cache.keys() or config_cache[before.guild.id].get("default_modlog") is None:
+                continue
+            if before.roles != after.roles:
+                if discord.utils.get(before.roles, name="Verified") is None and \
+                        discord.utils.get(after.roles, name="Verified") is not None:
+                    bot.get_channel(int(config_cache[before.guild.id]["default_modlog"]))
+                    verified += 1
+        return verified
+
+    def compiled():
+        verified = 0
+        for before, after in updates:
+            config = compiled_cache.get(before.guild.id)
+            if config is None or not config.events & MEMBER_UPDATE_MASK:
+                continue
+            if before._roles != after._roles and config.events & EVENT_FLAGS["verified"]:
+                role_id = config.verified_role_id
+                if not before._roles.has(role_id) and after._roles.has(role_id):
+                    config.channel()
+                    verified += 1
+        return verified
+
+    assert legacy() == compiled()
+    for name, func in (("legacy", legacy), ("compiled", compiled)):
+        seconds = timeit(func, number=5) / 5
+        print("{:>8}: {:.1f}ms per {} updates, {:.2f}us each".format(
+            name, seconds * 1000, UPDATES, seconds / UPDATES * 1e6))
@@ -0,0 +1,206 @@
+"""
+Latency instrumentation for commands, event listeners and the event loop.
+
+Every command invocation and every listener call (cog listeners and the bot's own events) is timed into a histogram
+with fixed buckets, alongside its call and error counts and the number of redis round trips it made. A probe task
+measures how late the event loop wakes it up, which is how long something else held the loop.
+
+Results can be read with `!perf` or scraped in Prometheus text format from http://127.0.0.1:<port>/metrics, where the
+port comes from `config:metrics:port` (METRICS_DEFAULT_PORT if unset).
+
+Redis round trips are counted by RedisConfig and attributed through the `command_round_trips` context variable, which
+is set here for the duration of each command or listener. Each of those runs in its own task, so the count can't leak
+between them.
+"""
+
+import asyncio
+import logging
+
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+from discord.ext.commands import Bot, Context
+
+from .redis_config import command_round_trips, redis_round_trips
+
+log = logging.getLogger()
+
+# Upper bounds, in seconds. Anything slower lands in the implicit +Inf bucket.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LOOP_PROBE_INTERVAL = 0.5
+
+METRICS_HOST = "127.0.0.1"
+METRICS_DEFAULT_PORT = 9310
+
+
+class LatencyHistogram:
+    __slots__ = ("buckets", "count", "total", "errors", "max", "redis_calls")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.max = 0.0
+        self.redis_calls = 0
+
+    def observe(self, secs: float, error: bool = False, redis_calls: int = 0) -> None:
+        self.buckets[bisect_left(LATENCY_BUCKETS, secs)] += 1
+        self.count += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+        self.redis_calls += redis_calls
+        if error:
+            self.errors += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Metrics:
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.commands = {}  # type: Dict[str, LatencyHistogram]
+        self.listeners = {}  # type: Dict[str, LatencyHistogram]
+        self.loop_lag = LatencyHistogram()
+        self.started = perf_counter()
+
+        self._probe_task = None  # type: Optional[asyncio.Task]
+        self._runner = None  # type: Optional[web.AppRunner]
+
+    # Commands
+
+    async def before_invoke(self, ctx: Context) -> None:
+        ctx.metrics_start = perf_counter()
+        ctx.metrics_round_trips = [0]
+        ctx.metrics_token = command_round_trips.set(ctx.metrics_round_trips)
+
+    async def after_invoke(self, ctx: Context) -> None:
+        start = getattr(ctx, "metrics_start", None)
+        if start is None:
+            return
+        hist = self.commands.setdefault(ctx.command.qualified_name, LatencyHistogram())
+        hist.observe(perf_counter() - start, ctx.command_failed, ctx.metrics_round_trips[0])
+        # Hand counting back to the listener that invoked the command
+        command_round_trips.reset(ctx.metrics_token)
+
+    # Listeners
+
+    @staticmethod
+    def listener_name(coro, event_name: str) -> str:
+        owner = getattr(coro, "__self__", None)
+        if owner is None:
+            return "bot.{}".format(event_name)
+        return "{}.{}".format(type(owner).__name__, event_name)
+
+    def instrument_listener(self, coro, event_name: str):
+        """Wrap a listener so its calls are timed. Exceptions are recorded and re-raised for the bot's on_error."""
+        hist = self.listeners.setdefault(self.listener_name(coro, event_name), LatencyHistogram())
+
+        async def timed(*args, **kwargs):
+            round_trips = [0]
+            command_round_trips.set(round_trips)
+            t = perf_counter()
+            error = False
+            try:
+                return await coro(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                hist.observe(perf_counter() - t, error, round_trips[0])
+
+        return timed
+
+    # Event loop lag
+
+    async def probe_loop_lag(self) -> None:
+        while True:
+            t = perf_counter()
+            await asyncio.sleep(LOOP_PROBE_INTERVAL)
+            self.loop_lag.observe(max(0.0, perf_counter() - t - LOOP_PROBE_INTERVAL))
+
+    # Export
+
+    def top(self, table: Dict[str, LatencyHistogram], n: int = 10) -> List[Tuple[str, LatencyHistogram]]:
+        """The n entries that have spent the most total time on the loop."""
+        return sorted(table.items(), key=lambda item: item[1].total, reverse=True)[:n]
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def histogram(metric: str, table: Dict[str, LatencyHistogram], label: str) -> None:
+            lines.append("# TYPE {} histogram".format(metric))
+            for name, hist in sorted(table.items()):
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, hist.buckets):
+                    cumulative += n
+                    lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(metric, label, name, bound, cumulative))
+                lines.append('{}_bucket{{{}="{}",le="+Inf"}} {}'.format(metric, label, name, hist.count))
+                lines.append('{}_sum{{{}="{}"}} {:.6f}'.format(metric, label, name, hist.total))
+                lines.append('{}_count{{{}="{}"}} {}'.format(metric, label, name, hist.count))
+
+        def counter(metric: str, table: Dict[str, LatencyHistogram], label: str, attr: str) -> None:
+            lines.append("# TYPE {} counter".format(metric))
+            for name, hist in sorted(table.items()):
+                lines.append('{}{{{}="{}"}} {}'.format(metric, label, name, getattr(hist, attr)))
+
+        histogram("porygon_command_seconds", self.commands, "command")
+        counter("porygon_command_errors_total", self.commands, "command", "errors")
+        counter("porygon_command_redis_calls_total", self.commands, "command", "redis_calls")
+
+        histogram("porygon_listener_seconds", self.listeners, "listener")
+        counter("porygon_listener_errors_total", self.listeners, "listener", "errors")
+        counter("porygon_listener_redis_calls_total", self.listeners, "listener", "redis_calls")
+
+        histogram("porygon_loop_lag_seconds", {"main": self.loop_lag}, "loop")
+
+        lines.append("# TYPE porygon_redis_calls_total counter")
+        lines.append("porygon_redis_calls_total {}".format(redis_round_trips()))
+        return "\n".join(lines) + "\n"
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render_prometheus(), content_type="text/plain")
+
+    async def start_exporter(self, port: int) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, METRICS_HOST, port).start()
+        log.info("Serving metrics on {}:{}.".format(METRICS_HOST, port))
+
+    def start(self) -> None:
+        self.bot.before_invoke(self.before_invoke)
+        self.bot.after_invoke(self.after_invoke)
+        self._probe_task = self.bot.loop.create_task(self.probe_loop_lag())
+
+        port = int(self.bot.config.get("config:metrics:port") or METRICS_DEFAULT_PORT)
+        self.bot.loop.create_task(self.start_exporter(port))
+
+
+def get_metrics(bot: Bot) -> Metrics:
+    """Get the bot's metrics, creating and starting them on first use."""
+    metrics = getattr(bot, "metrics", None)
+    if metrics is None:
+        metrics = Metrics(bot)
+        metrics.start()
+        bot.metrics = metrics
+    return metrics
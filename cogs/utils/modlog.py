@@ -0,0 +1,269 @@
+"""
+Batched delivery of modlog embeds.
+
+Events are queued per destination channel and sent by one worker per channel, which packs up to
+MAX_EMBEDS_PER_MESSAGE embeds into a single message. Default events wait up to COALESCE_WINDOW for more to arrive
+before sending, so a raid or a mass delete costs a handful of messages instead of one per event. Each channel has a
+priority lane that's always drained first and never waits on the window, so priority modlog events aren't held up
+behind default ones.
+
+Lanes are bounded at MAX_QUEUE_DEPTH; past that, the oldest queued events are dropped and counted.
+
+Mod case numbers are handed out per guild by CaseNumbers, and ModlogIndex records where each entry was sent so it
+can be found again without scanning channel history:
+    guild:{guild_id}:modlog:case
+        counter, bumped with INCRBY
+    guild:{guild_id}:modlog:cases
+        hash of case number -> "{channel_id}:{message_id}" of the modlog message it was sent in
+    guild:{guild_id}:modlog:last
+        hash of modlog channel ID -> "{channel_id}:{message_id}" of the latest message sent there
+    guild:{guild_id}:modlog:user:{user_id}
+        sorted set of "{channel_id}:{message_id}:{event}" for entries about the user, scored by message ID
+"""
+
+import asyncio
+import logging
+
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+import discord
+from discord.ext.commands import Bot
+from discord.http import Route
+
+log = logging.getLogger()
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_EMBED_CHARS = 6000  # Discord's cap on the combined size of every embed in a message
+COALESCE_WINDOW = 1.5
+MAX_QUEUE_DEPTH = 500
+
+LEGACY_CASE_KEY = "admin:mod_case"  # The old counter, shared by every guild
+MAX_USER_ENTRIES = 200  # Entries kept per user in the index
+
+
+class ModlogEvent:
+    __slots__ = ("embed", "file", "future")
+
+    def __init__(self, embed: discord.Embed, file: Optional[discord.File], future: asyncio.Future) -> None:
+        self.embed = embed
+        self.file = file
+        self.future = future  # Resolves to the ID of the message the embed went out in, or None if it didn't
+
+
+class ChannelQueue:
+    __slots__ = ("channel", "priority", "default", "wakeup", "task")
+
+    def __init__(self, channel: discord.TextChannel) -> None:
+        self.channel = channel
+        self.priority = deque()  # type: Deque[ModlogEvent]
+        self.default = deque()  # type: Deque[ModlogEvent]
+        self.wakeup = asyncio.Event()
+        self.task = None  # type: Optional[asyncio.Task]
+
+    def __len__(self) -> int:
+        return len(self.priority) + len(self.default)
+
+
+class ModlogDispatcher:
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.queues = {}  # type: Dict[int, ChannelQueue]
+        self.stats = {"queued": 0, "messages": 0, "embeds": 0, "dropped": 0, "failed": 0}
+
+    def submit(self, channel: discord.TextChannel, embed: discord.Embed, priority: bool = False,
+               file: Optional[discord.File] = None) -> asyncio.Future:
+        """Queue an embed for a modlog channel. The returned future resolves to the ID of the message it's sent in."""
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = ChannelQueue(channel)
+            queue.task = self.bot.loop.create_task(self._run(queue))
+
+        event = ModlogEvent(embed, file, self.bot.loop.create_future())
+        lane = queue.priority if priority else queue.default
+        if len(lane) >= MAX_QUEUE_DEPTH:
+            dropped = lane.popleft()
+            if not dropped.future.done():
+                dropped.future.set_result(None)
+            self.stats["dropped"] += 1
+            log.warning("Modlog queue for #{} is full, dropped an event.".format(channel))
+
+        lane.append(event)
+        self.stats["queued"] += 1
+        queue.wakeup.set()
+        return event.future
+
+    def close(self) -> None:
+        for queue in self.queues.values():
+            queue.task.cancel()
+            for event in (*queue.priority, *queue.default):
+                if not event.future.done():
+                    event.future.set_result(None)
+        self.queues = {}
+
+    def depths(self) -> Dict[int, int]:
+        return {channel_id: len(queue) for channel_id, queue in self.queues.items()}
+
+    @staticmethod
+    def _take_batch(queue: ChannelQueue) -> List[ModlogEvent]:
+        """Pop as many events as fit in one message, priority lane first. Events with files go out on their own."""
+        batch = []
+        size = 0
+        for lane in (queue.priority, queue.default):
+            while lane and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                event = lane[0]
+                if event.file is not None:
+                    if not batch:
+                        batch.append(lane.popleft())
+                    return batch
+                if batch and size + len(event.embed) > MAX_MESSAGE_EMBED_CHARS:
+                    return batch
+                batch.append(lane.popleft())
+                size += len(event.embed)
+        return batch
+
+    async def _send(self, channel: discord.TextChannel, batch: List[ModlogEvent]) -> Optional[int]:
+        if len(batch) == 1:
+            message = await channel.send(embed=batch[0].embed, file=batch[0].file)
+            return message.id
+
+        # Messageable.send only takes a single embed, so go through the route directly
+        route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel.id)
+        data = await self.bot.http.request(route, json={"embeds": [event.embed.to_dict() for event in batch]})
+        return int(data["id"])
+
+    async def _run(self, queue: ChannelQueue) -> None:
+        while True:
+            await queue.wakeup.wait()
+            if not queue.priority and len(queue.default) < MAX_EMBEDS_PER_MESSAGE:
+                # Give the default lane a moment to fill up, unless something more important turns up
+                try:
+                    await asyncio.wait_for(self._priority_arrival(queue), COALESCE_WINDOW)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._take_batch(queue)
+            if len(queue):
+                queue.wakeup.set()  # The window may have cleared it with events still waiting
+            else:
+                queue.wakeup.clear()
+            if not batch:
+                continue
+
+            try:
+                message_id = await self._send(queue.channel, batch)
+            except Exception:
+                # Silently swallow the error, the worker has to keep going
+                self.stats["failed"] += len(batch)
+                message_id = None
+                log.exception("Exception occurred when sending {} modlog embeds to #{}.".format(
+                    len(batch), queue.channel))
+            else:
+                self.stats["messages"] += 1
+                self.stats["embeds"] += len(batch)
+
+            for event in batch:
+                # The caller may have cancelled the future while the embed was waiting
+                if not event.future.done():
+                    event.future.set_result(message_id)
+
+    @staticmethod
+    async def _priority_arrival(queue: ChannelQueue) -> None:
+        while not queue.priority and len(queue.default) < MAX_EMBEDS_PER_MESSAGE:
+            queue.wakeup.clear()
+            await queue.wakeup.wait()
+
+
+async def edit_embeds(bot: Bot, message: discord.Message, embeds: List[discord.Embed]) -> None:
+    """Replace every embed on a message. Message.edit only takes one, which would drop the rest of a batch."""
+    if len(embeds) == 1:
+        await message.edit(embed=embeds[0])
+        return
+    route = Route("PATCH", "/channels/{channel_id}/messages/{message_id}",
+                  channel_id=message.channel.id, message_id=message.id)
+    await bot.http.request(route, json={"embeds": [embed.to_dict() for embed in embeds]})
+
+
+class CaseNumbers:
+    """
+    Per-guild mod case numbers, from an atomic INCRBY so concurrent events can't be given the same number.
+
+    With a lease size over 1, a block of numbers is reserved per round trip and handed out locally. Numbers left in a
+    block when the bot stops are skipped.
+    """
+
+    def __init__(self, config, lease_size: int = 1) -> None:
+        self.config = config
+        self.lease_size = max(1, lease_size)
+        self._leases = {}  # type: Dict[int, List[int]]  # guild ID -> [next number, last number in the block]
+        self._seeded = set()  # type: Set[int]
+
+    def _seed(self, guild_id: int) -> None:
+        """Start a guild's counter from the old global one, so existing case numbers aren't handed out again."""
+        if guild_id not in self._seeded:
+            self.config.setnx("guild:{}:modlog:case".format(guild_id), self.config.get(LEGACY_CASE_KEY) or 0)
+            self._seeded.add(guild_id)
+
+    def next(self, guild_id: int) -> int:
+        lease = self._leases.get(guild_id)
+        if lease is None or lease[0] > lease[1]:
+            self._seed(guild_id)
+            last = self.config.incrby("guild:{}:modlog:case".format(guild_id), self.lease_size)
+            lease = self._leases[guild_id] = [last - self.lease_size + 1, last]
+
+        case_id = lease[0]
+        lease[0] += 1
+        return case_id
+
+
+class ModlogEntry:
+    __slots__ = ("channel_id", "message_id", "event")
+
+    def __init__(self, channel_id: int, message_id: int, event: Optional[str] = None) -> None:
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.event = event
+
+    @classmethod
+    def parse(cls, value: str) -> 'ModlogEntry':
+        channel_id, message_id, *event = value.split(":", 2)
+        return cls(int(channel_id), int(message_id), event[0] if event else None)
+
+    def jump_url(self, guild_id: int) -> str:
+        return "https://discord.com/channels/{}/{}/{}".format(guild_id, self.channel_id, self.message_id)
+
+
+class ModlogIndex:
+    """Where modlog entries were sent, by case number, by user and by channel. Written once per sent entry."""
+
+    def __init__(self, config) -> None:
+        self.config = config
+
+    def record(self, guild_id: int, channel_id: int, message_id: int, event: Optional[str] = None,
+               user_id: Optional[int] = None, case_id: Optional[int] = None) -> None:
+        location = "{}:{}".format(channel_id, message_id)
+        pipe = self.config.pipeline(transaction=False)
+        pipe.hset("guild:{}:modlog:last".format(guild_id), channel_id, location)
+        if case_id is not None:
+            pipe.hset("guild:{}:modlog:cases".format(guild_id), case_id, location)
+        if user_id is not None:
+            key = "guild:{}:modlog:user:{}".format(guild_id, user_id)
+            pipe.zadd(key, {"{}:{}".format(location, event or "other"): message_id})
+            pipe.zremrangebyrank(key, 0, -MAX_USER_ENTRIES - 1)
+        pipe.execute()
+
+    def _get(self, key: str, field) -> Optional[ModlogEntry]:
+        location = self.config.hget(key, field)
+        return ModlogEntry.parse(location) if location is not None else None
+
+    def case(self, guild_id: int, case_id) -> Optional[ModlogEntry]:
+        return self._get("guild:{}:modlog:cases".format(guild_id), case_id)
+
+    def last(self, guild_id: int, channel_id: int) -> Optional[ModlogEntry]:
+        return self._get("guild:{}:modlog:last".format(guild_id), channel_id)
+
+    def for_user(self, guild_id: int, user_id: int, limit: int = 10) -> List[ModlogEntry]:
+        """The user's latest entries, newest first."""
+        values = self.config.zrevrange("guild:{}:modlog:user:{}".format(guild_id, user_id), 0, limit - 1)
+        return [ModlogEntry.parse(value) for value in values]
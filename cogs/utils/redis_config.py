@@ -4,8 +4,41 @@ import redis
 import json
 import logging
 
+from contextvars import ContextVar
+from typing import List, Optional
+
+from redis.client import Pipeline
+
 log = logging.getLogger()
 
+# Set by the metrics layer (utils/metrics.py) to a one-element counter while a command or listener runs, so round
+# trips can be attributed to it
+command_round_trips = ContextVar("command_round_trips", default=None)  # type: ContextVar[Optional[List[int]]]
+
+_total_round_trips = 0
+
+
+def redis_round_trips() -> int:
+    """Total round trips made through any RedisConfig since startup."""
+    return _total_round_trips
+
+
+def _count_round_trip() -> None:
+    global _total_round_trips
+    _total_round_trips += 1
+    counter = command_round_trips.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class CountingPipeline(Pipeline):
+    """A pipeline that counts as one round trip per execute."""
+
+    def execute(self, raise_on_error=True):
+        if self.command_stack:
+            _count_round_trip()
+        return super().execute(raise_on_error)
+
 
 class RedisConfig(redis.StrictRedis):
 
@@ -21,6 +54,13 @@ class RedisConfig(redis.StrictRedis):
 
         super().__init__(**_config)
 
+    def execute_command(self, *args, **options):
+        _count_round_trip()
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
     def parse_response(self, connection, command_name, **options):
         """"Parses a response from the Redis server"""
         response = connection.read_response()
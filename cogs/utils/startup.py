@@ -0,0 +1,137 @@
+"""
+Startup profiling and deferred imports.
+
+StartupProfiler loads the bot's extensions in order and records how long each one's load_extension took. That covers
+both executing the module and its setup (mostly the cog's __init__); discord.py executes extension modules itself
+rather than going through sys.modules, so the two can't be timed apart without running the module twice.
+
+Heavy dependencies that are only needed by a few commands can be pulled in with `lazy_import`, which returns a module
+stand-in that does the real import the first time an attribute is used. Those imports are timed as well, so the
+report shows what was moved off the startup path and what it costs on first use.
+"""
+
+import importlib
+import logging
+import sys
+import threading
+import types
+
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from discord.ext.commands import Bot
+
+log = logging.getLogger()
+
+PROCESS_START = perf_counter()  # Close enough, since main_3 imports this before doing anything slow
+
+# Module name -> seconds taken, filled in as lazy modules are first used
+deferred_imports = {}  # type: Dict[str, float]
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on first attribute access."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    t = perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    deferred_imports[self.__name__] = perf_counter() - t
+                    log.info("Deferred import of {} took {:.02f}s.".format(self.__name__, deferred_imports[self.__name__]))
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, item: str):
+        return getattr(self._load(), item)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Import a module the first time it's used rather than now. Already imported modules are returned as-is."""
+    try:
+        return sys.modules[name]
+    except KeyError:
+        return LazyModule(name)
+
+
+class ExtensionTiming:
+    __slots__ = ("name", "load_s", "error")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.load_s = 0.0
+        self.error = None  # type: Optional[str]
+
+
+class StartupProfiler:
+
+    def __init__(self, started_at: float = PROCESS_START) -> None:
+        self.started_at = started_at
+        self.extensions = {}  # type: Dict[str, ExtensionTiming]
+        self.load_s = None  # type: Optional[float]
+        self.ready_at = None  # type: Optional[float]
+
+    @property
+    def time_to_ready(self) -> Optional[float]:
+        return self.ready_at - self.started_at if self.ready_at is not None else None
+
+    def mark_ready(self) -> None:
+        """Record the first on_ready. Reconnects fire it again, so later calls are ignored."""
+        if self.ready_at is None:
+            self.ready_at = perf_counter()
+            log.info("Ready {:.02f}s after startup.".format(self.time_to_ready))
+
+    def load_extensions(self, bot: Bot, names: List[str]) -> None:
+        t_start = perf_counter()
+
+        for name in names:
+            timing = self.extensions[name] = ExtensionTiming(name)
+            t = perf_counter()
+            try:
+                bot.load_extension(name)
+            except Exception as e:
+                timing.error = "{}: {}".format(type(e).__name__, e)
+                log.warning('Failed to load extension {}\n{}: {}'.format(name, type(e).__name__, e))
+                log.exception("Traceback:")
+                print('Failed to load extension {}\n{}: {}'.format(name, type(e).__name__, e))
+            else:
+                timing.load_s = perf_counter() - t
+                log.info("Loaded {} in {:.02f}s.".format(name, timing.load_s))
+
+        self.load_s = perf_counter() - t_start
+        log.info("Loaded {} extensions in {:.02f}s.".format(len(names), self.load_s))
+
+    def format_report(self, limit: int = 10) -> str:
+        """Plain text summary, slowest extensions first."""
+        lines = ["{:<24} {:>8}".format("extension", "load")]
+        by_cost = sorted(self.extensions.values(), key=lambda timing: timing.load_s, reverse=True)
+        for timing in by_cost[:limit]:
+            lines.append("{:<24} {:>7.2f}s".format(timing.name.replace("cogs.", ""), timing.load_s))
+
+        failed = [timing for timing in self.extensions.values() if timing.error]
+        if failed:
+            lines.append("")
+            lines.extend("FAILED {}: {}".format(timing.name, timing.error) for timing in failed)
+
+        if deferred_imports:
+            lines.append("")
+            lines.append("Deferred imports (paid on first use):")
+            lines.extend("  {:<22} {:>7.2f}s".format(name, secs) for name, secs in sorted(deferred_imports.items()))
+
+        lines.append("")
+        if self.load_s is not None:
+            lines.append("Extensions loaded in {:.02f}s".format(self.load_s))
+        if self.time_to_ready is not None:
+            lines.append("Time to ready: {:.02f}s".format(self.time_to_ready))
+        return "\n".join(lines)
@@ -0,0 +1,290 @@
+"""
+Keyword triggers shared between cogs.
+
+Rather than every cog running its own substring and regex checks on every message, cogs register their keywords
+with the TriggerEngine along with a handler. Keywords are literals, optionally whole-word (whitespace delimited) and
+optionally case-insensitive, scoped to guilds and/or channels.
+
+For each guild, the keywords that could apply there are compiled into one regex per case mode, factored into a trie
+so the regex engine walks it rather than trying each keyword in turn. The trie sits inside a lookahead, so matches
+don't consume the message: every position reports the longest keyword starting there, and any keywords that are
+prefixes of it are picked out afterwards. That finds every occurrence of every keyword, overlapping or not, in a single
+pass no matter how many keywords are registered. Compiled scopes are cached and rebuilt after any registration
+changes. Handlers are only called for messages with a hit, with the tags of every trigger of theirs that matched, in
+the order they appeared in the message.
+
+Run this module for a benchmark against the per-cog checks it replaced.
+"""
+
+import logging
+import re
+
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import discord
+from discord.ext.commands import Bot
+
+log = logging.getLogger()
+
+Handler = Callable[[discord.Message, List[str]], Awaitable[None]]
+
+
+def _id_set(ids: Optional[Iterable]) -> Optional[FrozenSet[int]]:
+    return frozenset(int(i) for i in ids) if ids is not None else None
+
+
+class Trigger:
+    __slots__ = ("keyword", "tag", "guilds", "channels", "exclude_channels", "whole_word", "ignore_case")
+
+    def __init__(self, keyword: str, tag: Optional[str] = None, guilds: Optional[Iterable] = None,
+                 channels: Optional[Iterable] = None, exclude_channels: Optional[Iterable] = None,
+                 whole_word: bool = False, ignore_case: bool = False) -> None:
+        """
+        :param keyword: Literal text to look for
+        :param tag: What the handler is given when this matches, the keyword by default
+        :param guilds: IDs of guilds to trigger in. With neither guilds nor channels, triggers everywhere.
+        :param channels: IDs of channels to trigger in, in addition to those guilds
+        :param exclude_channels: IDs of channels never to trigger in
+        :param whole_word: Only match the keyword when it's surrounded by whitespace or the ends of the message
+        """
+        self.keyword = keyword.lower() if ignore_case else keyword
+        self.tag = tag if tag is not None else keyword
+        self.guilds = _id_set(guilds)
+        self.channels = _id_set(channels)
+        self.exclude_channels = _id_set(exclude_channels) or frozenset()
+        self.whole_word = whole_word
+        self.ignore_case = ignore_case
+
+    def could_apply(self, guild_id: Optional[int]) -> bool:
+        """Whether the trigger needs compiling into the guild's scope. Channel scopes are checked at dispatch."""
+        return (self.guilds is None and self.channels is None) or self.channels is not None or \
+            (guild_id is not None and guild_id in self.guilds)
+
+    def applies(self, guild_id: Optional[int], channel_id: int) -> bool:
+        if channel_id in self.exclude_channels:
+            return False
+        if self.guilds is None and self.channels is None:
+            return True
+        return (self.guilds is not None and guild_id in self.guilds) or \
+            (self.channels is not None and channel_id in self.channels)
+
+
+# (ignore case, whole word, keyword)
+TriggerKey = Tuple[bool, bool, str]
+
+
+def trie_pattern(keywords: Iterable[str]) -> str:
+    """
+    A regex matching any of the keywords, with common prefixes factored out so the regex engine walks a trie instead
+    of trying every keyword at every position. Optional suffixes are greedy, so the longest keyword at a spot wins.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}  # End of a keyword
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:{})".format("|".join(branches))
+        return "(?:{})?".format(body) if "" in node else body
+
+    return emit(trie)
+
+
+class CompiledScope:
+    __slots__ = ("case_sensitive", "case_insensitive", "keywords", "lookup")
+
+    def __init__(self, triggers: List[Tuple[str, Trigger]]) -> None:
+        self.lookup = {}  # type: Dict[TriggerKey, List[Tuple[str, Trigger]]]
+        for owner, trigger in triggers:
+            self.lookup.setdefault((trigger.ignore_case, trigger.whole_word, trigger.keyword), []).append(
+                (owner, trigger))
+
+        # ignore case -> every keyword in that mode, whole word or not
+        self.keywords = {ignore_case: frozenset(keyword for (i, _, keyword) in self.lookup if i == ignore_case)
+                         for ignore_case in (False, True)}
+        self.case_sensitive = self._compile(False)
+        self.case_insensitive = self._compile(True)
+
+    def _compile(self, ignore_case: bool) -> Optional['re.Pattern']:
+        keywords = self.keywords[ignore_case]
+        return re.compile("(?=({}))".format(trie_pattern(keywords))) if keywords else None
+
+
+class TriggerEngine:
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self._triggers = {}  # type: Dict[str, List[Trigger]]
+        self._handlers = {}  # type: Dict[str, Handler]
+        self._scopes = {}  # type: Dict[Optional[int], Optional[CompiledScope]]
+        self.stats = {"scanned": 0, "matched": 0, "dispatched": 0}
+
+        self.bot.add_listener(self.on_message)
+
+    def register(self, owner: str, handler: Handler, triggers: Iterable[Trigger]) -> None:
+        """Set the owner's triggers, replacing any it had before. Call again to change them."""
+        self._triggers[owner] = list(triggers)
+        self._handlers[owner] = handler
+        self._scopes = {}
+
+    def unregister(self, owner: str) -> None:
+        self._triggers.pop(owner, None)
+        self._handlers.pop(owner, None)
+        self._scopes = {}
+
+    def _scope(self, guild_id: Optional[int]) -> Optional[CompiledScope]:
+        try:
+            return self._scopes[guild_id]
+        except KeyError:
+            pass
+
+        triggers = [(owner, trigger) for owner, owner_triggers in self._triggers.items()
+                    for trigger in owner_triggers if trigger.could_apply(guild_id)]
+        scope = self._scopes[guild_id] = CompiledScope(triggers) if triggers else None
+        return scope
+
+    def scan(self, guild_id: Optional[int], channel_id: int, content: str) -> Dict[str, List[str]]:
+        """{owner: tags} for every trigger matching the message, tags in the order they appear in it."""
+        scope = self._scope(guild_id)
+        if scope is None or not content:
+            return {}
+
+        found = []  # (position, owner, tag)
+        for pattern, text, ignore_case in ((scope.case_sensitive, content, False),
+                                           (scope.case_insensitive, content.lower(), True)):
+            if pattern is None:
+                continue
+            keywords = scope.keywords[ignore_case]
+            for match in pattern.finditer(text):
+                start = match.start()
+                longest = match.group(1)
+                word_start = start == 0 or text[start - 1].isspace()
+                # The longest keyword starting here, and any shorter ones it begins with
+                for end in range(1, len(longest) + 1):
+                    keyword = longest[:end]
+                    if keyword not in keywords:
+                        continue
+                    keys = [(ignore_case, False, keyword)]
+                    if word_start and (start + end == len(text) or text[start + end].isspace()):
+                        keys.append((ignore_case, True, keyword))
+                    for key in keys:
+                        for owner, trigger in scope.lookup.get(key, ()):
+                            if trigger.applies(guild_id, channel_id):
+                                found.append((start, owner, trigger.tag))
+
+        hits = {}  # type: Dict[str, List[str]]
+        for _, owner, tag in sorted(found, key=lambda hit: hit[0]):
+            tags = hits.setdefault(owner, [])
+            if tag not in tags:
+                tags.append(tag)
+        return hits
+
+    async def _dispatch(self, owner: str, handler: Handler, message: discord.Message, tags: List[str]) -> None:
+        try:
+            await handler(message, tags)
+        except Exception:
+            log.exception("Trigger handler for {} failed on tags {}.".format(owner, tags))
+
+    async def on_message(self, message: discord.Message) -> None:
+        self.stats["scanned"] += 1
+        hits = self.scan(message.guild.id if message.guild is not None else None, message.channel.id,
+                         message.content)
+        if not hits:
+            return
+
+        self.stats["matched"] += 1
+        for owner, tags in hits.items():
+            handler = self._handlers.get(owner)
+            if handler is not None:
+                self.stats["dispatched"] += 1
+                self.bot.loop.create_task(self._dispatch(owner, handler, message, tags))
+
+
+def get_trigger_engine(bot: Bot) -> TriggerEngine:
+    """Get the trigger engine shared between cogs, creating it on first use."""
+    engine = getattr(bot, "trigger_engine", None)
+    if engine is None:
+        engine = bot.trigger_engine = TriggerEngine(bot)
+    return engine
+
+
+if __name__ == "__main__":
+    # Replays sentences from text_sources as chat messages, with keywords sprinkled in, through the checks the cogs
+    # used to run (micspam's keywords, uwuconomy's regex, and a few hundred april fools substitutions) and through
+    # the engine with the same keywords registered.
+    import glob
+    import os
+    import random
+    from collections import Counter
+    from timeit import timeit
+    from types import SimpleNamespace
+
+    random.seed(0)
+    REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    GUILD_ID = 78716585996455936
+    CHANNEL_ID = 111504456838819840
+    MESSAGES = 20000
+    SUBSTITUTIONS = 800
+
+    sentences = []
+    for path in glob.glob(os.path.join(REPO_ROOT, "text_sources", "*.txt")):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            sentences.extend(line.strip() for line in re.split(r"[.!?\n]", f.read()) if 3 < len(line.strip()) < 300)
+
+    # Stand in for the pokemon names with the corpus' rarer long words, so they turn up about as often
+    counts = Counter(word.lower() for sentence in sentences for word in re.findall(r"[A-Za-z]{6,}", sentence))
+    substitutions = {word: word[::-1].title() for word, _ in counts.most_common()[-SUBSTITUTIONS:]}
+
+    corpus = []
+    for _ in range(MESSAGES):
+        content = random.choice(sentences)
+        roll = random.random()
+        if roll < 0.01:
+            content += " owo "
+        elif roll < 0.015:
+            content = "goo"
+        elif roll < 0.03:
+            content += " UwU"
+        corpus.append(content)
+
+    guilds = [GUILD_ID, 344285545742204940]
+
+    def legacy():
+        hits = 0
+        for content in corpus:
+            if " owo " in content or content == "owo":
+                hits += 1
+            elif " goo " in content or content == "goo":
+                hits += 1
+            elif "quagf" in content:
+                hits += 1
+            if re.search("uwu", content, re.IGNORECASE):
+                hits += 1
+            for name in substitutions:
+                if name in content.lower():
+                    hits += 1
+                    break
+        return hits
+
+    engine = TriggerEngine.__new__(TriggerEngine)
+    engine._triggers, engine._handlers, engine._scopes = {}, {}, {}
+    engine.register("Micspam", None, [Trigger(keyword, guilds=guilds, whole_word=True) for keyword in ("owo", "goo")] +
+                    [Trigger("quagf", guilds=guilds)])
+    engine.register("Uwuconomy", None, [Trigger("uwu", guilds=[GUILD_ID], ignore_case=True)])
+    engine.register("AprilFools2018", None, [Trigger(name, guilds=[GUILD_ID], ignore_case=True)
+                                             for name in substitutions])
+
+    def compiled():
+        return sum(len(engine.scan(GUILD_ID, CHANNEL_ID, content)) for content in corpus)
+
+    print("{} messages, {} keywords; {} legacy hits, {} engine hits (engine matches owo/goo as whole words)".format(
+        MESSAGES, SUBSTITUTIONS + 4, legacy(), compiled()))
+    for name, func in (("legacy", legacy), ("engine", compiled)):
+        seconds = timeit(func, number=3) / 3
+        print("{:>8}: {:.1f}ms per {} messages, {:.2f}us each".format(
+            name, seconds * 1000, MESSAGES, seconds / MESSAGES * 1e6))
@@ -0,0 +1,191 @@
+"""
+Event loop stall detector.
+
+A heartbeat task on the loop updates a timestamp every HEARTBEAT_INTERVAL. A daemon thread checks it every
+SAMPLE_INTERVAL, and while the heartbeat is older than the threshold, it samples the loop thread's stack. Each sample
+is attributed to:
+    - the cog, from the innermost frame in one of our own files
+    - the command, from the nearest `ctx` local on the stack
+    - the call site, as that innermost frame's file, line and function
+and totalled per (cog, command, call site), so the worst offenders can be listed with `!stalls`.
+
+Nothing runs on the loop besides the heartbeat, and the thread only walks the stack while the loop is already stuck,
+so it's cheap enough to leave running. The threshold is read from `config:watchdog:threshold_ms`.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from discord.ext.commands import Bot, Context
+
+log = logging.getLogger()
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEARTBEAT_INTERVAL = 0.05
+SAMPLE_INTERVAL = 0.05
+DEFAULT_THRESHOLD = 0.25
+
+# (cog, command, call site)
+StallKey = Tuple[str, str, str]
+
+
+class StallSite:
+    __slots__ = ("stalls", "samples", "blocked", "longest", "leaf")
+
+    def __init__(self) -> None:
+        self.stalls = 0  # Distinct stalls this site was seen in
+        self.samples = 0
+        self.blocked = 0.0  # Approximate seconds the loop was blocked here
+        self.longest = 0.0
+        self.leaf = ""  # Innermost frame of the last sample, usually the library call actually blocking
+
+
+class LoopWatchdog:
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float = DEFAULT_THRESHOLD) -> None:
+        self.loop = loop
+        self.threshold = threshold
+        self.sites = {}  # type: Dict[StallKey, StallSite]
+        self.total_stalls = 0
+        self.total_blocked = 0.0
+
+        self._lock = threading.Lock()  # Guards the stats, which the watchdog thread writes while commands read them
+        self._last_beat = perf_counter()
+        self._loop_thread_id = None  # type: Optional[int]
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._heartbeat_task = None  # type: Optional[asyncio.Task]
+
+    def start(self) -> None:
+        self._heartbeat_task = self.loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop_watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.sites = {}
+            self.total_stalls = 0
+            self.total_blocked = 0.0
+
+    async def _heartbeat(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        while True:
+            self._last_beat = perf_counter()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    # Watchdog thread
+
+    def _watch(self) -> None:
+        stall_start = None  # Heartbeat of the stall in progress, if any
+        stall_keys = set()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            beat = self._last_beat
+            blocked_for = perf_counter() - beat
+            if blocked_for < self.threshold + HEARTBEAT_INTERVAL or self._loop_thread_id is None:
+                if stall_start is not None:
+                    self._end_stall(stall_keys, perf_counter() - stall_start)
+                    stall_start = None
+                    stall_keys = set()
+                continue
+
+            if stall_start != beat:
+                if stall_start is not None:
+                    # The loop got a beat in between samples, so this is a new stall
+                    self._end_stall(stall_keys, beat - stall_start)
+                    stall_keys = set()
+                stall_start = beat
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            key, leaf = self._attribute(frame)
+            del frame
+
+            with self._lock:
+                site = self.sites.setdefault(key, StallSite())
+                site.samples += 1
+                site.blocked += SAMPLE_INTERVAL
+                site.leaf = leaf
+            stall_keys.add(key)
+
+    def _end_stall(self, keys: set, duration: float) -> None:
+        with self._lock:
+            self.total_stalls += 1
+            self.total_blocked += duration
+            for key in keys:
+                site = self.sites.get(key)
+                if site is not None:  # Could have been reset mid-stall
+                    site.stalls += 1
+                    site.longest = max(site.longest, duration)
+
+        if keys:
+            log.warning("Event loop blocked for {:.0f}ms in {}".format(duration * 1000, ", ".join(
+                "{} ({}) at {}".format(*key) for key in keys)))
+
+    @staticmethod
+    def _describe(frame) -> str:
+        return "{}:{} {}".format(os.path.relpath(frame.f_code.co_filename, REPO_ROOT),
+                                 frame.f_lineno, frame.f_code.co_name)
+
+    def _attribute(self, frame) -> Tuple[StallKey, str]:
+        leaf = self._describe(frame)
+        site = None
+        cog = "-"
+        command = "-"
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if site is None and filename.startswith(REPO_ROOT) and not filename.endswith("watchdog.py"):
+                site = self._describe(frame)
+                cog = os.path.splitext(os.path.basename(filename))[0]
+            if command == "-":
+                ctx = frame.f_locals.get("ctx")
+                if isinstance(ctx, Context) and ctx.command is not None:
+                    command = ctx.command.qualified_name
+            if site is not None and command != "-":
+                break
+            frame = frame.f_back
+
+        return (cog, command, site or leaf), leaf
+
+    # Reporting
+
+    def top(self, n: int = 10) -> List[Tuple[StallKey, StallSite]]:
+        with self._lock:
+            return sorted(self.sites.items(), key=lambda item: item[1].blocked, reverse=True)[:n]
+
+    def format_report(self, n: int = 10) -> str:
+        if not self.sites:
+            return "No stalls over {:.0f}ms recorded.".format(self.threshold * 1000)
+
+        lines = ["{} stalls over {:.0f}ms, {:.1f}s blocked in total.".format(
+            self.total_stalls, self.threshold * 1000, self.total_blocked), ""]
+        for (cog, command, site), stats in self.top(n):
+            lines.append("{:.1f}s over {} stalls (longest {:.0f}ms) - {} / {}".format(
+                stats.blocked, stats.stalls, stats.longest * 1000, cog, command))
+            lines.append("    {}".format(site))
+            if stats.leaf != site:
+                lines.append("    -> {}".format(stats.leaf))
+        return "\n".join(lines)
+
+
+def get_watchdog(bot: Bot) -> LoopWatchdog:
+    """Get the bot's loop watchdog, starting it on first use."""
+    watchdog = getattr(bot, "watchdog", None)
+    if watchdog is None:
+        threshold_ms = bot.config.get("config:watchdog:threshold_ms")
+        watchdog = LoopWatchdog(bot.loop, int(threshold_ms) / 1000 if threshold_ms else DEFAULT_THRESHOLD)
+        watchdog.start()
+        bot.watchdog = watchdog
+    return watchdog
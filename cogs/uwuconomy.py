@@ -1,15 +1,16 @@
 """don't uwu, $350 penalty"""
 
-import re
+from typing import List
 
 import discord
 
-from discord import Color, DMChannel, Embed, Emoji, Member, Message
+from discord import Color, Embed, Emoji, Member, Message
 from discord.ext import commands
 from discord.ext.commands import Bot, Context
 
 from .utils import checks
 from cogs.utils import rate_limits
+from .utils.triggers import Trigger, get_trigger_engine
 
 
 class Uwuconomy(commands.Cog):
@@ -26,6 +27,18 @@ class Uwuconomy(commands.Cog):
         self.muted_contexts = list(self.config.smembers("config:uwuconomy:muted"))
         self.reply_contexts = list(self.config.smembers("config:uwuconomy:replies"))
 
+        self.triggers = get_trigger_engine(bot)
+        self._register_trigger()
+
+    def cog_unload(self):
+        self.triggers.unregister(type(self).__name__)
+
+    def _register_trigger(self):
+        """(Re)register the uwu trigger for the active guilds and channels."""
+        self.triggers.register(type(self).__name__, self.on_uwu, [
+            Trigger("uwu", guilds=self.active_guilds, channels=self.active_channels, ignore_case=True)
+        ])
+
     @property
     def emoji(self) -> Emoji:
         return discord.utils.get(
@@ -75,6 +88,7 @@ class Uwuconomy(commands.Cog):
             self.active_guilds = cache
         else:
             self.active_channels = cache
+        self._register_trigger()
 
         await ctx.send("uwuconomy is now {} in {}.".format(action, target.name))
 
@@ -127,7 +141,8 @@ class Uwuconomy(commands.Cog):
         msg = await ctx.send("0 messages parsed")
 
         async for message in ctx.message.channel.history(limit=None):
-            await self.on_message(message)
+            if type(self).__name__ in self.triggers.scan(message.guild.id, message.channel.id, message.content):
+                await self.on_uwu(message, ["uwu"])
             messages_parsed += 1
 
             if messages_parsed % 200 == 0:
@@ -138,15 +153,9 @@ class Uwuconomy(commands.Cog):
 
         await ctx.send("Complete")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: Message) -> None:
-        if not isinstance(message.channel, DMChannel) and \
-            (
-                    str(message.guild.id) in self.active_guilds or
-                    str(message.channel.id) in self.active_channels
-            ) and \
-                re.search("uwu", message.content, re.IGNORECASE) and \
-                not message.content.startswith("!uwu"):
+    async def on_uwu(self, message: Message, keywords: List[str]) -> None:
+        """Called by the trigger engine for uwus in active guilds and channels."""
+        if not message.content.startswith("!uwu"):
             if not (
                     str(message.channel.id) in self.muted_contexts or
                     str(message.guild.id) in self.muted_contexts
@@ -20,7 +20,6 @@ import sys
 import traceback
 
 from io import StringIO
-from time import perf_counter
 
 import discord
 from discord import Message
@@ -33,7 +32,10 @@ from discord.ext.commands import (
 
 from cogs.utils.errors import CommandBlacklisted, CommandRateLimited
 from cogs.utils.checks import sudo_check
+from cogs.utils.metrics import get_metrics
+from cogs.utils.watchdog import get_watchdog
 from cogs.utils.redis_config import RedisConfig
+from cogs.utils.startup import StartupProfiler
 
 
 loop = asyncio.get_event_loop()
@@ -122,8 +124,15 @@ class PoryBot(AutoShardedBot):
         self.events = []
         self.boo_counter = 1
         self.config = RedisConfig()
+        self.startup = StartupProfiler()
+        get_metrics(self)
+        get_watchdog(self)
         self.loop.create_task(init_timed_events(self))
 
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        # Time every listener, the bot's own events included
+        await super()._run_event(self.metrics.instrument_listener(coro, event_name), event_name, *args, **kwargs)
+
 
 intents = discord.Intents.all()
 
@@ -196,6 +205,7 @@ async def on_ready() -> None:
     print(bot.user.name)
     print(bot.user.id)
     log.info("Initialized.")
+    bot.startup.mark_ready()
     bot.owner = bot.get_user(78716152653553664)
 
     print('------')
@@ -215,19 +225,7 @@ async def on_message(message: Message) -> None:
 # Starting upon
 
 if __name__ == "__main__":
-    current_uptime = perf_counter()
-    last_reading = 0
     log.info("Loading cogs...")
-    for extension in initial_extensions:
-        try:
-            bot.load_extension(extension)
-            last_reading = perf_counter() - current_uptime
-            current_uptime = perf_counter()
-            log.info("Loaded {} in {:.02f}s.".format(extension, last_reading))
-
-        except Exception as e:
-            log.warning('Failed to load extension {}\n{}: {}'.format(extension, type(e).__name__, e))
-            log.exception("Traceback:")
-            print('Failed to load extension {}\n{}: {}'.format(extension, type(e).__name__, e))
+    bot.startup.load_extensions(bot, initial_extensions)
 
     bot.run(auth["discord"]["token"])